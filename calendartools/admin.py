@@ -31,6 +31,11 @@ class OccurrenceAdmin(AuditedAdmin):
     search_fields = ('event__name',)
 
 
+class OccurrenceSeriesAdmin(OccurrenceAdmin):
+    list_display = ['calendar', 'event', 'start', 'finish', 'rule', 'status',
+                    'datetime_created']
+
+
 class AttendanceAdmin(AuditedAdmin):
     raw_id_fields = ['creator', 'editor', 'user', 'occurrence']
     list_display = ['user', 'occurrence', 'status', 'datetime_created']
@@ -40,9 +45,12 @@ class AttendanceAdmin(AuditedAdmin):
 Calendar = get_model(defaults.CALENDAR_APP_LABEL, 'Calendar')
 Event = get_model(defaults.CALENDAR_APP_LABEL, 'Event')
 Occurrence = get_model(defaults.CALENDAR_APP_LABEL, 'Occurrence')
+OccurrenceSeries = get_model(defaults.CALENDAR_APP_LABEL, 'OccurrenceSeries')
 Attendance = get_model(defaults.CALENDAR_APP_LABEL, 'Attendance')
 
 admin.site.register(Calendar, CalendarAdmin)
 admin.site.register(Event, EventAdmin)
 admin.site.register(Occurrence, OccurrenceAdmin)
+if OccurrenceSeries is not None:
+    admin.site.register(OccurrenceSeries, OccurrenceSeriesAdmin)
 admin.site.register(Attendance, AttendanceAdmin)
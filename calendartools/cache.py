@@ -0,0 +1,126 @@
+"""
+Caches for values which are costly to compute, but rarely change.
+
+The bounds of each calendar's visible occurrences and series - shown by the
+navigation of every calendar and agenda page - are kept in Django's cache
+backend.
+
+Each calendar also has a version number, which is part of the key of every
+cached page of the calendar (see ``calendar_page_key``), and of the ETag of
+every page: bumping the version retires all of them at once.
+
+Both are invalidated (see ``invalidate_calendars``) whenever an occurrence,
+series, event or calendar is saved or deleted, and by the set-based occurrence
+updates (``bulk_create``, ``cascade_status`` and ``update_effective_status``).
+Queryset ``update`` calls which change occurrences, series, events or
+calendars should be followed by a call to ``invalidate_calendars``. Saving
+or deleting an attendance record bumps just the version of its occurrence's
+calendar, as pages show attendance (see ``CALENDAR_SHOW_ATTENDANCE``).
+"""
+from datetime import datetime
+import time
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils.hashcompat import md5_constructor
+from calendartools import defaults
+
+# Version numbers needn't expire; this just has to be long-lived:
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def calendar_bounds_key(calendar_id):
+    return 'calendartools:calendar_bounds:%s' % calendar_id
+
+
+def get_calendar_bounds(calendar):
+    """Returns a dictionary holding the ``earliest_occurrence`` (start) and
+    ``latest_occurrence`` (finish) of ``calendar``'s visible occurrences,
+    including the instances of its visible series - the latest being
+    ``datetime.max`` if any of them recurs indefinitely."""
+    key = calendar_bounds_key(calendar.pk)
+    bounds = cache.get(key)
+    if bounds is None:
+        bounds = calendar.occurrences.visible().aggregate(
+            earliest_occurrence=Min('start'),
+            latest_occurrence=Max('finish'),
+        )
+        series = getattr(calendar, 'series', None)
+        if series is not None:
+            for start, finish, last_start in series.visible().values_list(
+                    'start', 'finish', 'last_start'):
+                if last_start is None:
+                    last_finish = datetime.max
+                else:
+                    last_finish = last_start + (finish - start)
+                bounds = {
+                    'earliest_occurrence': _min(
+                        bounds['earliest_occurrence'], start),
+                    'latest_occurrence': _max(
+                        bounds['latest_occurrence'], last_finish),
+                }
+        cache.set(key, bounds, defaults.CALENDAR_BOUNDS_CACHE_TIMEOUT)
+    return bounds
+
+
+def _min(a, b):
+    return b if a is None else min(a, b)
+
+
+def _max(a, b):
+    return b if a is None else max(a, b)
+
+
+def invalidate_calendar_bounds(*calendar_ids):
+    keys = [calendar_bounds_key(pk) for pk in set(calendar_ids)
+            if pk is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def calendar_version_key(calendar_id):
+    return 'calendartools:calendar_version:%s' % calendar_id
+
+
+def initial_version():
+    # Versions start from the current time (in milliseconds) so that, should a
+    # version be evicted from the cache, the next one won't reuse a number
+    # which pages may still be cached under.
+    return int(time.time() * 1000)
+
+
+def get_calendar_version(calendar_id):
+    key = calendar_version_key(calendar_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_calendar_versions(*calendar_ids):
+    for pk in set(calendar_ids):
+        if pk is None:
+            continue
+        key = calendar_version_key(pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), VERSION_TIMEOUT)
+
+
+def invalidate_calendars(*calendar_ids):
+    """Invalidates everything cached about the given calendars - i.e., their
+    bounds and pages."""
+    invalidate_calendar_bounds(*calendar_ids)
+    bump_calendar_versions(*calendar_ids)
+
+
+def calendar_page_key(calendar_id, *parts):
+    """Returns a cache key for a page of the calendar, identified by
+    ``parts`` (e.g., the view, its path and the user's visibility), under its
+    current version."""
+    return 'calendartools:calendar_page:%s:%s:%s' % (
+        calendar_id, get_calendar_version(calendar_id),
+        md5_constructor(repr(parts)).hexdigest()
+    )
@@ -49,10 +49,63 @@ MAX_OCCURRENCE_DURATION = getattr(settings, 'MAX_OCCURRENCE_DURATION', None)
 # length.
 MAX_OCCURRENCE_CREATION_COUNT = getattr(settings, 'MAX_OCCURRENCE_CREATION_COUNT', 100)
 
+# The maximum number of rows written by each INSERT statement issued by
+# ``bulk_create`` (e.g. ``Event.add_occurrences(..., bulk=True)``). Backends
+# with tighter limits on statement size (i.e., sqlite) use smaller batches;
+# those without multi-row INSERTs send every row in one ``executemany``.
+BULK_CREATE_BATCH_SIZE = getattr(settings, 'BULK_CREATE_BATCH_SIZE', 500)
+
+# When a calendar's or event's status changes, its occurrences' statuses are
+# updated in chunks of (at most) this many primary keys - so that no single
+# UPDATE statement touches an unbounded number of rows.
+STATUS_CASCADE_CHUNK_SIZE = getattr(settings, 'STATUS_CASCADE_CHUNK_SIZE', 10000)
+
+# How long (in seconds) the bounds of each calendar's occurrences may be
+# cached for. They are invalidated whenever its occurrences change, so this
+# only serves to bound the effect of changes made behind calendartools' back.
+CALENDAR_BOUNDS_CACHE_TIMEOUT = getattr(
+    settings, 'CALENDAR_BOUNDS_CACHE_TIMEOUT', 60 * 60 * 24
+)
+
+# When set to a value > 0, the rendered pages of the calendar and agenda views
+# are cached for this many seconds, separately for each user (anonymous users
+# sharing theirs). Changes to a calendar, its events or its occurrences retire
+# its cached pages immediately.
+CALENDAR_CACHE_TIMEOUT = getattr(settings, 'CALENDAR_CACHE_TIMEOUT', 0)
+
+# The iCalendar feeds fetch and serialize occurrences this many at a time, so
+# that exporting a calendar takes the same memory however large it is.
+ICAL_CHUNK_SIZE = getattr(settings, 'ICAL_CHUNK_SIZE', 1000)
+
+# The instances of recurring series are remembered once expanded, so that each
+# page needn't expand them from the start of the series again. This is the
+# maximum number of instances remembered, per process.
+RECURRENCE_CACHE_SIZE = getattr(settings, 'RECURRENCE_CACHE_SIZE', 100000)
+
+# Occurrences are annotated with their attendance (see
+# ``AttendanceQuerySet.annotate_occurrences``) this many at a time.
+ATTENDANCE_CHUNK_SIZE = getattr(settings, 'ATTENDANCE_CHUNK_SIZE', 500)
+
+# When True, the calendar and agenda views show how many are attending each
+# occurrence, and whether the requesting user is, as the default templates
+# expect - at the cost of two queries per page (see
+# ``AttendanceQuerySet.annotate_occurrences``). Set to False if your templates
+# don't show attendance.
+CALENDAR_SHOW_ATTENDANCE = getattr(settings, 'CALENDAR_SHOW_ATTENDANCE', True)
+
 # When set to a value > 0, the agenda views will be paginated by the value
 # specified.
 MAX_AGENDA_ITEMS_PER_PAGE = getattr(settings, 'MAX_AGENDA_ITEMS_PER_PAGE', 0)
 
+# When True, the paginated agenda views fetch each page by seeking past the
+# last occurrence of the one before (see ``calendartools.paginator``), rather
+# than with an OFFSET - so deep pages are as quick to fetch as the first.
+AGENDA_KEYSET_PAGINATION = getattr(settings, 'AGENDA_KEYSET_PAGINATION', False)
+
+# Whether keyset-paginated agenda views count their occurrences, to show the
+# number of pages. Without the count, the page range is approximated.
+AGENDA_PAGINATION_COUNT = getattr(settings, 'AGENDA_PAGINATION_COUNT', True)
+
 def default_view_hidden_events_check(request=None, user=None):
     user = request and request.user or user
     if not user:
@@ -0,0 +1,318 @@
+"""
+Serialization of occurrences as iCalendar (RFC 5545) data.
+
+``iter_calendar`` writes a VCALENDAR a chunk of occurrences at a time: each
+chunk is fetched with a single query (keyed on the primary key, rather than
+an ever-growing OFFSET), serialized, and then discarded - so the memory used
+by an export does not depend on the number of occurrences exported. It is a
+generator, and can be handed straight to an ``HttpResponse``.
+
+Recurring series (see ``OccurrenceSeriesBase``) are written as a VEVENT with
+their RRULE, in local time in the default timezone (described by a
+VTIMEZONE) so that they recur at the same time of day across daylight saving
+changes. The occurrences replacing their instances are written as VEVENTs
+sharing the series' UID, identified by a RECURRENCE-ID.
+"""
+from datetime import datetime
+
+from django.db.models import Min
+from django.utils.encoding import force_unicode, smart_str
+
+from calendartools import defaults
+from calendartools.tz import get_default_timezone, to_utc, utc_transitions
+
+CRLF = '\r\n'
+PRODID = '-//django-calendartools//NONSGML calendartools//EN'
+# Content lines are folded at this many octets, excluding the line break:
+MAX_LINE_LENGTH = 75
+
+
+def escape_text(value):
+    """Escapes ``value`` for use as a TEXT property value."""
+    return (force_unicode(value).replace('\\', '\\\\')
+                                .replace(';', '\\;')
+                                .replace(',', '\\,')
+                                .replace('\r\n', '\\n')
+                                .replace('\n', '\\n')
+                                .replace('\r', '\\n'))
+
+
+def fold(line):
+    """Returns the unicode content ``line`` UTF-8 encoded and folded into
+    lines of at most ``MAX_LINE_LENGTH`` octets, without splitting any
+    multi-octet characters."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= MAX_LINE_LENGTH:
+        return encoded
+    lines, current, length = [], [], 0
+    for char in line:
+        octets = char.encode('utf-8')
+        if length + len(octets) > MAX_LINE_LENGTH:
+            lines.append(''.join(current))
+            # Continuation lines begin with a space, which counts:
+            current, length = [' '], 1
+        current.append(octets)
+        length += len(octets)
+    lines.append(''.join(current))
+    return CRLF.join(lines)
+
+
+def format_datetime(dt, utc=True):
+    """Formats the naive datetime ``dt`` as an iCalendar DATE-TIME: in UTC
+    (which ``dt`` must then be in), or else as a local time."""
+    return dt.strftime(utc and '%Y%m%dT%H%M%SZ' or '%Y%m%dT%H%M%S')
+
+
+def format_offset(offset):
+    """Formats the ``timedelta`` ``offset`` as an iCalendar UTC-OFFSET."""
+    seconds = offset.days * 86400 + offset.seconds
+    sign = seconds < 0 and '-' or '+'
+    minutes, seconds = divmod(abs(seconds), 60)
+    value = '%s%02d%02d' % (sign, minutes // 60, minutes % 60)
+    return seconds and '%s%02d' % (value, seconds) or value
+
+
+def format_rule(rule, timezone):
+    """Returns the RRULE text ``rule`` with its UNTIL, if any, converted from
+    local time in ``timezone`` to UTC - as is required alongside a DTSTART
+    with a TZID."""
+    parts = rule.split(';')
+    for i, part in enumerate(parts):
+        if part.upper().startswith('UNTIL=') and len(part) == 21:
+            until = datetime.strptime(part[6:], '%Y%m%dT%H%M%S')
+            parts[i] = 'UNTIL=%s' % format_datetime(to_utc([until],
+                                                           timezone)[0])
+    return ';'.join(parts)
+
+
+def iter_chunks(queryset, chunk_size=None):
+    """Yields lists of (at most ``chunk_size``) results from ``queryset``, in
+    order of primary key. Each list is fetched with one query, and
+    ``queryset`` keeps no results cache. For ``values_list`` querysets, the
+    primary key must be the first value of each row."""
+    chunk_size = chunk_size or defaults.ICAL_CHUNK_SIZE
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size].iterator())
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+        if isinstance(last, tuple):
+            last_pk = last[0]
+        else:
+            last_pk = last.pk
+
+
+def vevent(uid, start, finish, modified, summary, description=None,
+           cancelled=False, tzid=None, properties=()):
+    """Returns the content lines of a VEVENT. The datetimes given must be
+    naive UTC datetimes - except for ``start`` and ``finish`` if ``tzid`` is
+    given, which are then local times in that timezone. ``properties`` are
+    any further content lines (e.g., an RRULE)."""
+    if tzid:
+        dates = (u'DTSTART;TZID=%s:%s' % (tzid, format_datetime(start, False)),
+                 u'DTEND;TZID=%s:%s' % (tzid, format_datetime(finish, False)))
+    else:
+        dates = (u'DTSTART:%s' % format_datetime(start),
+                 u'DTEND:%s' % format_datetime(finish))
+    lines = [
+        u'BEGIN:VEVENT',
+        u'UID:%s' % uid,
+        u'DTSTAMP:%s' % format_datetime(modified),
+        u'LAST-MODIFIED:%s' % format_datetime(modified),
+    ]
+    lines.extend(dates)
+    lines.extend(properties)
+    lines.append(u'SUMMARY:%s' % escape_text(summary))
+    if description:
+        lines.append(u'DESCRIPTION:%s' % escape_text(description))
+    lines.append(cancelled and u'STATUS:CANCELLED' or u'STATUS:CONFIRMED')
+    lines.append(u'END:VEVENT')
+    return lines
+
+
+def vtimezone(timezone, start):
+    """Returns the content lines of a VTIMEZONE describing ``timezone`` from
+    the naive UTC datetime ``start`` onwards."""
+    lines = [u'BEGIN:VTIMEZONE', u'TZID:%s' % timezone.zone]
+    for transition, from_offset, to_offset, dst, name in utc_transitions(
+            timezone, start):
+        component = dst and u'DAYLIGHT' or u'STANDARD'
+        lines.extend([
+            u'BEGIN:%s' % component,
+            # The onset is given in the local time in force before it:
+            u'DTSTART:%s' % format_datetime(transition + from_offset, False),
+            u'TZOFFSETFROM:%s' % format_offset(from_offset),
+            u'TZOFFSETTO:%s' % format_offset(to_offset),
+            u'TZNAME:%s' % escape_text(name),
+            u'END:%s' % component,
+        ])
+    lines.append(u'END:VTIMEZONE')
+    return lines
+
+
+def fetch_events(Event, pks):
+    """Returns the ``(name, description, datetime_modified)`` of the events
+    ``pks`` by primary key, with a single query."""
+    return dict(
+        (row[0], row[1:]) for row in Event._default_manager.filter(
+            pk__in=set(pks)
+        ).values_list('pk', 'name', 'description', 'datetime_modified')
+    )
+
+
+def iter_vevents(occurrences, domain, chunk_size=None):
+    """
+    Yields the serialized VEVENTs of ``occurrences``, one string per chunk.
+
+    Occurrences are read as rows of values, rather than model instances -
+    instantiating each occurrence, its event and its calendar would
+    otherwise account for most of the time taken - with the events of each
+    chunk fetched by a second query.
+    """
+    Event = occurrences.model._meta.get_field('event').rel.to
+    cancelled = occurrences.model.STATUS.cancelled
+    timezone = get_default_timezone()
+    rows = occurrences.values_list(
+        'pk', 'start', 'finish', 'datetime_modified', 'status', 'event'
+    )
+    for chunk in iter_chunks(rows, chunk_size):
+        events = fetch_events(Event, [row[5] for row in chunk])
+        # Occurrences are stored in the default timezone; each chunk is
+        # converted to UTC in a single pass:
+        values = []
+        for pk, start, finish, modified, status, event_id in chunk:
+            values.extend([start, finish, max(modified, events[event_id][2])])
+        values = to_utc(values, timezone)
+        output = []
+        for i, (pk, _, _, _, status, event_id) in enumerate(chunk):
+            start, finish, modified = values[i * 3:i * 3 + 3]
+            name, description, _ = events[event_id]
+            output.extend(fold(line) for line in vevent(
+                u'occurrence-%s@%s' % (pk, domain), start, finish, modified,
+                name, description, cancelled=(status == cancelled)
+            ))
+        yield CRLF.join(output) + CRLF
+
+
+def iter_series_vevents(series, replacements, domain, chunk_size=None):
+    """
+    Yields the VTIMEZONE of the default timezone and the serialized VEVENTs
+    of ``series``, one string per chunk - or nothing at all, if there are no
+    series.
+
+    Each series is followed by those of ``replacements`` which replace any
+    of its instances. Instances replaced by occurrences that are not among
+    ``replacements`` (e.g., inactive ones) are excluded with an EXDATE. Each
+    chunk takes a query for the series, one for the occurrences replacing
+    their instances, one for those among ``replacements`` and one for their
+    events.
+    """
+    first_start = series.aggregate(first_start=Min('start'))['first_start']
+    if first_start is None:
+        return
+    Event = series.model._meta.get_field('event').rel.to
+    Occurrence = replacements.model
+    cancelled = series.model.STATUS.cancelled
+    timezone = get_default_timezone()
+    tzid = timezone.zone
+    yield CRLF.join(fold(line) for line in vtimezone(
+        timezone, to_utc([first_start], timezone)[0]
+    )) + CRLF
+
+    rows = series.values_list(
+        'pk', 'start', 'finish', 'rule', 'datetime_modified', 'status',
+        'event__status', 'calendar__status', 'event'
+    )
+    for chunk in iter_chunks(rows, chunk_size):
+        pks = [row[0] for row in chunk]
+        excluded = {}
+        for series_id, original_start in Occurrence._default_manager.filter(
+                series__in=pks).values_list('series', 'original_start'):
+            excluded.setdefault(series_id, set()).add(original_start)
+        overrides = {}
+        for row in replacements.filter(series__in=pks).values_list(
+                'series', 'original_start', 'start', 'finish',
+                'datetime_modified', 'status', 'event'):
+            overrides.setdefault(row[0], []).append(row[1:])
+            excluded[row[0]].discard(row[1])
+        events = fetch_events(Event, [row[8] for row in chunk] + [
+            row[5] for rows in overrides.values() for row in rows
+        ])
+
+        # Modification times (and the times of the replacements) are
+        # converted to UTC in a single pass:
+        values = []
+        for row in chunk:
+            values.append(max(row[4], events[row[8]][2]))
+            for original, start, finish, modified, status, event_id in (
+                    overrides.get(row[0], ())):
+                values.extend([start, finish,
+                               max(modified, events[event_id][2])])
+        values = iter(to_utc(values, timezone))
+
+        output = []
+        for (pk, start, finish, rule, _, status, event_status,
+             calendar_status, event_id) in chunk:
+            uid = u'series-%s@%s' % (pk, domain)
+            properties = [u'RRULE:%s' % format_rule(rule, timezone)]
+            if excluded.get(pk):
+                properties.append(u'EXDATE;TZID=%s:%s' % (tzid, u','.join(
+                    format_datetime(dt, False) for dt in sorted(excluded[pk])
+                )))
+            status = series.model.combine_statuses(status, event_status,
+                                                   calendar_status)
+            name, description, _ = events[event_id]
+            output.extend(fold(line) for line in vevent(
+                uid, start, finish, values.next(), name, description,
+                cancelled=(status == cancelled), tzid=tzid,
+                properties=properties
+            ))
+            for original, _, _, _, status, event_id in overrides.get(pk, ()):
+                name, description, _ = events[event_id]
+                output.extend(fold(line) for line in vevent(
+                    uid, values.next(), values.next(), values.next(), name,
+                    description, cancelled=(status == cancelled),
+                    properties=[u'RECURRENCE-ID;TZID=%s:%s' % (
+                        tzid, format_datetime(original, False)
+                    )]
+                ))
+        yield CRLF.join(output) + CRLF
+
+
+def iter_calendar(occurrences, domain, name=None, description=None,
+                  chunk_size=None, series=None, replacements=None):
+    """
+    Yields a VCALENDAR of ``occurrences`` as UTF-8 encoded strings.
+    ``domain`` qualifies the UIDs of the VEVENTs; ``name`` and
+    ``description`` describe the calendar to clients that support them.
+
+    If given, ``series`` are written as recurring VEVENTs (see
+    ``iter_series_vevents``), with their replacements taken from
+    ``replacements`` (by default, ``occurrences``) rather than written as
+    occurrences of their own.
+    """
+    lines = [u'BEGIN:VCALENDAR', u'VERSION:2.0', u'PRODID:%s' % PRODID,
+             u'CALSCALE:GREGORIAN']
+    if name:
+        lines.append(u'X-WR-CALNAME:%s' % escape_text(name))
+    if description:
+        lines.append(u'X-WR-CALDESC:%s' % escape_text(description))
+    yield CRLF.join(fold(line) for line in lines) + CRLF
+    if series is not None:
+        if replacements is None:
+            replacements = occurrences
+        occurrences = occurrences.exclude(series__in=series.values('pk'))
+    for chunk in iter_vevents(occurrences, domain, chunk_size):
+        yield chunk
+    if series is not None:
+        for chunk in iter_series_vevents(series, replacements, domain,
+                                         chunk_size):
+            yield chunk
+    yield smart_str(u'END:VCALENDAR') + CRLF
@@ -0,0 +1,71 @@
+"""
+Multi-column database indexes, which Django cannot declare for us.
+
+Models list their indexes in a ``composite_indexes`` attribute - a sequence
+of tuples of field names (see ``OccurrenceBase``) - and the indexes are
+created by ``syncdb``, after the model's table. For existing databases, the
+statements can be obtained from ``sql_create_composite_indexes`` and applied
+by hand.
+"""
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.backends.util import truncate_name
+from django.db.models import get_models
+
+# Queries which look up an index by name, for the backends which can:
+INDEX_EXISTS_SQL = {
+    'sqlite': "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = %s",
+    'postgresql': "SELECT 1 FROM pg_indexes WHERE indexname = %s",
+}
+
+
+def composite_index_name(model, fields, connection):
+    columns = [model._meta.get_field(name).column for name in fields]
+    return truncate_name(
+        '%s_%s' % (model._meta.db_table, '_'.join(columns)),
+        connection.ops.max_name_length()
+    )
+
+
+def sql_create_composite_indexes(model, connection):
+    """Returns the CREATE INDEX statements for ``model``'s
+    ``composite_indexes``."""
+    qn = connection.ops.quote_name
+    output = []
+    for fields in getattr(model, 'composite_indexes', ()):
+        columns = [model._meta.get_field(name).column for name in fields]
+        output.append('CREATE INDEX %s ON %s (%s);' % (
+            qn(composite_index_name(model, fields, connection)),
+            qn(model._meta.db_table),
+            ', '.join(qn(column) for column in columns)
+        ))
+    return output
+
+
+def index_exists(connection, name):
+    sql = INDEX_EXISTS_SQL.get(connection.vendor)
+    if sql is None:
+        return False
+    cursor = connection.cursor()
+    cursor.execute(sql, [name])
+    return cursor.fetchone() is not None
+
+
+def create_composite_indexes(sender, created_models, verbosity=1,
+                             db=DEFAULT_DB_ALIAS, **kwargs):
+    """A ``post_syncdb`` handler, creating the ``composite_indexes`` of each
+    newly created model in the app being synced."""
+    connection = connections[db]
+    for model in get_models(sender):
+        if model not in created_models:
+            continue
+        for fields, sql in zip(getattr(model, 'composite_indexes', ()),
+                               sql_create_composite_indexes(model, connection)):
+            if index_exists(connection,
+                            composite_index_name(model, fields, connection)):
+                continue
+            if verbosity >= 2:
+                print "Creating index on %s (%s)" % (
+                    model._meta.db_table, ', '.join(fields)
+                )
+            connection.cursor().execute(sql)
+    transaction.commit_unless_managed(using=db)
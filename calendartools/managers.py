@@ -1,6 +1,20 @@
-from django.db import models
+from datetime import datetime, timedelta
+
+from django.db import connections, models, transaction
+from django.db.models import AutoField
+from django.db.models import Count
 from django.db.models.query import QuerySet, Q
+from django.utils.datastructures import SortedDict
 from calendartools import defaults
+from calendartools.cache import invalidate_calendars
+
+
+def supports_multirow_insert(connection):
+    """Whether ``connection`` accepts ``INSERT ... VALUES (...), (...)``."""
+    if connection.vendor == 'sqlite':
+        from django.db.backends.sqlite3.base import Database
+        return Database.sqlite_version_info >= (3, 7, 11)
+    return connection.vendor in ('postgresql', 'mysql')
 
 
 class DRYManager(models.Manager):
@@ -48,6 +62,74 @@ class CommonQuerySet(QuerySet):
         else:
             return self.exclude(status__in=self.hidden_statuses)
 
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Inserts ``objs`` - unsaved model instances - using as few INSERT
+        statements as possible (one per ``batch_size`` objects, defaulting to
+        ``defaults.BULK_CREATE_BATCH_SIZE``). Returns ``objs``.
+
+        Each field's value is prepared as ``save`` would (via ``pre_save``),
+        so automatic values such as modification times are filled in - but
+        ``save`` itself is not called, no ``pre_save``/``post_save`` signals
+        are sent, and the primary keys of ``objs`` are *not* set. Validation
+        (e.g. via ``full_clean_batch``) is the caller's responsibility.
+
+        The rows are written within the caller's transaction, if there is
+        one; otherwise, they are committed (or rolled back) together.
+        """
+        opts = self.model._meta
+        if opts.parents:
+            raise ValueError("Can't bulk create multi-table inherited models.")
+        objs = list(objs)
+        if not objs:
+            return objs
+
+        connection = connections[self.db]
+        fields = [f for f in opts.local_fields if not isinstance(f, AutoField)]
+        rows = [
+            [f.get_db_prep_save(f.pre_save(obj, True), connection=connection)
+             for f in fields]
+            for obj in objs
+        ]
+        batch_size = batch_size or defaults.BULK_CREATE_BATCH_SIZE
+        if connection.vendor == 'sqlite':
+            # sqlite allows at most 999 parameters per statement:
+            batch_size = max(1, min(batch_size, 999 // len(fields)))
+
+        if transaction.is_managed(using=self.db):
+            self._insert_rows(connection, fields, rows, batch_size)
+        else:
+            transaction.enter_transaction_management(using=self.db)
+            transaction.managed(True, using=self.db)
+            try:
+                try:
+                    self._insert_rows(connection, fields, rows, batch_size)
+                except:
+                    transaction.rollback(using=self.db)
+                    raise
+                transaction.commit(using=self.db)
+            finally:
+                transaction.leave_transaction_management(using=self.db)
+        return objs
+
+    def _insert_rows(self, connection, fields, rows, batch_size):
+        qn = connection.ops.quote_name
+        insert = 'INSERT INTO %s (%s) VALUES ' % (
+            qn(self.model._meta.db_table),
+            ', '.join(qn(f.column) for f in fields)
+        )
+        placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+        cursor = connection.cursor()
+        if not supports_multirow_insert(connection):
+            cursor.executemany(insert + placeholders, rows)
+        else:
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i:i + batch_size]
+                cursor.execute(insert + ', '.join([placeholders] * len(batch)),
+                               [value for row in batch for value in row])
+        transaction.set_dirty(using=self.db)
+
+
 class NonAttendanceQuerySet(CommonQuerySet):
     @property
     def published(self):
@@ -64,19 +146,211 @@ class EventQuerySet(NonAttendanceQuerySet):
 
 class OccurrenceQuerySet(NonAttendanceQuerySet):
     def visible(self, user=None):
-        qset = self.select_related('event', 'calendar')
+        # ``effective_status`` combines the statuses of each occurrence, its
+        # event and its calendar - so no joins are needed to filter on them.
+        # Callers rendering the events or calendars ``select_related`` them:
         if user and defaults.view_hidden_occurrences_check(user=user):
-            return qset.exclude(
-                Q(status__in=self.hidden_statuses_for_admins) |
-                Q(event__status__in=self.hidden_statuses_for_admins) |
-                Q(calendar__status__in=self.hidden_statuses_for_admins)
+            return self.exclude(
+                effective_status__in=self.hidden_statuses_for_admins
             )
         else:
-            return qset.exclude(
-                Q(status__in=self.hidden_statuses) |
-                Q(event__status__in=self.hidden_statuses) |
-                Q(calendar__status__in=self.hidden_statuses)
+            return self.exclude(effective_status__in=self.hidden_statuses)
+
+    def bulk_create(self, objs, batch_size=None):
+        objs = super(OccurrenceQuerySet, self).bulk_create(objs, batch_size)
+        invalidate_calendars(*[o.calendar_id for o in objs])
+        return objs
+
+    def update_effective_status(self):
+        """
+        Recomputes ``effective_status`` for the occurrences in this queryset
+        (e.g., after the status of their event or calendar has been changed
+        with a queryset ``update``). This takes a single UPDATE statement per
+        distinct combination of occurrence, event and calendar statuses.
+        Returns the number of occurrences changed.
+        """
+        calendar_ids = self._calendar_ids()
+        combinations = self.order_by().values_list(
+            'status', 'event__status', 'calendar__status'
+        ).distinct()
+        changed = 0
+        for statuses in list(combinations):
+            effective_status = self.model.combine_statuses(*statuses)
+            status, event_status, calendar_status = statuses
+            changed += self.filter(
+                status=status,
+                event__status=event_status,
+                calendar__status=calendar_status
+            ).exclude(effective_status=effective_status).update(
+                effective_status=effective_status,
+                datetime_modified=datetime.now()
+            )
+        if changed:
+            invalidate_calendars(*calendar_ids)
+        return changed
+
+    def _calendar_ids(self):
+        return list(
+            self.order_by().values_list('calendar', flat=True).distinct()
+        )
+
+    def cascade_status(self, chunk_size=None):
+        """
+        Brings the status of each occurrence in this queryset into line with
+        the statuses of its event and calendar. While either of them is not
+        published, an occurrence takes on the most restrictive of the three
+        statuses, with its own status kept in ``previous_status``; once both
+        are published again, its own status is restored.
+
+        This works at the database level, like a queryset ``update``: ``save``
+        is not called and no validation takes place (though
+        ``datetime_modified`` is updated). Each chunk of ``chunk_size``
+        occurrences (defaulting to ``defaults.STATUS_CASCADE_CHUNK_SIZE``),
+        taken in order of primary key, takes a query to find its bounds and
+        a single UPDATE per distinct combination of statuses within it -
+        usually only one or two. Returns the number of occurrences changed.
+        """
+        chunk_size = chunk_size or defaults.STATUS_CASCADE_CHUNK_SIZE
+        calendar_ids = self._calendar_ids()
+        changed = 0
+        pks = self.order_by('pk').values_list('pk', flat=True)
+        last_pk = None
+        while True:
+            chunk = pks
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                break
+            changed += self.filter(
+                pk__gte=chunk[0], pk__lte=chunk[-1]
+            )._cascade_status()
+            if len(chunk) < chunk_size:
+                break
+            last_pk = chunk[-1]
+        if changed:
+            invalidate_calendars(*calendar_ids)
+        return changed
+
+    def _cascade_status(self):
+        combinations = self.order_by().values_list(
+            'status', 'previous_status', 'event__status', 'calendar__status'
+        ).distinct()
+        changed = 0
+        for statuses in list(combinations):
+            status, previous_status, event_status, calendar_status = statuses
+            own_status = previous_status or status
+            new_status = self.model.combine_statuses(
+                own_status, event_status, calendar_status
+            )
+            if new_status == own_status:
+                new_previous_status = ''
+            else:
+                new_previous_status = own_status
+            changed += self.filter(
+                status=status,
+                previous_status=previous_status,
+                event__status=event_status,
+                calendar__status=calendar_status
+            ).exclude(
+                status=new_status,
+                previous_status=new_previous_status,
+                effective_status=new_status
+            ).update(
+                status=new_status,
+                previous_status=new_previous_status,
+                effective_status=new_status,
+                datetime_modified=datetime.now()
             )
+        return changed
+
+    def start_counts(self, precision='day'):
+        """Returns a list of ``(datetime, count)`` pairs: the number of
+        occurrences starting within each day, hour or minute (as specified by
+        ``precision``), using a single grouped query. No occurrences are
+        loaded."""
+        parts = ['year', 'month', 'day', 'hour', 'minute']
+        parts = parts[:parts.index(precision) + 1]
+        ops = connections[self.db].ops
+        column = '%s.%s' % (
+            ops.quote_name(self.model._meta.db_table),
+            ops.quote_name(self.model._meta.get_field('start').column)
+        )
+        select = SortedDict(
+            ('start_%s' % part, ops.date_extract_sql(part, column))
+            for part in parts
+        )
+        rows = self.order_by().extra(select=select).values(
+            *select.keys()
+        ).annotate(count=Count('pk'))
+        return [(datetime(*[int(row[key]) for key in select]), row['count'])
+                for row in rows]
+
+
+class OccurrenceSeriesQuerySet(NonAttendanceQuerySet):
+    def visible(self, user=None):
+        # Series have no effective status (nor any cascaded statuses), so
+        # the statuses of their events and calendars are checked directly:
+        if user and defaults.view_hidden_occurrences_check(user=user):
+            statuses = self.hidden_statuses_for_admins
+        else:
+            statuses = self.hidden_statuses
+        return self.select_related('event', 'calendar').exclude(
+            status__in=statuses).exclude(
+            event__status__in=statuses).exclude(
+            calendar__status__in=statuses)
+
+    def between(self, start, finish):
+        """Returns the series which may have instances starting between
+        ``start`` and ``finish``."""
+        return self.filter(start__lte=finish).filter(
+            Q(last_start__isnull=True) | Q(last_start__gte=start)
+        )
+
+    def expand(self, start, finish, overlap=False):
+        """
+        Returns the virtual occurrences (see ``OccurrenceSeriesBase.expand``)
+        of the series in this queryset, starting between ``start`` and
+        ``finish`` inclusive, in order of start - or, if ``overlap`` is set,
+        overlapping them (i.e. including the instances which began before
+        ``start`` but finish after it). This takes two queries: one for the
+        series, and one for the occurrences replacing any of their
+        instances.
+        """
+        if overlap:
+            series = [
+                s for s in self.filter(start__lte=finish).select_related(
+                    'event', 'calendar')
+                if s.last_start is None or s.last_start + s.duration > start
+            ]
+            # The earliest start of an instance of each series still running
+            # at ``start`` (``rrule`` discards microseconds):
+            starts = dict(
+                (s.pk, start - s.duration + timedelta(seconds=1))
+                for s in series
+            )
+        else:
+            series = list(
+                self.between(start, finish).select_related('event', 'calendar')
+            )
+            starts = dict((s.pk, start) for s in series)
+        if not series:
+            return []
+        Occurrence = series[0].exceptions.model
+        replaced = {}
+        for series_id, original_start in Occurrence._default_manager.filter(
+            series__in=[s.pk for s in series],
+            original_start__range=(min(starts.values()), finish)
+        ).values_list('series', 'original_start'):
+            replaced.setdefault(series_id, set()).add(original_start)
+
+        occurrences = []
+        for s in series:
+            occurrences.extend(
+                s.expand(starts[s.pk], finish, replaced.get(s.pk, ()))
+            )
+        occurrences.sort(key=lambda o: o.start)
+        return occurrences
 
 
 class AttendanceQuerySet(CommonQuerySet):
@@ -88,6 +362,55 @@ class AttendanceQuerySet(CommonQuerySet):
     def active(self):
         return self.exclude(status__in=self.inactive_statuses)
 
+    def with_cancellation_state(self):
+        """Resolves whether each record has been cancelled (see
+        ``AttendanceBase.is_cancelled``) in the same query as the records
+        themselves, rather than with a query per record."""
+        related = self.model.cancellation.related
+        qn = connections[self.db].ops.quote_name
+        table = qn(related.model._meta.db_table)
+        return self.extra(select={'_cancelled': (
+            'SELECT COUNT(*) FROM %s WHERE %s.%s = %s.%s' % (
+                table, table, qn(related.field.column),
+                qn(self.model._meta.db_table), qn(self.model._meta.pk.column)
+            )
+        )})
+
+    def annotate_occurrences(self, occurrences, user=None, chunk_size=None):
+        """
+        Returns ``occurrences`` (a list or queryset, which is evaluated) as a
+        list, each annotated with:
+
+        * ``attendee_count``: the number of its active attendance records.
+        * ``attendance_status``: the status of ``user``'s booked or attended
+          record, or ``None``.
+
+        This takes a grouped query for the counts, and one for the user's
+        records, per ``ATTENDANCE_CHUNK_SIZE`` occurrences - rather than a
+        query or two per occurrence. Virtual occurrences (see
+        ``OccurrenceSeriesBase``) have no attendance.
+        """
+        chunk_size = chunk_size or defaults.ATTENDANCE_CHUNK_SIZE
+        occurrences = list(occurrences)
+        pks = [o.pk for o in occurrences if o.pk is not None]
+        if user is not None and not user.is_authenticated():
+            user = None
+        counts, statuses = {}, {}
+        for i in range(0, len(pks), chunk_size):
+            chunk = pks[i:i + chunk_size]
+            counts.update(self.active.filter(occurrence__in=chunk).order_by(
+                ).values_list('occurrence').annotate(count=Count('pk')))
+            if user is not None:
+                statuses.update(self.filter(
+                    user=user, occurrence__in=chunk,
+                    status__in=[self.model.STATUS.booked,
+                                self.model.STATUS.attended]
+                ).values_list('occurrence', 'status'))
+        for o in occurrences:
+            o.attendee_count = counts.get(o.pk, 0)
+            o.attendance_status = statuses.get(o.pk)
+        return occurrences
+
 
 class CalendarManager(DRYManager):
     use_for_related_fields = True
@@ -110,6 +433,13 @@ class OccurrenceManager(DRYManager):
         return OccurrenceQuerySet(self.model)
 
 
+class OccurrenceSeriesManager(DRYManager):
+    use_for_related_fields = True
+
+    def get_query_set(self):
+        return OccurrenceSeriesQuerySet(self.model)
+
+
 class AttendanceManager(DRYManager):
     use_for_related_fields = True
 
@@ -1,16 +1,28 @@
+from operator import itemgetter
 from dateutil import rrule
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.db import models
+from django.db.models.signals import (
+    class_prepared, post_delete, post_save
+)
 from django.db.models.loading import get_model
+from django.utils.datastructures import SortedDict
 from django.utils.translation import ugettext_lazy as _
 from django_extensions.db.fields import (
     CreationDateTimeField, ModificationDateTimeField, AutoSlugField
 )
 from threaded_multihost.fields import CreatorField, EditorField
 from calendartools import defaults
+from calendartools.cache import bump_calendar_versions, invalidate_calendars
 from calendartools.exceptions import MaxOccurrenceCreationsExceeded
 from calendartools.signals import collect_validators
+from calendartools.validators.base import (
+    get_receivers, get_validators, is_validator_class, validator_priority
+)
 from calendartools.modelproxy import LocalizedOccurrenceProxy
+from calendartools.recurrence import (
+    expand_rrule, format_rrule, last_instance, parse_rrule, rrule_parts
+)
 
 try:
     from functools import partial
@@ -41,12 +53,22 @@ class StatusBase(AuditedModel):
         ('hidden',    _('Hidden')),
         ('inactive',  _('Inactive')),
     )
+    # Most restrictive first - see ``combine_statuses``:
+    STATUS_PRECEDENCE = (
+        STATUS.inactive, STATUS.hidden, STATUS.cancelled, STATUS.published
+    )
 
 
     class Meta(object):
         app_label = defaults.CALENDAR_APP_LABEL
         abstract = True
 
+    @classmethod
+    def combine_statuses(cls, *statuses):
+        """Returns the most restrictive of ``statuses`` (e.g., an occurrence
+        of a hidden event is hidden, even if the occurrence is published)."""
+        return min(statuses, key=cls.STATUS_PRECEDENCE.index)
+
     @property
     def status_slug(self):
         """
@@ -56,7 +78,58 @@ class StatusBase(AuditedModel):
         return self.status
 
 
-class CalendarBase(StatusBase):
+class EffectiveStatusField(models.CharField):
+    """
+    Holds the combined status of an occurrence, its event and its calendar
+    (see ``StatusBase.combine_statuses``), so that the visibility of
+    occurrences can be decided without joining their events and calendars.
+    The value is recomputed whenever the occurrence is saved, and whenever
+    the status of its calendar or event changes (see
+    ``OccurrenceStatusMixin``).
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 100)
+        kwargs.setdefault('choices', StatusBase.STATUS)
+        kwargs.setdefault('default', StatusBase.STATUS.published)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('db_index', True)
+        super(EffectiveStatusField, self).__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.get_effective_status()
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class OccurrenceStatusMixin(object):
+    """
+    For models whose status applies to their ``occurrences`` (i.e., calendars
+    and events): when the status changes on ``save``, it is cascaded to all of
+    the occurrences, and reverting it to 'published' restores them to their
+    former states (see ``OccurrenceQuerySet.cascade_status``). Note that a
+    queryset ``update`` of the status does not cascade.
+    """
+    def __init__(self, *args, **kwargs):
+        super(OccurrenceStatusMixin, self).__init__(*args, **kwargs)
+        # The status as loaded, so that ``save`` needn't query for it (read
+        # from ``__dict__``, so as not to load a deferred status):
+        self._saved_status = self.pk and self.__dict__.get('status') or None
+
+    def save(self, *args, **kwargs):
+        previous_status = self._saved_status
+        if self.pk and previous_status is None:
+            statuses = self.__class__._default_manager.filter(
+                pk=self.pk).values_list('status', flat=True)
+            if statuses:
+                previous_status = statuses[0]
+        value = super(OccurrenceStatusMixin, self).save(*args, **kwargs)
+        self._saved_status = self.status
+        if previous_status and previous_status != self.status:
+            self.occurrences.all().cascade_status()
+        return value
+
+
+class CalendarBase(OccurrenceStatusMixin, StatusBase):
     name = models.CharField(_('name'), max_length=255)
     slug = AutoSlugField(_('slug'), unique=True, editable=True, populate_from='name')
     description = models.TextField(_('description'), blank=True)
@@ -87,7 +160,7 @@ class CalendarBase(StatusBase):
         return ('calendar-detail', [], {'slug': self.slug})
 
 
-class EventBase(StatusBase):
+class EventBase(OccurrenceStatusMixin, StatusBase):
     name = models.CharField(_('name'), max_length=255)
     slug = AutoSlugField(_('slug'),
         unique=True,
@@ -122,7 +195,7 @@ class EventBase(StatusBase):
         return ('event-detail', [], {'slug': self.slug})
 
     def add_occurrences(self, calendar, start, finish, commit=True,
-                        **rrule_params):
+                        bulk=False, **rrule_params):
         '''
         Add one or more occurrences to the event using a comparable API to
         ``dateutil.rrule``. Returns a list of created ``Occurrence`` objects.
@@ -140,9 +213,24 @@ class EventBase(StatusBase):
 
         If ``commit`` is ``False``, the ``Occurrence`` objects are not saved to
         the database.
+
+        If ``bulk`` is ``True`` (and ``commit`` is ``True``), the whole batch
+        is validated in memory first - raising a single ``ValidationError``
+        if any occurrence is invalid, in which case none are saved - and then
+        written with multi-row INSERTs in one transaction (see
+        ``CommonQuerySet.bulk_create``). The occurrences returned will not
+        have their primary keys set.
         '''
         rrule_params.setdefault('freq', rrule.DAILY)
 
+        if commit and bulk:
+            occurrences = self.add_occurrences(
+                calendar, start, finish, commit=False, **rrule_params
+            )
+            Occurrence = self.occurrences.model
+            Occurrence.full_clean_batch(occurrences)
+            return Occurrence._default_manager.bulk_create(occurrences)
+
         if commit:
             make_occurrence = partial(self.occurrences.create, calendar=calendar)
         else:
@@ -163,6 +251,25 @@ class EventBase(StatusBase):
                 creation_count += 1
             return occurrences
 
+    def add_series(self, calendar, start, finish, commit=True,
+                   **rrule_params):
+        '''
+        Adds a recurring series of occurrences to the event, taking the same
+        arguments as ``add_occurrences``. Rather than creating an
+        ``Occurrence`` for each instance, the recurrence rule is stored once
+        (see ``OccurrenceSeriesBase``) - so neither ``count`` nor ``until``
+        is required, and ``MAX_OCCURRENCE_CREATION_COUNT`` does not apply.
+        Returns the ``OccurrenceSeries``.
+        '''
+        rrule_params.setdefault('freq', rrule.DAILY)
+        series = self.series.model(
+            calendar=calendar, event=self, start=start, finish=finish,
+            rule=format_rrule(**rrule_params)
+        )
+        if commit:
+            series.save()
+        return series
+
     @property
     def is_cancelled(self):
         return self.status == self.STATUS.cancelled
@@ -172,15 +279,114 @@ class PluggableValidationMixin(object):
     def collect_and_run_validators(self):
         """Collects all pluggable validation checks and runs them, in order of
         priority."""
-        validators = collect_validators.send(sender=self.__class__, instance=self)
-        validators = [v[1] for v in validators] # instances only
-        validators.sort(key=lambda v: v.priority, reverse=True)
-        for validator in validators:
+        if getattr(self, '_defer_validators', False):
+            # Validating as part of a batch - see ``batch_validation_errors``.
+            self._validators_pending = True
+            return
+        for receiver, validator in get_validators(self.__class__, self):
             validator.validate()
 
     def clean(self):
         self.collect_and_run_validators()
 
+    @classmethod
+    def batch_validation_errors(cls, instances):
+        """
+        Validates each of ``instances`` as ``full_clean`` would, returning a
+        dictionary which maps the position of each invalid instance within
+        ``instances`` to its error messages.
+
+        The receivers of ``collect_validators`` are resolved once for the
+        whole batch, and each validator class is run over all of the
+        instances at once (see ``BaseValidator.validate_batch``). Foreign
+        keys are validated once per distinct value, rather than once per
+        instance (each validation being a query).
+        """
+        foreign_keys = [f for f in cls._meta.fields
+                        if isinstance(f, models.ForeignKey)]
+        exclude = [f.name for f in foreign_keys]
+        errors = {}
+        pending = []
+        for i, instance in enumerate(instances):
+            instance._defer_validators = True
+            instance._validators_pending = False
+            try:
+                instance.full_clean(exclude=exclude)
+            except ValidationError, e:
+                errors.setdefault(i, []).extend(e.messages)
+            del instance._defer_validators
+            if instance._validators_pending:
+                pending.append(i)
+            del instance._validators_pending
+
+        for field in foreign_keys:
+            positions = {}
+            for i, instance in enumerate(instances):
+                value = getattr(instance, field.attname)
+                positions.setdefault(value, []).append(i)
+            for value, indexes in positions.items():
+                try:
+                    field.clean(value, instances[indexes[0]])
+                except ValidationError, e:
+                    for i in indexes:
+                        errors.setdefault(i, []).extend(e.messages)
+
+        # As with ``collect_and_run_validators``, the first validator an
+        # instance fails stops its validation. The receivers are resolved
+        # once for the batch: validator classes are run over many instances
+        # at once, while any other receiver returns a validator per instance
+        # - whose priority may vary, so instances are grouped by the order in
+        # which their validators run.
+        receivers = pending and get_receivers(cls, instances[pending[0]])
+        chains = SortedDict()
+        for i in pending:
+            steps = []
+            for receiver in receivers:
+                if is_validator_class(receiver):
+                    validator, priority = None, validator_priority(receiver)
+                else:
+                    validator = receiver(signal=collect_validators,
+                                         sender=cls, instance=instances[i])
+                    priority = validator_priority(validator)
+                steps.append((priority, receiver, validator))
+            steps.sort(key=itemgetter(0), reverse=True)
+            chains.setdefault(tuple(step[1] for step in steps), []).append(
+                (i, [step[2] for step in steps])
+            )
+        for chain, members in chains.items():
+            failed = set()
+            for position, receiver in enumerate(chain):
+                batch = [(i, validators[position])
+                         for i, validators in members if i not in failed]
+                if not batch:
+                    break
+                if is_validator_class(receiver):
+                    failures = receiver.validate_batch(
+                        cls, [instances[i] for i, validator in batch],
+                        signal=collect_validators
+                    )
+                else:
+                    failures = {}
+                    for j, (i, validator) in enumerate(batch):
+                        try:
+                            validator.validate()
+                        except ValidationError, e:
+                            failures[j] = e
+                for j, e in failures.items():
+                    failed.add(batch[j][0])
+                    errors.setdefault(batch[j][0], []).extend(e.messages)
+        return errors
+
+    @classmethod
+    def full_clean_batch(cls, instances):
+        """Validates ``instances`` (see ``batch_validation_errors``). If any
+        of them are invalid, raises a single ``ValidationError``, whose
+        ``message_dict`` maps the position of each invalid instance to its
+        error messages."""
+        errors = cls.batch_validation_errors(instances)
+        if errors:
+            raise ValidationError(errors)
+
     def save(self, *args, **kwargs):
         self.full_clean()
         return super(PluggableValidationMixin, self).save(*args, **kwargs)
@@ -195,6 +401,24 @@ class OccurrenceBase(PluggableValidationMixin, StatusBase):
     status = StatusField(_('status'),
         help_text=_('Toggle occurrences inactive rather than deleting them.')
     )
+    effective_status = EffectiveStatusField(_('effective status'))
+    # Set while a calendar/event status has been cascaded to the occurrence:
+    previous_status = models.CharField(_('previous status'), max_length=100,
+        choices=StatusBase.STATUS, blank=True, editable=False
+    )
+    # For occurrences which replace an instance of a series (see
+    # ``OccurrenceSeriesBase``), the start of the instance replaced:
+    original_start = models.DateTimeField(_('original start'), null=True,
+        blank=True, editable=False
+    )
+    # Serve the date-ranged lookups of the calendar views (see
+    # ``calendartools.indexes``):
+    composite_indexes = (
+        ('calendar', 'start'),
+        ('calendar', 'finish'),
+        ('event', 'start'),
+        ('calendar', 'effective_status', 'start'),
+    )
 
 
     class Meta(object):
@@ -211,11 +435,35 @@ class OccurrenceBase(PluggableValidationMixin, StatusBase):
 
     @models.permalink
     def get_absolute_url(self):
+        if self.is_virtual:
+            return ('event-detail', [], {'slug': self.event.slug})
         return ('occurrence-detail', [], {
             'slug':   self.event.slug,
             'pk':     self.pk
         })
 
+    @property
+    def is_virtual(self):
+        """True for the unsaved instances of a series (see
+        ``OccurrenceSeriesBase.expand``)."""
+        return self.pk is None and getattr(self, 'series_id', None) is not None
+
+    def __init__(self, *args, **kwargs):
+        super(OccurrenceBase, self).__init__(*args, **kwargs)
+        # So that moving an occurrence to another calendar also invalidates
+        # the cached bounds of the calendar it was moved from:
+        self._saved_calendar_id = getattr(self, 'calendar_id', None)
+        self._saved_state = self.pk and self._status_state() or None
+
+    def _status_state(self):
+        """The values ``effective_status`` is derived from, and its own -
+        read from ``__dict__``, so as not to load deferred fields."""
+        state = tuple(self.__dict__.get(name) for name in (
+            'status', 'event_id', 'calendar_id', 'effective_status'
+        ))
+        if None not in state:
+            return state
+
     def clean(self):
         if (self.start and not self.finish):
             self.finish = self.start + defaults.DEFAULT_OCCURRENCE_DURATION
@@ -223,16 +471,167 @@ class OccurrenceBase(PluggableValidationMixin, StatusBase):
             return # to be dealt with by built-in validators
         super(OccurrenceBase, self).clean()
 
+    def get_effective_status(self):
+        """
+        Combines the statuses of the occurrence, its event and its calendar.
+
+        An occurrence whose status, event and calendar are unchanged since it
+        was loaded keeps its stored effective status - which is kept up to
+        date as its event and calendar change - so saving it needn't fetch
+        the event and calendar. Otherwise, they are fetched unless already
+        cached.
+        """
+        state = self._saved_state
+        if state is not None and state == self._status_state():
+            return self.effective_status
+        return self.combine_statuses(
+            self.status, self.event.status, self.calendar.status
+        )
+
     @property
     def is_cancelled(self):
         return (self.status == self.STATUS.cancelled or
                 self.calendar.status == self.calendar.STATUS.cancelled or
                 self.event.status == self.event.STATUS.cancelled)
 
+    def save(self, *args, **kwargs):
+        if self.previous_status and self.status != self._saved_status():
+            # Edited while a calendar or event status is cascaded to it (see
+            # ``OccurrenceQuerySet.cascade_status``): the edited status is now
+            # its own, rather than the one kept to be restored.
+            self.previous_status = ''
+        value = super(OccurrenceBase, self).save(*args, **kwargs)
+        self._saved_state = self._status_state()
+        return value
+
+    def _saved_status(self):
+        """The status as last loaded or saved - queried for only if it
+        wasn't loaded."""
+        if self._saved_state is not None:
+            return self._saved_state[0]
+        if self.pk:
+            statuses = self.__class__._default_manager.filter(
+                pk=self.pk).values_list('status', flat=True)
+            if statuses:
+                return statuses[0]
+
     def localize(self, timezone):
         return LocalizedOccurrenceProxy(self, timezone=timezone)
 
 
+class OccurrenceSeriesBase(StatusBase):
+    """
+    A recurring series of occurrences, stored once as a recurrence rule
+    rather than as an ``Occurrence`` per instance - so that a series may
+    recur indefinitely. The instances within any window of time are expanded
+    on demand (see ``expand``) into unsaved, "virtual" occurrences.
+
+    Only the instances which differ from the series are saved, as
+    occurrences of the series recording the instance they replace in their
+    ``original_start`` (see ``materialize``). To remove an instance, save it
+    as an inactive occurrence.
+    """
+    start = models.DateTimeField(_('start'))
+    finish = models.DateTimeField(_('finish'))
+    rule = models.CharField(_('recurrence rule'), max_length=255)
+    # The start of the final instance, or None if the series never ends:
+    last_start = models.DateTimeField(_('last start'), null=True, blank=True,
+        editable=False
+    )
+    status = StatusField(_('status'),
+        help_text=_('Toggle series inactive rather than deleting them.')
+    )
+
+
+    class Meta(object):
+        verbose_name = _('Occurrence Series')
+        verbose_name_plural = _('Occurrence Series')
+        get_latest_by = 'datetime_created'
+        app_label = defaults.CALENDAR_APP_LABEL
+        abstract = True
+
+    def __unicode__(self):
+        return u"%s @ %s (%s)" % (
+            self.event.name, self.start.strftime('%Y-%m-%d %H:%M:%S'),
+            self.rule
+        )
+
+    def __init__(self, *args, **kwargs):
+        super(OccurrenceSeriesBase, self).__init__(*args, **kwargs)
+        self._saved_calendar_id = getattr(self, 'calendar_id', None)
+
+    def clean(self):
+        if self.start and self.finish and self.start >= self.finish:
+            raise ValidationError(_('Finish date must be after start date.'))
+        if self.start and self.rule:
+            parts = rrule_parts(self.rule)
+            if 'COUNT' in parts and 'UNTIL' in parts:
+                raise ValidationError(_(
+                    'A recurrence rule may not have both a COUNT and an UNTIL.'
+                ))
+            try:
+                self.get_rrule()
+            except ValueError:
+                raise ValidationError(_('Invalid recurrence rule.'))
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        self.last_start = last_instance(self.rule, self.start)
+        return super(OccurrenceSeriesBase, self).save(*args, **kwargs)
+
+    @property
+    def duration(self):
+        return self.finish - self.start
+
+    def get_rrule(self):
+        return parse_rrule(self.rule, self.start)
+
+    def get_effective_status(self):
+        return self.combine_statuses(
+            self.status, self.event.status, self.calendar.status
+        )
+
+    def get_occurrence(self, start):
+        """Returns the (unsaved) occurrence for the instance at ``start``."""
+        return self.exceptions.model(
+            calendar=self.calendar, event=self.event, series=self,
+            start=start, finish=start + self.duration, original_start=start,
+            status=self.status, effective_status=self.get_effective_status()
+        )
+
+    def instances(self, start, finish):
+        """Returns the starts of the instances starting between ``start`` and
+        ``finish`` inclusive. Expansions are cached (see
+        ``calendartools.recurrence``), so this needn't expand every instance
+        since the start of the series each time."""
+        return expand_rrule(self.rule, self.start, start, finish)
+
+    def expand(self, start, finish, replaced=None):
+        """
+        Returns the virtual occurrences starting between ``start`` and
+        ``finish`` inclusive, omitting the instances replaced by saved
+        occurrences. ``replaced`` - the ``original_start`` of each such
+        occurrence - is looked up if not given.
+        """
+        if replaced is None:
+            replaced = set(self.exceptions.filter(
+                original_start__range=(start, finish)
+            ).values_list('original_start', flat=True))
+        return [self.get_occurrence(dt) for dt in self.instances(start, finish)
+                if dt not in replaced]
+
+    def materialize(self, original_start, commit=True, **kwargs):
+        """Returns an occurrence replacing the instance at ``original_start``,
+        with any fields given in ``kwargs`` changed (e.g. ``start``, or
+        ``status``). It is saved unless ``commit`` is False."""
+        occurrence = self.get_occurrence(original_start)
+        for name, value in kwargs.items():
+            setattr(occurrence, name, value)
+        if commit:
+            occurrence.save()
+        return occurrence
+
+
 class AttendanceBase(PluggableValidationMixin, AuditedModel):
     STATUS = Choices(
         ('booked',    _('Booked')),
@@ -263,7 +662,9 @@ class AttendanceBase(PluggableValidationMixin, AuditedModel):
 
     def clean(self):
         super(AttendanceBase, self).clean()
-        if self.status != self.STATUS.cancelled and self.is_cancelled:
+        # Unsaved records cannot have been cancelled - no need for a query:
+        if (self.status != self.STATUS.cancelled and self.pk and
+            self.is_cancelled):
             raise ValidationError(
                 'Attendance records cannot be uncancelled - '
                 'please create a new attendance record.'
@@ -271,14 +672,25 @@ class AttendanceBase(PluggableValidationMixin, AuditedModel):
 
     @property
     def is_cancelled(self):
-        try:
-            self.cancellation
-            return True
-        except ObjectDoesNotExist:
-            return False
+        """Whether a cancellation record exists for this record. This is
+        looked up at most once per instance - or not at all for instances
+        fetched ``with_cancellation_state`` (see ``AttendanceQuerySet``)."""
+        if getattr(self, '_cancelled', None) is None:
+            if not self.pk:
+                return False
+            try:
+                self.cancellation
+                self._cancelled = True
+            except ObjectDoesNotExist:
+                self._cancelled = False
+        return bool(self._cancelled)
 
     def save(self, *args, **kwargs):
+        created = not self.pk
         value = super(AttendanceBase, self).save(*args, **kwargs)
+        if created:
+            # No cancellation can refer to a record until it is saved:
+            self._cancelled = False
         if self.status == self.STATUS.cancelled and not self.is_cancelled:
             Cancellation = get_model(defaults.CALENDAR_APP_LABEL, 'Cancellation')
             Cancellation.objects.create(attendance=self)
@@ -300,7 +712,47 @@ class CancellationBase(AuditedModel):
 
     def save(self, *args, **kwargs):
         value = super(CancellationBase, self).save(*args, **kwargs)
+        self.attendance._cancelled = True
         if self.attendance.status != self.attendance.STATUS.cancelled:
             self.attendance.status = self.attendance.STATUS.cancelled
             self.attendance.save()
         return value
+
+
+def invalidate_cached_calendars(sender, instance, **kwargs):
+    if isinstance(instance, (OccurrenceBase, OccurrenceSeriesBase)):
+        invalidate_calendars(instance.calendar_id,
+                             getattr(instance, '_saved_calendar_id', None))
+        instance._saved_calendar_id = instance.calendar_id
+    elif isinstance(instance, CalendarBase):
+        invalidate_calendars(instance.pk)
+    elif isinstance(instance, EventBase) and kwargs.get('created') is False:
+        # i.e., an existing event was saved. (New events have no occurrences,
+        # and deleted events' occurrences invalidate their own calendars.)
+        invalidate_calendars(*instance.occurrences.values_list(
+            'calendar', flat=True).distinct())
+        if hasattr(instance, 'series'):
+            invalidate_calendars(*instance.series.values_list(
+                'calendar', flat=True).distinct())
+    elif isinstance(instance, AttendanceBase):
+        # Pages show attendance (see ``CALENDAR_SHOW_ATTENDANCE``), though
+        # not the calendar's bounds - so just its version is bumped:
+        field = instance._meta.get_field('occurrence')
+        occurrence = getattr(instance, field.get_cache_name(), None)
+        if occurrence is not None:
+            bump_calendar_versions(occurrence.calendar_id)
+        else:
+            bump_calendar_versions(*field.rel.to._default_manager.filter(
+                pk=instance.occurrence_id).values_list('calendar', flat=True))
+
+
+def connect_cache_invalidation(sender, **kwargs):
+    """Connects ``invalidate_cached_calendars`` to the saves and deletions of
+    each concrete calendar, event, occurrence, series and attendance model,
+    as it is prepared - rather than to those of every model."""
+    if issubclass(sender, (CalendarBase, EventBase, OccurrenceBase,
+                           OccurrenceSeriesBase, AttendanceBase)):
+        post_save.connect(invalidate_cached_calendars, sender=sender)
+        post_delete.connect(invalidate_cached_calendars, sender=sender)
+
+class_prepared.connect(connect_cache_invalidation)
@@ -1,7 +1,10 @@
+from datetime import datetime
+
 from calendartools.periods.proxybase import LocalizedSimpleProxy
+from calendartools.tz import (
+    get_default_timezone, localize_datetime, localize_datetimes
+)
 from django.conf import settings
-from timezones.utils import localtime_for_timezone
-import pytz
 
 try:
     from functools import partial
@@ -18,12 +21,32 @@ class LocalizedOccurrenceProxy(LocalizedSimpleProxy):
         if isinstance(obj, self.__class__):
             obj = obj._obj
         super(LocalizedOccurrenceProxy, self).__init__(obj, *args, **kwargs)
+        self._localized = {}
 
     def _get_datetime_attr(self, attrname):
         dt = getattr(self._obj, attrname)
-        return localtime_for_timezone(dt, self.timezone)
+        cached = self._localized.get(attrname)
+        if (cached and cached[0] is dt and cached[1] == settings.TIME_ZONE and
+            cached[2] is self.timezone):
+            return cached[3]
+        default_timezone = self.default_timezone
+        value = localize_datetime(
+            dt, self.timezone or default_timezone, default_timezone
+        )
+        self._cache_datetime_attr(attrname, value)
+        return value
+
+    def _cache_datetime_attr(self, attrname, value):
+        """Stores ``value`` as the localized form of the current value of
+        ``attrname``. It is discarded as soon as the underlying value, the
+        proxy's timezone or ``settings.TIME_ZONE`` changes."""
+        self._localized[attrname] = (
+            getattr(self._obj, attrname), settings.TIME_ZONE, self.timezone,
+            value
+        )
 
     def _set_datetime_attr(self, value, attrname):
+        self._localized.pop(attrname, None)
         if value.tzinfo is not None:
             value = value.astimezone(self.default_timezone).replace(tzinfo=None)
         setattr(self._obj, attrname, value)
@@ -52,4 +75,31 @@ class LocalizedOccurrenceProxy(LocalizedSimpleProxy):
 
     @property
     def default_timezone(self):
-        return pytz.timezone(settings.TIME_ZONE)
+        return get_default_timezone()
+
+
+def localize_occurrences(occurrences, timezone):
+    """
+    Returns a list of ``occurrences`` localized for ``timezone``. Rather than
+    leaving each ``LocalizedOccurrenceProxy`` to convert its own start and
+    finish on access, all of them are converted up front in a single pass
+    (see ``calendartools.tz.localize_datetimes``). Anything which can't be
+    localized is passed through unchanged.
+    """
+    localized = [o.localize(timezone=timezone) if hasattr(o, 'localize') else o
+                 for o in occurrences]
+    proxies = [o for o in localized if isinstance(o, LocalizedOccurrenceProxy)]
+    if not proxies:
+        return localized
+
+    from_timezone = get_default_timezone()
+    to_timezone = proxies[0].timezone or from_timezone
+    for attrname in ('start', 'finish'):
+        pending = [(p, getattr(p._obj, attrname)) for p in proxies]
+        pending = [(p, dt) for p, dt in pending if isinstance(dt, datetime)]
+        values = localize_datetimes(
+            [dt for p, dt in pending], to_timezone, from_timezone
+        )
+        for (proxy, dt), value in zip(pending, values):
+            proxy._cache_datetime_attr(attrname, value)
+    return localized
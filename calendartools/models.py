@@ -1,2 +1,6 @@
-# Empty models.py - required for calendartools to be recognised as a
-# Django application.
+# Required for calendartools to be recognised as a Django application - and
+# to create the composite indexes of the calendar models on syncdb.
+from django.db.models.signals import post_syncdb
+from calendartools.indexes import create_composite_indexes
+
+post_syncdb.connect(create_composite_indexes)
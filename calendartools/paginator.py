@@ -0,0 +1,166 @@
+"""
+Keyset (or "seek") pagination of occurrences.
+
+``django.core.paginator.Paginator`` counts the whole queryset and then
+fetches each page with OFFSET/LIMIT, so later pages take longer and longer
+to fetch - the database reads and discards every row before them. A
+``KeysetPaginator`` instead fetches the page following (or preceding) a
+*cursor* - the ``(start, pk)`` of the last (or first) occurrence of the page
+the client was on - which is an indexed range lookup however deep the page.
+
+Cursors are opaque tokens, carried in the query string. Counting the
+occurrences (for the number of pages) is optional; without it, the page
+range is approximated from the pages seen so far.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from math import ceil
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+
+__all__ = ['KeysetPaginator', 'KeysetPage', 'InvalidPage']
+
+CURSOR_DATETIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(direction, value, pk, number):
+    return urlsafe_b64encode('%s:%s:%s:%s' % (
+        direction, value.strftime(CURSOR_DATETIME_FORMAT), pk, number
+    ))
+
+
+def decode_cursor(cursor):
+    """Returns ``(direction, value, pk, number)`` for the token ``cursor``,
+    raising ``InvalidPage`` if it can't be decoded."""
+    try:
+        direction, value, pk, number = urlsafe_b64decode(
+            str(cursor)).split(':')
+        if direction not in ('next', 'previous'):
+            raise ValueError
+        return (direction, datetime.strptime(value, CURSOR_DATETIME_FORMAT),
+                int(pk), max(1, int(number)))
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidPage('Invalid cursor')
+
+
+class KeysetPaginator(object):
+    """
+    Paginates ``queryset`` in order of ``field`` (a datetime field) and then
+    primary key. ``count`` determines whether the objects are counted: if
+    not, ``count`` and ``num_pages`` are ``None``, and ``page_range`` only
+    extends to the furthest page known to exist.
+    """
+    def __init__(self, queryset, per_page, field='start', count=True,
+                 allow_empty_first_page=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.counted = count
+        self.allow_empty_first_page = allow_empty_first_page
+        self._count = None
+        self._known_pages = 1
+
+    def page(self, cursor=None):
+        """Returns the ``KeysetPage`` which ``cursor`` leads to - or the first
+        page, if no cursor is given."""
+        field = self.field
+        if cursor is None:
+            direction, number = 'next', 1
+            queryset = self.queryset
+        else:
+            direction, value, pk, number = decode_cursor(cursor)
+            # The (redundant) range on ``field`` alone lets the database seek
+            # along an index on it, which the disjunction would prevent:
+            if direction == 'next':
+                queryset = self.queryset.filter(**{
+                    '%s__gte' % field: value
+                }).filter(Q(**{'%s__gt' % field: value}) | Q(pk__gt=pk))
+            else:
+                queryset = self.queryset.filter(**{
+                    '%s__lte' % field: value
+                }).filter(Q(**{'%s__lt' % field: value}) | Q(pk__lt=pk))
+
+        # One more object than is needed shows whether there are more:
+        if direction == 'next':
+            objects = list(
+                queryset.order_by(field, 'pk')[:self.per_page + 1]
+            )
+            has_more = len(objects) > self.per_page
+            objects = objects[:self.per_page]
+            has_previous, has_next = cursor is not None, has_more
+        else:
+            objects = list(
+                queryset.order_by('-%s' % field, '-pk')[:self.per_page + 1]
+            )
+            has_more = len(objects) > self.per_page
+            objects = objects[:self.per_page][::-1]
+            has_previous, has_next = has_more, True
+            if not has_previous:
+                number = 1
+
+        if not objects and (number > 1 or not self.allow_empty_first_page):
+            raise InvalidPage('That page contains no results')
+        self._known_pages = max(self._known_pages, number + int(has_next))
+        return KeysetPage(objects, number, self, has_previous, has_next)
+
+    @property
+    def count(self):
+        if self.counted and self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        if not self.counted:
+            return None
+        if not self.count and not self.allow_empty_first_page:
+            return 0
+        return max(1, int(ceil(self.count / float(self.per_page))))
+
+    @property
+    def page_range(self):
+        """The 1-based range of page numbers - approximate (i.e., up to the
+        furthest page seen) when objects aren't counted."""
+        return range(1, (self.num_pages or self._known_pages) + 1)
+
+
+class KeysetPage(Page):
+    def __init__(self, object_list, number, paginator, has_previous,
+                 has_next):
+        super(KeysetPage, self).__init__(object_list, number, paginator)
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<Page %s>' % self.number
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(
+            direction, getattr(obj, self.paginator.field), obj.pk,
+            self.number + (direction == 'next' and 1 or -1)
+        )
+
+    @property
+    def next_cursor(self):
+        if self.has_next() and self.object_list:
+            return self._cursor('next', self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous() and self.object_list:
+            return self._cursor('previous', self.object_list[0])
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return self.paginator.per_page * (self.number - 1) + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
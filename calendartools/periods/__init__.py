@@ -1,2 +1,4 @@
 from calendartools.periods.proxybase import *
+from calendartools.periods.index import *
+from calendartools.periods.layout import *
 from calendartools.periods.periods import *
@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from operator import itemgetter
+
+__all__ = ['OccurrenceIndex', 'OccurrenceCountIndex']
+
+
+def coerce_to_naive_datetime(dt):
+    """Returns the wall-clock value of ``dt`` as a naive datetime with no
+    microseconds (mirroring ``Period.convert``), or ``None`` if ``dt`` cannot
+    be coerced. ``datetime.date`` objects are treated as midnight."""
+    try:
+        if not hasattr(dt, 'hour'):
+            return datetime(dt.year, dt.month, dt.day)
+        return datetime(dt.year, dt.month, dt.day,
+                        dt.hour, dt.minute, dt.second)
+    except (AttributeError, ValueError, TypeError):
+        return
+
+
+class OccurrenceIndex(object):
+    """
+    A read-only view over a collection of occurrences, sorted by the
+    (localized) value of ``key`` - which defaults to each occurrence's start.
+
+    The index is built once (an O(n log n) sort, localizing every occurrence
+    in a single batch) and can then be narrowed to any sub-range with
+    ``slice`` in O(log n) via bisection. Slices share the underlying arrays
+    of the index they were taken from, so an entire ``Period`` tree can be
+    populated from a single sort, rather than each child re-scanning its
+    parent's occurrences.
+    """
+
+    def __init__(self, occurrences=(), timezone=None, key=None):
+        if key is None:
+            key = lambda o: o.start
+        if timezone:
+            # Imported here to avoid a circular import via modelproxy:
+            from calendartools.modelproxy import localize_occurrences
+            occurrences = localize_occurrences(occurrences, timezone)
+
+        pairs = []
+        for o in occurrences:
+            value = coerce_to_naive_datetime(key(o))
+            if value is not None:
+                pairs.append((value, o))
+        pairs.sort(key=itemgetter(0)) # stable: ties keep their input order.
+
+        self.timezone = timezone
+        self._keys  = [k for k, o in pairs]
+        self._items = [o for k, o in pairs]
+        self._lo, self._hi = 0, len(pairs)
+
+    def _view(self, lo, hi):
+        view = self.__class__.__new__(self.__class__)
+        view.__dict__.update(self.__dict__)
+        view._lo, view._hi = lo, hi
+        return view
+
+    def slice(self, start, finish):
+        """Returns a view of the occurrences whose key falls within ``start``
+        and ``finish`` inclusive. The view is always restricted to the range
+        covered by this index."""
+        lo = bisect_left(self._keys, start, self._lo, self._hi)
+        hi = bisect_right(self._keys, finish, lo, self._hi)
+        return self._view(lo, hi)
+
+    def preceding(self):
+        """Returns a view of the occurrences of the whole index which this
+        view was taken from, whose key falls before this view's."""
+        return self._view(0, self._lo)
+
+    def split(self, boundaries):
+        """Returns a view for each consecutive pair of the ascending
+        ``boundaries``, of the occurrences whose key falls from the first
+        (inclusive) up to the second (exclusive). The views are found in a
+        single sweep, rather than a search apiece."""
+        keys, end = self._keys, self._hi
+        lo = bisect_left(keys, boundaries[0], self._lo, end)
+        views = []
+        for boundary in boundaries[1:]:
+            hi = lo
+            while hi < end and keys[hi] < boundary:
+                hi += 1
+            views.append(self._view(lo, hi))
+            lo = hi
+        return views
+
+    def as_list(self):
+        return self._items[self._lo:self._hi]
+
+    def count(self):
+        """Returns the number of occurrences in this index."""
+        return len(self)
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __nonzero__(self):
+        return self._hi > self._lo
+
+    def __iter__(self):
+        return iter(self.as_list())
+
+    def __repr__(self):
+        return '<%s: %d occurrences>' % (self.__class__.__name__, len(self))
+
+
+class OccurrenceCountIndex(OccurrenceIndex):
+    """
+    An ``OccurrenceIndex`` over pre-aggregated ``(datetime, count)`` pairs -
+    such as those from ``OccurrenceQuerySet.start_counts`` - for when only the
+    number of occurrences in each period is needed, rather than the
+    occurrences themselves. It can be sliced just like an ``OccurrenceIndex``;
+    ``count`` sums the counts within the slice (in constant time, from a
+    running total) and no occurrences are ever listed.
+
+    The datetimes should already be localized for ``timezone``.
+    """
+
+    def __init__(self, counts=(), timezone=None):
+        pairs = []
+        for dt, count in counts:
+            value = coerce_to_naive_datetime(dt)
+            if value is not None:
+                pairs.append((value, count))
+        pairs.sort(key=itemgetter(0))
+
+        self.timezone = timezone
+        self._keys = [k for k, count in pairs]
+        self._items = []
+        self._totals = [0]
+        for k, count in pairs:
+            self._totals.append(self._totals[-1] + count)
+        self._lo, self._hi = 0, len(pairs)
+
+    def as_list(self):
+        return []
+
+    def count(self):
+        return self._totals[self._hi] - self._totals[self._lo]
+
+    def __len__(self):
+        return self.count()
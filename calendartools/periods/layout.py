@@ -0,0 +1,132 @@
+"""
+Placement of occurrences in grids of consecutive periods, by overlap.
+
+A ``Period`` holds the occurrences which *start* within it, so an occurrence
+lasting several hours appears in only the first slot of a day's grid, and
+one lasting several days only on its first day. ``overlapping`` instead
+finds every occurrence each period overlaps, and ``place`` additionally lays
+concurrent occurrences out side by side in lanes - both with a sweep line
+over the occurrences' starts and finishes, in O((n + periods) log n), rather
+than testing every occurrence against every period.
+"""
+from datetime import timedelta
+from heapq import heappop, heappush
+from operator import attrgetter
+
+from calendartools.periods.index import coerce_to_naive_datetime
+
+__all__ = ['Placement', 'overlapping', 'assign_lanes', 'place']
+
+
+class Placement(object):
+    """An occurrence laid out in ``lane`` (counting from 0) of the ``lanes``
+    side-by-side lanes shared by the occurrences it (transitively) overlaps.
+    ``continued`` is set where it's placed in a period after the one it
+    starts in (see ``place``)."""
+    __slots__ = ('occurrence', 'lane', 'lanes', 'continued')
+
+    def __init__(self, occurrence, lane=0, lanes=1, continued=False):
+        self.occurrence = occurrence
+        self.lane = lane
+        self.lanes = lanes
+        self.continued = continued
+
+    def __repr__(self):
+        return '<Placement: %r in lane %d of %d>' % (
+            self.occurrence, self.lane, self.lanes
+        )
+
+
+def _spans(occurrences):
+    """Returns ``(start, end, position, occurrence)`` for each of
+    ``occurrences`` with a start, ordered by start (ties keeping their input
+    order). Occurrences without a later finish are treated as instants."""
+    spans = []
+    for position, o in enumerate(occurrences):
+        start = coerce_to_naive_datetime(o.start)
+        if start is None:
+            continue
+        end = coerce_to_naive_datetime(getattr(o, 'finish', None))
+        if end is None or end <= start:
+            end = start + timedelta.resolution
+        spans.append((start, end, position, o))
+    spans.sort()
+    return spans
+
+
+def _sweep(spans, boundaries):
+    """Yields, for each consecutive pair of ``boundaries``, the spans which
+    overlap the period from the first (inclusive) to the second (exclusive),
+    in no particular order."""
+    running = [] # a heap of (end, position, span)
+    i, count = 0, len(spans)
+    for lo, hi in zip(boundaries, boundaries[1:]):
+        while i < count and spans[i][0] < hi:
+            heappush(running, (spans[i][1], spans[i][2], spans[i]))
+            i += 1
+        while running and running[0][0] <= lo:
+            heappop(running)
+        yield [span for end, position, span in running]
+
+
+def overlapping(occurrences, boundaries):
+    """Returns a list for each consecutive pair of the ascending
+    ``boundaries``, of the ``occurrences`` overlapping the period from the
+    first (inclusive) to the second (exclusive), in order of start."""
+    return [[span[3] for span in sorted(period)]
+            for period in _sweep(_spans(occurrences), boundaries)]
+
+
+def _assign_lanes(spans):
+    placements = []
+    free = []       # a heap of the lanes freed within the current group
+    running = []    # a heap of (end, lane) of the occurrences still running
+    group, width = [], 0
+    for start, end, position, o in spans:
+        while running and running[0][0] <= start:
+            heappush(free, heappop(running)[1])
+        if not running:
+            for placement in group:
+                placement.lanes = width
+            free, group, width = [], [], 0
+        if free:
+            lane = heappop(free)
+        else:
+            lane, width = width, width + 1
+        heappush(running, (end, lane))
+        placement = Placement(o, lane)
+        group.append(placement)
+        placements.append(placement)
+    for placement in group:
+        placement.lanes = width
+    return placements
+
+
+def assign_lanes(occurrences):
+    """Returns a ``Placement`` of each of ``occurrences`` (in order of start),
+    laying concurrent occurrences out in as few lanes as possible. Each
+    group of overlapping occurrences shares the number of lanes it needs."""
+    return _assign_lanes(_spans(occurrences))
+
+
+def place(occurrences, boundaries):
+    """Returns a list for each consecutive pair of the ascending
+    ``boundaries``, as for ``overlapping``, but of a ``Placement`` of each
+    occurrence, in order of lane - ``continued`` if the occurrence began
+    before the period. Lanes are assigned across all of ``occurrences`` at
+    once, so each keeps its lane in every period it spans."""
+    spans = _spans(occurrences)
+    lanes = dict(
+        (span[2], placement)
+        for span, placement in zip(spans, _assign_lanes(spans))
+    )
+    result = []
+    for lo, period in zip(boundaries, _sweep(spans, boundaries)):
+        placed = []
+        for span in period:
+            lane = lanes[span[2]]
+            placed.append(Placement(span[3], lane.lane, lane.lanes,
+                                    continued=span[0] < lo))
+        placed.sort(key=attrgetter('lane'))
+        result.append(placed)
+    return result
@@ -1,68 +1,211 @@
 import calendar
 from datetime import datetime, timedelta
+from operator import attrgetter
 
 from dateutil.relativedelta import relativedelta
 from dateutil.rrule import (
     rrule, MONTHLY, WEEKLY, DAILY, HOURLY, MINUTELY
 )
 
-from django.utils import formats
+from django.conf import settings
+from django.utils import formats, translation
 from django.utils.translation import ugettext_lazy as _
 from django.utils.dates import MONTHS, MONTHS_3, WEEKDAYS, WEEKDAYS_ABBR
 
-from calendartools.periods.proxybase import LocalizedSimpleProxy
+from calendartools.periods.index import (
+    OccurrenceIndex, coerce_to_naive_datetime
+)
+from calendartools.periods.layout import overlapping, place
 from calendartools import defaults
-from calendartools.utils import standardise_first_dow
+from calendartools.tz import get_timezone
+from calendartools.utils import standardise_first_dow, cached_property
 
-__all__ = ['Period', 'Hour', 'Day', 'Week', 'Month', 'TripleMonth', 'Year',
-           'first_day_of_week']
+__all__ = ['Period', 'Hour', 'Day', 'DayInterval', 'Week', 'Month',
+           'TripleMonth', 'Year', 'first_day_of_week', 'LocaleTable',
+           'get_locale_table', 'clear_locale_tables',
+           'get_timeslot_offsets']
 
 # Sensible default:
 calendar.setfirstweekday(standardise_first_dow(
     formats.get_format('FIRST_DAY_OF_WEEK')
 ))
 
-def get_weekday_properties():
-    dayabbrs = WEEKDAYS_ABBR.values() * 2
-    daynames = WEEKDAYS.values() * 2
-    weekday_names = []
-    weekday_abbrs = []
-    first_dow = standardise_first_dow(formats.get_format('FIRST_DAY_OF_WEEK'))
+class LocaleTable(object):
+    """
+    The calendar conventions of a language: the first day of its week (0-6,
+    Monday through Sunday, as ``datetime`` and ``dateutil`` number them),
+    its weekday names and abbreviations in that order (as tuples, since they
+    are shared), and the ``strftime`` directive numbering its weeks. Tables
+    are built by ``get_locale_table``, once per language, and shared by every
+    period.
+    """
+    def __init__(self, first_weekday):
+        self.first_weekday = first_weekday
+        order = range(first_weekday, 7) + range(first_weekday)
+        self.day_names = tuple(WEEKDAYS[i] for i in order)
+        self.day_names_abbr = tuple(WEEKDAYS_ABBR[i] for i in order)
+        self.week_format = first_weekday == calendar.MONDAY and '%W' or '%U'
+
+
+_locale_tables = {}
+
+def get_locale_table():
+    """
+    Returns the ``LocaleTable`` of the active language.
+
+    Tables are kept for the life of the process, so a change to
+    ``FIRST_DAY_OF_WEEK`` - in a language's format module, or in settings -
+    isn't seen once the language's table is built. (Django has no signal for
+    settings changes.) Call ``clear_locale_tables`` after making one, e.g.
+    when overriding settings in tests.
+    """
+    key = (translation.get_language(), settings.USE_L10N)
+    try:
+        return _locale_tables[key]
+    except KeyError:
+        table = _locale_tables[key] = LocaleTable(standardise_first_dow(
+            formats.get_format('FIRST_DAY_OF_WEEK')
+        ))
+        return table
+
+def clear_locale_tables():
+    """Discards every ``LocaleTable``, to be rebuilt as they're next used."""
+    _locale_tables.clear()
 
-    for i in range(first_dow, first_dow + 7):
-        weekday_names.append(daynames[i])
-        weekday_abbrs.append(dayabbrs[i])
-    return weekday_names, weekday_abbrs
+def get_weekday_properties():
+    table = get_locale_table()
+    return list(table.day_names), list(table.day_names_abbr)
 
 def first_day_of_week(dt):
-    first_dow = standardise_first_dow(formats.get_format('FIRST_DAY_OF_WEEK'))
     return (datetime(dt.year, dt.month, dt.day) +
-            relativedelta(weekday=first_dow, days=-6))
+            relativedelta(weekday=get_locale_table().first_weekday, days=-6))
+
+
+def datetime_accessor(name):
+    """Exposes ``name`` from the period's start datetime directly on the
+    period class, so it is found without falling back to ``__getattr__``."""
+    return property(attrgetter('_obj.%s' % name))
+
 
+class Period(object):
+    """
+    A span of time starting at ``start`` (the converted datetime passed in)
+    and lasting ``interval``, along with the occurrences which fall within it.
+
+    Periods are created in bulk by the calendar views - a year grid is several
+    hundred of them - so they are compact ``__slots__`` objects rather than
+    proxies. The commonly used datetime attributes and methods are exposed
+    explicitly; anything else is looked up on ``start``. Memoized child
+    periods (see ``cached_property``) and any attributes set by subclasses
+    live in ``__dict__``, which is only allocated when first used.
+    """
+    __slots__ = ('_obj', '_real_obj', '_finish', 'timezone',
+                 'occurrence_index', 'occurrences', '__dict__')
 
-class Period(LocalizedSimpleProxy):
     month_names = MONTHS.values()
     month_names_abbr = MONTHS_3.values()
     format = 'DATETIME_FORMAT'
 
+    year        = datetime_accessor('year')
+    month       = datetime_accessor('month')
+    day         = datetime_accessor('day')
+    hour        = datetime_accessor('hour')
+    minute      = datetime_accessor('minute')
+    second      = datetime_accessor('second')
+    microsecond = datetime_accessor('microsecond')
+    tzinfo      = datetime_accessor('tzinfo')
+    date        = datetime_accessor('date')
+    time        = datetime_accessor('time')
+    weekday     = datetime_accessor('weekday')
+    isoweekday  = datetime_accessor('isoweekday')
+    isocalendar = datetime_accessor('isocalendar')
+    isoformat   = datetime_accessor('isoformat')
+    timetuple   = datetime_accessor('timetuple')
+    toordinal   = datetime_accessor('toordinal')
+    strftime    = datetime_accessor('strftime')
+
     def __init__(self, obj, *args, **kwargs):
-        self.day_names, self.day_names_abbr = get_weekday_properties()
         self._real_obj = obj
-        obj = self.convert(obj)
+        self._obj = self.convert(obj)
+        self._finish = None
+        self.timezone = get_timezone(kwargs.pop('timezone', None))
         occurrences = kwargs.pop('occurrences', [])
-        super(Period, self).__init__(obj, *args, **kwargs)
-        self.occurrences = self.process_occurrences(occurrences)
+        self.occurrence_index = self.index_occurrences(occurrences)
+        self.occurrences = self.occurrence_index.as_list()
+
+    @property
+    def day_names(self):
+        return get_locale_table().day_names
+
+    @property
+    def day_names_abbr(self):
+        return get_locale_table().day_names_abbr
+
+    def __getattr__(self, attr):
+        if attr == '_obj':
+            raise AttributeError(attr)
+        try:
+            return getattr(self._obj, attr)
+        except AttributeError:
+            e = "%r and its Proxy(%r) have no '%s' attributes." % (
+                self._obj, self, attr
+            )
+            raise AttributeError, e
 
     def __unicode__(self):
         return formats.date_format(self, self.format)
 
+    def __repr__(self):
+        try:
+            u = unicode(self)
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            u = '[Bad Unicode data]'
+        return (u'<%s: %s>' % (self.__class__.__name__, u)).encode('utf8')
+
+    def __add__(self, other):
+        return self._obj + other
+
+    def __sub__(self, other):
+        return self._obj - other
+
+    def index_occurrences(self, occurrences, key=None):
+        """Returns an ``OccurrenceIndex`` of the ``occurrences`` which fall
+        within this period. Passing in an existing index (as all child periods
+        do) narrows it by bisection instead of re-scanning and re-localizing
+        every occurrence."""
+        reusable = (
+            isinstance(occurrences, OccurrenceIndex) and key is None and
+            (not self.timezone or occurrences.timezone == self.timezone)
+        )
+        if not reusable:
+            occurrences = OccurrenceIndex(
+                occurrences, timezone=self.timezone, key=key
+            )
+        if not occurrences:
+            return occurrences
+        return occurrences.slice(self.start, self.finish)
+
     def process_occurrences(self, occurrences, key=None):
-        if not key:
-            key = lambda o: o.start
-        if self.timezone:
-            occurrences = [o.localize(timezone=self.timezone)
-                           if hasattr(o, 'localize') else o for o in occurrences]
-        return [o for o in occurrences if key(o) in self]
+        return self.index_occurrences(occurrences, key=key).as_list()
+
+    @cached_property
+    def overlapping_occurrences(self):
+        """The occurrences overlapping this period, in order of start: those
+        starting within it, preceded by any which began earlier but finish
+        within or after it - so far as the period was given them (e.g. by a
+        view fetching the occurrences overlapping a week, see
+        ``CalendarViewBase.overlap``)."""
+        earlier = [o for o in self.occurrence_index.preceding()
+                   if (coerce_to_naive_datetime(getattr(o, 'finish', None))
+                       or self.start) > self.start]
+        return earlier + self.occurrences
+
+    @property
+    def occurrence_count(self):
+        """The number of occurrences within this period. Unlike
+        ``occurrences``, this is also available for periods populated with an
+        ``OccurrenceCountIndex``."""
+        return self.occurrence_index.count()
 
     def convert(self, dt):
         """Returns naive datetime representation of date/datetime, with no
@@ -108,10 +251,13 @@ class Period(LocalizedSimpleProxy):
 
     @property
     def finish(self):
-        return (self.start + self.interval) - timedelta.resolution
+        if self._finish is None:
+            self._finish = (self._obj + self.interval) - timedelta.resolution
+        return self._finish
 
 
 class Hour(Period):
+    __slots__ = ()
     interval = relativedelta(hours=+1)
     convert = lambda self, dt: datetime(dt.year, dt.month, dt.day, dt.hour)
     period_name = _('hour')
@@ -128,19 +274,20 @@ class Hour(Period):
         return self.hour
 
     def get_day(self):
-        return Day(self, occurrences=self.occurrences)
+        return Day(self, occurrences=self.occurrence_index)
 
     def get_week(self):
-        return Week(self, occurrences=self.occurrences)
+        return Week(self, occurrences=self.occurrence_index)
 
     def get_month(self):
-        return Month(self, occurrences=self.occurrences)
+        return Month(self, occurrences=self.occurrence_index)
 
     def get_year(self):
-        return Year(self, occurrences=self.occurrences)
+        return Year(self, occurrences=self.occurrence_index)
 
 
 class Day(Period):
+    __slots__ = ()
     interval = relativedelta(days=+1)
     convert = lambda self, dt: datetime(dt.year, dt.month, dt.day)
     period_name = _('day')
@@ -162,48 +309,120 @@ class Day(Period):
     def number(self):
         return self.day
 
-    @property
+    @cached_property
     def hours(self):
-        return [Hour(dt, occurrences=self.occurrences) for dt in
+        return [Hour(dt, occurrences=self.occurrence_index) for dt in
                 rrule(HOURLY, dtstart=self.start, until=self.finish)]
 
     def get_week(self):
-        return Week(self, occurrences=self.occurrences)
+        return Week(self, occurrences=self.occurrence_index)
 
     def get_month(self):
-        return Month(self, occurrences=self.occurrences)
+        return Month(self, occurrences=self.occurrence_index)
 
     def get_year(self):
-        return Year(self, occurrences=self.occurrences)
+        return Year(self, occurrences=self.occurrence_index)
 
 
-    @property
+    @cached_property
     def intervals(self):
-        class DayInterval(Period):
-            interval = defaults.TIMESLOT_INTERVAL
+        return DayInterval.grid(self, self.overlapping_occurrences)
+
+
+def get_timeslot_settings():
+    """Returns the ``(TIMESLOT_INTERVAL, TIMESLOT_START_TIME,
+    TIMESLOT_END_TIME_DURATION)`` currently configured."""
+    return defaults.get_timeslot_defaults(None, None, None, None)[:3]
+
+
+_timeslot_offsets = {}
+
+def get_timeslot_offsets():
+    """
+    Returns the offsets from midnight at which the slots of the timeslot
+    grid begin: every ``TIMESLOT_INTERVAL`` from ``TIMESLOT_START_TIME``,
+    until ``TIMESLOT_END_TIME_DURATION`` later.
+
+    They're computed as first needed, rather than on import, and kept for
+    each combination of those settings.
+    """
+    key = get_timeslot_settings()
+    try:
+        return _timeslot_offsets[key]
+    except KeyError:
+        interval, start, duration = key
+        offset = timedelta(hours=start.hour, minutes=start.minute,
+                           seconds=start.second)
+        finish = offset + duration
+        offsets = []
+        while offset <= finish:
+            offsets.append(offset)
+            offset += interval
+        offsets = _timeslot_offsets[key] = tuple(offsets)
+        return offsets
+
+
+class DayInterval(Period):
+    """A slot of the timeslot grid of a ``Day`` (see ``grid``)."""
+    __slots__ = ()
+    # The occurrences overlapping the slot, laid out in lanes (see ``grid``):
+    placements = ()
+
+    @property
+    def interval(self):
+        return get_timeslot_settings()[0]
 
-            def get_day(self):
-                return Day(self, occurrences=self.occurrences)
+    @classmethod
+    def grid(cls, day, occurrences=None):
+        """
+        Returns the intervals of ``day``'s timeslot grid, beginning at each of
+        the ``get_timeslot_offsets()`` from its start.
+
+        The day's occurrences are divided between the intervals in a single
+        sweep (see ``OccurrenceIndex.split``), and each interval is populated
+        with its share directly, rather than narrowing the day's occurrences
+        afresh as a constructed ``Period`` would.
+
+        Each interval's ``placements`` are those of every occurrence it
+        overlaps - those which started in an earlier slot, or (given in
+        ``occurrences``, which defaults to the day's) on an earlier day,
+        included - laid out side by side (see ``layout.place``).
+        """
+        starts = [day.start + offset for offset in get_timeslot_offsets()]
+        if not starts:
+            return []
+        boundaries = starts + [starts[-1] + get_timeslot_settings()[0]]
+        views = day.occurrence_index.split(boundaries)
+        if occurrences is None:
+            occurrences = day.occurrences
+        placements = place(occurrences, boundaries)
+        intervals = []
+        for start, view, placed in zip(starts, views, placements):
+            interval = cls.__new__(cls)
+            interval._real_obj = interval._obj = start
+            interval._finish = None
+            interval.timezone = None
+            interval.occurrence_index = view
+            interval.occurrences = view.as_list()
+            interval.placements = placed
+            intervals.append(interval)
+        return intervals
 
-            def get_week(self):
-                return Week(self, occurrences=self.occurrences)
+    def get_day(self):
+        return Day(self, occurrences=self.occurrence_index)
 
-            def get_month(self):
-                return Month(self, occurrences=self.occurrences)
+    def get_week(self):
+        return Week(self, occurrences=self.occurrence_index)
 
-            def get_year(self):
-                return Year(self, occurrences=self.occurrences)
+    def get_month(self):
+        return Month(self, occurrences=self.occurrence_index)
 
-        intervals = []
-        start = datetime.combine(self.start.date(), defaults.TIMESLOT_START_TIME)
-        finish = start + defaults.TIMESLOT_END_TIME_DURATION
-        while start <= finish:
-            intervals.append(DayInterval(start, occurrences=self.occurrences))
-            start += defaults.TIMESLOT_INTERVAL
-        return intervals
+    def get_year(self):
+        return Year(self, occurrences=self.occurrence_index)
 
 
 class Week(Period):
+    __slots__ = ()
     interval = relativedelta(weeks=+1)
     convert = lambda self, dt: first_day_of_week(dt)
     period_name = _('week')
@@ -217,32 +436,41 @@ class Week(Period):
     def number(self):
         return ((self - datetime(self.year, 1, 1)).days / 7) + 1
 
-    @property
+    @cached_property
     def days(self):
-        return [Day(dt, occurrences=self.occurrences) for dt in rrule(DAILY,
-            dtstart=self.start, until=self.finish
-        )]
+        return [Day(dt, occurrences=self.occurrence_index) for dt in
+                rrule(DAILY, dtstart=self.start, until=self.finish)]
 
     def get_month(self):
-        return Month(self, occurrences=self.occurrences)
+        return Month(self, occurrences=self.occurrence_index)
 
     def get_year(self):
-        return Year(self, occurrences=self.occurrences)
+        return Year(self, occurrences=self.occurrence_index)
 
     @property
     def first_day(self):
-        return Day(self.start, occurrences=self.occurrences)
+        return self.days[0]
 
     @property
     def last_day(self):
-        return Day(self.finish, occurrences=self.occurrences)
+        return self.days[-1]
 
-    @property
+    @cached_property
+    def day_occurrences(self):
+        """The occurrences overlapping each of ``days`` - including those
+        which began on an earlier day (see ``overlapping_occurrences``)."""
+        boundaries = [day.start for day in self.days]
+        boundaries.append(self.finish + timedelta.resolution)
+        return overlapping(self.overlapping_occurrences, boundaries)
+
+    @cached_property
     def calendar_display(self):
-        return zip(*[d.intervals for d in self])
+        return zip(*[DayInterval.grid(day, occurrences) for day, occurrences
+                     in zip(self.days, self.day_occurrences)])
 
 
 class Month(Period):
+    __slots__ = ()
     interval = relativedelta(months=+1)
     convert = lambda self, dt: datetime(dt.year, dt.month, 1)
     period_name = _('month')
@@ -264,14 +492,14 @@ class Month(Period):
     def number(self):
         return self.month
 
-    @property
+    @cached_property
     def weeks(self):
-        weeks = [Week(dt, occurrences=self.occurrences) for dt in rrule(WEEKLY,
-            dtstart=self.start, until=self.finish
-        )]
+        weeks = [Week(dt, occurrences=self.occurrence_index) for dt in
+                 rrule(WEEKLY, dtstart=self.start, until=self.finish)]
         following_week_start = weeks[-1].finish + timedelta.resolution
         if following_week_start in self:
-            weeks.append(Week(following_week_start, occurrences=self.occurrences))
+            weeks.append(Week(following_week_start,
+                              occurrences=self.occurrence_index))
         return weeks
         """
         res = []
@@ -282,24 +510,23 @@ class Month(Period):
         return res
         """
 
-    @property
+    @cached_property
     def days(self):
-        return [Day(dt, occurrences=self.occurrences) for dt in rrule(DAILY,
-            dtstart=self.start, until=self.finish
-        )]
+        return [Day(dt, occurrences=self.occurrence_index) for dt in
+                rrule(DAILY, dtstart=self.start, until=self.finish)]
 
     @property
     def calendar_display(self):
         cal = calendar.monthcalendar(self.year, self.month)
-        return ((Day(datetime(self.year, self.month, num),
-                     occurrences=self.occurrences) if num else 0
-                     for num in lst) for lst in cal)
+        days = self.days
+        return ((days[num - 1] if num else 0 for num in lst) for lst in cal)
 
     def get_year(self):
-        return Year(self, occurrences=self.occurrences)
+        return Year(self, occurrences=self.occurrence_index)
 
 
 class TripleMonth(Month):
+    __slots__ = ()
     interval = relativedelta(months=+3)
     period_name = _('triple month')
     period_adverb = _('tri-monthly')
@@ -309,26 +536,25 @@ class TripleMonth(Month):
 
     @property
     def first_month(self):
-        return Month(self.start, occurrences=self.occurrences)
+        return self.months[0]
 
     @property
     def second_month(self):
-        return Month(self.start + relativedelta(months=+1),
-                     occurrences=self.occurrences)
+        return self.months[1]
 
     @property
     def third_month(self):
-        return Month(self.start + relativedelta(months=+2),
-                     occurrences=self.occurrences)
+        return self.months[2]
 
-    @property
+    @cached_property
     def months(self):
-        return [Month(dt, occurrences=self.occurrences) for dt in
+        return [Month(dt, occurrences=self.occurrence_index) for dt in
                 rrule(MONTHLY, dtstart=self.start, until=self.finish
         )]
 
 
 class Year(Period):
+    __slots__ = ()
     interval = relativedelta(years=+1)
     convert = lambda self, dt: datetime(dt.year, 1, 1)
     period_name = _('year')
@@ -342,14 +568,14 @@ class Year(Period):
     def number(self):
         return self.year
 
-    @property
+    @cached_property
     def months(self):
-        return [Month(dt, occurrences=self.occurrences) for dt in
+        return [Month(dt, occurrences=self.occurrence_index) for dt in
                 rrule(MONTHLY, dtstart=self.start, until=self.finish
         )]
 
     @property
     def days(self):
         for month in self.months:
-            for dt in rrule(DAILY, dtstart=month.start, until=month.finish):
-                yield Day(dt, occurrences=self.occurrences)
+            for day in month.days:
+                yield day
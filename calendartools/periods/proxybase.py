@@ -1,5 +1,4 @@
-from datetime import tzinfo
-import pytz
+from calendartools.tz import get_timezone
 
 
 class SimpleProxy(object):
@@ -47,10 +46,4 @@ class LocalizedSimpleProxy(SimpleProxy):
         self.timezone = self.coerce_timezone_attr_to_timezone(timezone)
 
     def coerce_timezone_attr_to_timezone(self, timezone):
-        timezone = timezone or ''
-        if isinstance(timezone, tzinfo):
-            return timezone
-        try:
-            return pytz.timezone(timezone)
-        except pytz.UnknownTimeZoneError:
-            pass
+        return get_timezone(timezone)
@@ -0,0 +1,263 @@
+"""
+Recurrence rules, stored as the text of an iCalendar (RFC 5545) RRULE.
+
+``format_rrule`` accepts the keyword arguments used to build
+``dateutil.rrule.rrule`` objects throughout calendartools (e.g. by
+``MultipleOccurrenceForm._build_rrule_params``), and ``parse_rrule`` turns the
+text back into an ``rrule`` for a given start.
+
+An ``rrule`` can only be iterated from its start, so finding the instances
+within a window of time costs time proportional to the number of instances
+before it: a daily series which began a year ago is expanded 365 times over
+for every page showing it. ``expand_rrule`` remembers the instances it has
+computed for each rule (see ``RecurrenceCache``), only ever extending them as
+later - or, after trimming, earlier - windows are requested.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+import threading
+
+from dateutil import rrule
+
+from calendartools import defaults
+
+try:
+    from collections import OrderedDict
+except ImportError: # Python < 2.7 fallback.
+    from django.utils.datastructures import SortedDict as OrderedDict
+
+__all__ = ['format_rrule', 'parse_rrule', 'rrule_parts', 'last_instance',
+           'expand_rrule', 'RecurrenceCache']
+
+FREQUENCIES = ('YEARLY', 'MONTHLY', 'WEEKLY', 'DAILY', 'HOURLY', 'MINUTELY',
+               'SECONDLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+def _format_weekday(day):
+    if isinstance(day, (int, long)):
+        return WEEKDAYS[day]
+    if day.n:
+        return '%+d%s' % (day.n, WEEKDAYS[day.weekday])
+    return WEEKDAYS[day.weekday]
+
+
+def format_rrule(freq, interval=1, count=None, until=None, byweekday=None,
+                 bymonthday=None, bymonth=None):
+    """Returns the RRULE text (without the ``RRULE:`` prefix) for the given
+    ``dateutil.rrule.rrule`` arguments. ``until`` must be naive."""
+    parts = ['FREQ=%s' % FREQUENCIES[freq], 'INTERVAL=%d' % (interval or 1)]
+    if count:
+        parts.append('COUNT=%d' % count)
+    if until:
+        parts.append('UNTIL=%s' % until.strftime('%Y%m%dT%H%M%S'))
+    if byweekday is not None:
+        parts.append('BYDAY=%s' % ','.join(
+            _format_weekday(day) for day in _as_list(byweekday)
+        ))
+    if bymonthday is not None:
+        parts.append('BYMONTHDAY=%s' % ','.join(
+            str(int(day)) for day in _as_list(bymonthday)
+        ))
+    if bymonth is not None:
+        parts.append('BYMONTH=%s' % ','.join(
+            str(int(month)) for month in _as_list(bymonth)
+        ))
+    return ';'.join(parts)
+
+
+def parse_rrule(rule, dtstart):
+    """Returns the ``dateutil.rrule.rrule`` for the RRULE text ``rule``,
+    starting at ``dtstart``."""
+    return rrule.rrulestr(str(rule), dtstart=dtstart)
+
+
+def rrule_parts(rule):
+    """Returns a dictionary of the (upper-cased) names and values of the
+    parts of the RRULE text ``rule``, e.g. ``{'FREQ': 'DAILY', ...}``."""
+    return dict(part.split('=', 1) for part in str(rule).upper().split(';')
+                if '=' in part)
+
+
+def last_instance(rule, dtstart):
+    """Returns the start of the final instance of the RRULE text ``rule``
+    starting at ``dtstart``, or None if it recurs indefinitely (has neither a
+    COUNT nor an UNTIL). Only the instances up to the final one are iterated,
+    none of them being kept."""
+    parts = rrule_parts(rule)
+    if 'COUNT' not in parts and 'UNTIL' not in parts:
+        return None
+    instances = parse_rrule(rule, dtstart)
+    if 'COUNT' in parts:
+        try:
+            return instances[int(parts['COUNT']) - 1]
+        except IndexError:
+            pass
+    return instances.before(datetime.max, inc=True) or dtstart
+
+
+def _seconds(delta):
+    return delta.days * 86400 + delta.seconds
+
+
+class Expansion(object):
+    """
+    The instances of one recurrence rule, stored as a sorted array of their
+    offsets (in seconds) from the rule's start - ``rrule`` discards
+    microseconds - together with the iterator that produced them, so that
+    they can be extended forwards from where it left off.
+
+    Every instance from offset ``floor`` up to the last one computed is
+    stored (``floor`` is 0 unless earlier instances have been trimmed).
+    """
+    def __init__(self, rule, dtstart):
+        self.rrule = parse_rrule(rule, dtstart)
+        self.dtstart = dtstart.replace(microsecond=0)
+        self.iterator = iter(self.rrule)
+        self.offsets = array('l')
+        self.floor = 0
+        self.exhausted = False
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def extend(self, start, finish, size):
+        """Ensures every instance between offsets ``start`` and ``finish`` is
+        stored. Once more than ``size`` are stored, instances before
+        ``start`` are discarded along the way - and, when extending
+        backwards, instances after ``finish``."""
+        if start < self.floor:
+            self.extend_backwards(start, finish, size)
+        offsets = self.offsets
+        while not self.exhausted and (not offsets or offsets[-1] < finish):
+            try:
+                offsets.append(_seconds(self.iterator.next() - self.dtstart))
+            except StopIteration:
+                self.exhausted = True
+            if len(offsets) > 2 * size and offsets[-1] < start:
+                self.trim(size, start)
+
+    def extend_backwards(self, start, finish, size):
+        """Stores the instances from offset ``start`` up to ``floor``. Those
+        after ``finish`` are then discarded down to ``size`` instances in
+        all, with the stored instances' iterator replaced by one resuming
+        after the last instance kept."""
+        # Instances are only computed forwards, from the rule's start:
+        iterator = iter(self.rrule)
+        earlier = array('l')
+        for dt in iterator:
+            offset = _seconds(dt - self.dtstart)
+            if offset > finish and len(earlier) + 1 >= size:
+                # The instances stored are all to be discarded:
+                earlier.append(offset)
+                self.offsets, self.iterator = earlier, iterator
+                self.floor, self.exhausted = start, False
+                return
+            if offset >= self.floor:
+                break
+            if offset >= start:
+                earlier.append(offset)
+        else:
+            offset = None
+        offsets = earlier + self.offsets
+        keep = max(size, bisect_right(offsets, finish))
+        if offset is not None and keep < len(offsets):
+            # ``iterator`` has produced the first instance previously stored
+            # (``offset``), so can resume after the last one kept:
+            del offsets[keep:]
+            while offset < offsets[-1]:
+                offset = _seconds(iterator.next() - self.dtstart)
+            self.iterator, self.exhausted = iterator, False
+        self.offsets, self.floor = offsets, start
+
+    def trim(self, size, start):
+        """Discards the earliest instances, down to ``size`` of them, but
+        keeping every instance from offset ``start`` onwards."""
+        cut = min(len(self.offsets) - size, bisect_left(self.offsets, start))
+        if cut > 0:
+            self.floor = self.offsets[cut]
+            del self.offsets[:cut]
+
+    def between(self, start, finish):
+        lo = bisect_left(self.offsets, start)
+        hi = bisect_right(self.offsets, finish)
+        return [self.dtstart + timedelta(seconds=offset)
+                for offset in self.offsets[lo:hi]]
+
+
+class RecurrenceCache(object):
+    """
+    Remembers the ``Expansion`` of recently used recurrence rules, keyed on
+    the rule and its start - so edited series are simply expanded afresh.
+    At most ``size`` instances are kept in total (unless a single window
+    holds more): the least recently used rules are evicted first, and any
+    rule which alone exceeds the limit is trimmed to the instances nearest
+    the window last requested.
+    """
+    def __init__(self, size=None):
+        self.size = size or defaults.RECURRENCE_CACHE_SIZE
+        self._expansions = OrderedDict()
+        self._count = 0
+        # Expansions hold iterators, which can't be advanced concurrently:
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._expansions.clear()
+            self._count = 0
+        finally:
+            self._lock.release()
+
+    def between(self, rule, dtstart, start, finish):
+        """Returns the instances of the RRULE text ``rule`` starting at
+        ``dtstart`` which fall between ``start`` and ``finish``
+        inclusive."""
+        start = _seconds(start - dtstart.replace(microsecond=0))
+        finish = _seconds(finish - dtstart.replace(microsecond=0))
+        if finish < 0 or finish < start:
+            return []
+        key = (rule, dtstart)
+        self._lock.acquire()
+        try:
+            expansion = self._expansions.pop(key, None)
+            if expansion is None:
+                expansion = Expansion(rule, dtstart)
+            else:
+                self._count -= len(expansion)
+            expansion.extend(start, finish, self.size)
+            expansion.trim(self.size, start)
+            # Re-inserted as the most recently used:
+            self._expansions[key] = expansion
+            self._count += len(expansion)
+            self._evict(key)
+            return expansion.between(start, finish)
+        finally:
+            self._lock.release()
+
+    def _evict(self, keep):
+        while self._count > self.size:
+            key = iter(self._expansions).next()
+            if key == keep:
+                break
+            self._count -= len(self._expansions.pop(key))
+
+
+recurrence_cache = RecurrenceCache()
+
+
+def expand_rrule(rule, dtstart, start, finish):
+    """Returns the instances of the RRULE text ``rule`` starting at
+    ``dtstart`` which fall between ``start`` and ``finish`` inclusive, from
+    the process-wide ``RecurrenceCache``."""
+    return recurrence_cache.between(rule, dtstart, start, finish)
@@ -1,5 +1,26 @@
 import django.dispatch
 
-collect_validators = django.dispatch.Signal(
+
+class ValidatorSignal(django.dispatch.Signal):
+    """
+    A ``Signal`` with a ``chains`` dictionary - in which ``get_receivers``
+    (see ``calendartools.validators.base``) remembers the receivers of each
+    sender, in priority order - emptied whenever a receiver is connected or
+    disconnected.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ValidatorSignal, self).__init__(*args, **kwargs)
+        self.chains = {}
+
+    def connect(self, *args, **kwargs):
+        super(ValidatorSignal, self).connect(*args, **kwargs)
+        self.chains.clear()
+
+    def disconnect(self, *args, **kwargs):
+        super(ValidatorSignal, self).disconnect(*args, **kwargs)
+        self.chains.clear()
+
+
+collect_validators = ValidatorSignal(
     providing_args=['instance']
 )
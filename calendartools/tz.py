@@ -0,0 +1,199 @@
+"""
+Timezone lookups, and helpers for converting many datetimes between timezones
+in a single pass.
+
+Timezones are resolved through ``get_timezone``, which memoizes lookups by
+name for the life of the process - including failed ones, since unknown names
+usually come from a request parameter and would otherwise cost an exception
+from pytz every time.
+
+``timezones.utils.adjust_datetime_to_timezone`` resolves both timezones and
+runs pytz's ``localize``/``astimezone`` machinery for every value it is given.
+When localizing a calendar's worth of occurrences that work is almost entirely
+repeated, so here the UTC offset transition tables of each pytz timezone are
+turned into lookup tables once, and each datetime is then converted with a
+bisection and an addition.
+"""
+from bisect import bisect_right
+from datetime import datetime, tzinfo
+
+from django.conf import settings
+from django.utils.encoding import smart_str
+import pytz
+
+# Bounds the number of distinct unknown names remembered, as they may be
+# supplied by users:
+MAX_UNKNOWN_TIMEZONES = 1000
+
+_timezones = {}
+_unknown_timezones = set()
+_wall_time_tables = {}
+
+
+def get_timezone(timezone):
+    """Returns the ``tzinfo`` for ``timezone``, which may be a timezone name
+    or a ``tzinfo`` instance (returned as is). Returns ``None`` for empty or
+    unknown timezone names."""
+    if not timezone:
+        return None
+    if isinstance(timezone, tzinfo):
+        return timezone
+    try:
+        return _timezones[timezone]
+    except KeyError:
+        if timezone in _unknown_timezones:
+            return None
+    try:
+        result = _timezones[timezone] = pytz.timezone(smart_str(timezone))
+    except (pytz.UnknownTimeZoneError, UnicodeError):
+        if len(_unknown_timezones) >= MAX_UNKNOWN_TIMEZONES:
+            _unknown_timezones.clear()
+        _unknown_timezones.add(timezone)
+        result = None
+    return result
+
+
+def get_default_timezone():
+    """Returns the ``tzinfo`` for ``settings.TIME_ZONE``. The setting is read
+    on each call, so changes to it at runtime are respected."""
+    return get_timezone(settings.TIME_ZONE)
+
+
+def lookup_timezone(timezone):
+    result = get_timezone(timezone)
+    if result is None:
+        raise pytz.UnknownTimeZoneError(timezone)
+    return result
+
+
+def has_transitions(tz):
+    return hasattr(tz, '_utc_transition_times') and hasattr(tz, '_tzinfos')
+
+
+def wall_time_table(tz):
+    """
+    Returns ``(starts, finishes, offsets)`` for a pytz timezone with DST
+    transitions: the ranges of wall-clock time which map to exactly one UTC
+    instant, and the UTC offset in force within each range. Wall times that
+    fall outside every range are ambiguous or non-existent, and are left to
+    ``tz.localize`` to resolve. Tables are built once per zone.
+    """
+    try:
+        return _wall_time_tables[tz.zone]
+    except KeyError:
+        pass
+    transitions = tz._utc_transition_times
+    offsets = [info[0] for info in tz._transition_info]
+    last = len(transitions) - 1
+
+    starts, finishes, window_offsets = [], [], []
+    for i, offset in enumerate(offsets):
+        if i == 0:
+            start = datetime.min
+        else:
+            start = transitions[i] + max(offset, offsets[i - 1])
+        if i == last:
+            finish = datetime.max
+        else:
+            finish = transitions[i + 1] + min(offset, offsets[i + 1])
+        if start < finish:
+            starts.append(start)
+            finishes.append(finish)
+            window_offsets.append(offset)
+
+    table = _wall_time_tables[tz.zone] = (starts, finishes, window_offsets)
+    return table
+
+
+def utc_offsets(tz, start, finish):
+    """Returns the set of UTC offsets in force in ``tz`` between the naive UTC
+    datetimes ``start`` and ``finish``."""
+    if not has_transitions(tz):
+        return set([tz.utcoffset(start)])
+    transitions = tz._utc_transition_times
+    lo = max(0, bisect_right(transitions, start) - 1)
+    hi = max(0, bisect_right(transitions, finish) - 1)
+    return set(info[0] for info in tz._transition_info[lo:hi + 1])
+
+
+def utc_transitions(tz, start):
+    """
+    Returns ``(transition, from_offset, to_offset, dst, name)`` for each UTC
+    offset transition of ``tz`` from the one in force at the naive UTC
+    datetime ``start`` to the last one known: ``transition`` is a naive UTC
+    datetime, ``dst`` the daylight saving adjustment in force after it, and
+    ``name`` its abbreviation. For timezones without transitions, and before
+    the first transition, the offset in force is given as a transition at
+    ``start``.
+    """
+    if not has_transitions(tz):
+        offset = tz.utcoffset(start)
+        return [(start, offset, offset, tz.dst(start), tz.tzname(start))]
+    transitions = tz._utc_transition_times
+    infos = tz._transition_info
+    first = max(0, bisect_right(transitions, start) - 1)
+    result = []
+    for i in xrange(first, len(transitions)):
+        offset, dst, name = infos[i]
+        if i == 0:
+            result.append((start, offset, offset, dst, name))
+        else:
+            result.append((transitions[i], infos[i - 1][0], offset, dst, name))
+    return result
+
+
+def to_utc(values, tz):
+    """Converts ``values`` - naive wall times in ``tz``, or aware datetimes -
+    to naive UTC datetimes."""
+    naive_utc = lambda dt: dt.astimezone(pytz.utc).replace(tzinfo=None)
+    if not has_transitions(tz):
+        return [naive_utc(dt if dt.tzinfo else tz.localize(dt))
+                for dt in values]
+
+    starts, finishes, offsets = wall_time_table(tz)
+    result = []
+    for dt in values:
+        if dt.tzinfo is not None:
+            result.append(naive_utc(dt))
+            continue
+        i = bisect_right(starts, dt) - 1
+        if i >= 0 and dt < finishes[i]:
+            result.append(dt - offsets[i])
+        else:
+            result.append(naive_utc(tz.localize(dt)))
+    return result
+
+
+def from_utc(values, tz):
+    """Converts naive UTC datetimes to aware datetimes in ``tz``. For pytz
+    timezones with transitions this is ``tz.fromutc``, without the per-call
+    overhead."""
+    if not has_transitions(tz):
+        return [pytz.utc.localize(dt).astimezone(tz) for dt in values]
+
+    transitions = tz._utc_transition_times
+    transition_info = tz._transition_info
+    tzinfos = tz._tzinfos
+    result = []
+    for dt in values:
+        info = transition_info[max(0, bisect_right(transitions, dt) - 1)]
+        result.append((dt + info[0]).replace(tzinfo=tzinfos[info]))
+    return result
+
+
+def localize_datetimes(values, timezone, from_timezone):
+    """
+    Returns ``values`` converted to ``timezone``, as
+    ``adjust_datetime_to_timezone(value, from_timezone, timezone)`` would for
+    each of them: naive values are taken to be wall times in
+    ``from_timezone``, and aware values are converted directly. Both
+    timezones may be given as names or ``tzinfo`` instances.
+    """
+    timezone = lookup_timezone(timezone)
+    from_timezone = lookup_timezone(from_timezone)
+    return from_utc(to_utc(values, from_timezone), timezone)
+
+
+def localize_datetime(value, timezone, from_timezone):
+    """Single-value form of ``localize_datetimes``."""
+    return localize_datetimes([value], timezone, from_timezone)[0]
@@ -1,20 +1,13 @@
 from django.conf.urls.defaults import *
-from calendartools.views import *
+from calendartools import views
 
-info_dict = {
-    'template_object_name':  'event',
-}
-ical_dict = {
-    'queryset':            Event.published.all(),
-    'date_field':          'start',
-    'ical_filename':       'calendar.ics',
-    'last_modified_field': 'mod_date',
-    'location_field':      'location',
-    'start_time_field':    'start_time',
-    'end_time_field':      'end_time',
-}
-
-urlpatterns += patterns('calendartools.views.vobject',
-    url(r'^calendar.ics$', 'icalendar', name='icalendar'),
+urlpatterns = patterns('',
+    url(r'^calendar/(?P<slug>[-A-Za-z0-9_]+)\.ics$', views.calendar_ical,
+        name='calendar-ical'),
+    url(r'^calendar/(?P<slug>[-A-Za-z0-9_]+)/(?P<year>\d{4})\.ics$',
+        views.calendar_ical, name='year-ical'),
+    url(r'^calendar/(?P<slug>[-A-Za-z0-9_]+)/(?P<year>\d{4})/(?P<month>\w{3})\.ics$',
+        views.calendar_ical, name='month-ical'),
+    url(r'^event/(?P<slug>[-A-Za-z0-9_]+)\.ics$', views.event_ical,
+        name='event-ical'),
 )
-
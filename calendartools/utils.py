@@ -23,6 +23,23 @@ def timedelta_to_total_seconds(timedelta):
     return ((timedelta.days * hours_in_day *
              minutes_in_hour * seconds_in_minute) + timedelta.seconds)
 
+class cached_property(object):
+    """
+    A read-only property which is computed on first access and then stored on
+    the instance, so that subsequent accesses are plain attribute lookups.
+    Deleting the attribute from the instance forces it to be recomputed.
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.__name__] = self.func(instance)
+        return value
+
 import calendar
 DAY_MAP = [
     calendar.SUNDAY,
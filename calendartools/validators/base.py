@@ -1,10 +1,16 @@
+from django.core.exceptions import ValidationError
+from django.dispatch import saferef
 from threaded_multihost.threadlocals import get_current_request
+from calendartools.signals import collect_validators
 
 
 class BaseValidator(object):
     """
     All Validation checks should inherit from this base-class, and implement
     their own ``validate`` method. Higher priority checks will be run first.
+
+    Validators which can check many instances more efficiently than one at a
+    time (e.g., with a single query) may also override ``validate_batch``.
     """
     priority = 10
 
@@ -18,3 +24,61 @@ class BaseValidator(object):
     def validate(self):
         """Raises ValidationError if validation is unsuccessful."""
         raise NotImplementedError
+
+    @classmethod
+    def validate_batch(cls, sender, instances, **kwargs):
+        """Validates each of ``instances``, returning a dictionary which maps
+        the position of each invalid instance to the ``ValidationError``
+        raised."""
+        errors = {}
+        for i, instance in enumerate(instances):
+            try:
+                cls(sender, instance, **kwargs).validate()
+            except ValidationError, e:
+                errors[i] = e
+        return errors
+
+
+def validator_priority(validator):
+    return getattr(validator, 'priority', BaseValidator.priority)
+
+
+def is_validator_class(receiver):
+    """Whether ``receiver`` is a ``BaseValidator`` subclass - whose validators
+    can be run over many instances at once (see ``validate_batch``)."""
+    return isinstance(receiver, type) and issubclass(receiver, BaseValidator)
+
+
+def get_receivers(sender, instance):
+    """
+    Returns the receivers connected to ``collect_validators`` for ``sender``,
+    in descending order of their priorities. They are found by sending the
+    signal for ``instance``, then remembered (weakly) until a receiver is
+    connected or disconnected - covering ``activate_default_*_validators``
+    and ``deactivate_default_*_validators``.
+    """
+    refs = collect_validators.chains.get(sender)
+    if refs is not None:
+        receivers = [ref() for ref in refs]
+        if None not in receivers:
+            return receivers
+    receivers = [receiver for receiver, validator in
+                 collect_validators.send(sender=sender, instance=instance)]
+    receivers.sort(key=validator_priority, reverse=True)
+    collect_validators.chains[sender] = map(saferef.safeRef, receivers)
+    return receivers
+
+
+def get_validators(sender, instance):
+    """Collects the validators for ``instance`` from the receivers of
+    ``sender`` (see ``get_receivers``), returning ``(receiver, validator)``
+    pairs in descending order of the validators' priorities. Receivers may
+    be validator classes, or any callable returning a validator."""
+    validators = [
+        (receiver, receiver(signal=collect_validators, sender=sender,
+                            instance=instance))
+        for receiver in get_receivers(sender, instance)
+    ]
+    validators.sort(key=lambda pair: validator_priority(pair[1]),
+                    reverse=True)
+    return validators
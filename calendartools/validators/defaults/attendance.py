@@ -12,6 +12,24 @@ class BaseAttendanceValidator(BaseValidator):
         )
         self.attendance = self.instance
 
+    @classmethod
+    def validate_batch(cls, sender, instances, **kwargs):
+        """Fetches the occurrences of all ``instances`` with a single query
+        before validating them, rather than one query per attendance."""
+        field = sender._meta.get_field('occurrence')
+        cache_name = field.get_cache_name()
+        missing = set(a.occurrence_id for a in instances
+                      if a.occurrence_id and not hasattr(a, cache_name))
+        if missing:
+            occurrences = field.rel.to._default_manager.in_bulk(missing)
+            for attendance in instances:
+                if attendance.occurrence_id in occurrences:
+                    setattr(attendance, cache_name,
+                            occurrences[attendance.occurrence_id])
+        return super(BaseAttendanceValidator, cls).validate_batch(
+            sender, instances, **kwargs
+        )
+
 
 class CannotBookFinishedEventsValidator(BaseAttendanceValidator):
     def validate(self):
@@ -32,6 +50,9 @@ class CannotAttendFutureEventsValidator(BaseAttendanceValidator):
 
 
 class CannotCancelAttendedEventsValidator(BaseAttendanceValidator):
+    error_message = ('Cannot cancel attendance for events which have '
+                     'already been attended.')
+
     def validate(self):
         if (self.attendance.status == self.attendance.STATUS.cancelled
             and self.attendance.pk):
@@ -40,16 +61,33 @@ class CannotCancelAttendedEventsValidator(BaseAttendanceValidator):
                 previous_status = Attendance._default_manager.values_list(
                     'status', flat=True).get(pk=self.attendance.pk)
                 if previous_status == self.attendance.STATUS.attended:
-                    raise ValidationError(
-                        'Cannot cancel attendance for events which have '
-                        'already been attended.'
-                    )
+                    raise ValidationError(self.error_message)
             except Attendance.DoesNotExist:
                 pass
 
+    @classmethod
+    def validate_batch(cls, sender, instances, **kwargs):
+        """Looks up the previous statuses of all the cancelled attendances
+        with a single query."""
+        Attendance = get_model(defaults.CALENDAR_APP_LABEL, 'Attendance')
+        cancelled = [(i, a) for i, a in enumerate(instances)
+                     if a.status == a.STATUS.cancelled and a.pk]
+        if not cancelled:
+            return {}
+        previous_statuses = dict(Attendance._default_manager.filter(
+            pk__in=[a.pk for i, a in cancelled]
+        ).values_list('pk', 'status'))
+        errors = {}
+        for i, attendance in cancelled:
+            if previous_statuses.get(attendance.pk) == Attendance.STATUS.attended:
+                errors[i] = ValidationError(cls.error_message)
+        return errors
+
 
 class OnlyOneActiveAttendanceForOccurrenceValidator(BaseAttendanceValidator):
     priority = 50
+    error_message = ('User already has an active attendance record for this '
+                     'event.')
 
     def validate(self):
         Attendance = get_model(defaults.CALENDAR_APP_LABEL, 'Attendance')
@@ -62,9 +100,35 @@ class OnlyOneActiveAttendanceForOccurrenceValidator(BaseAttendanceValidator):
             already_attending = already_attending.exclude(pk=self.attendance.pk)
 
         if already_attending.exists():
-            raise ValidationError(
-                'User already has an active attendance record for this event.'
-            )
+            raise ValidationError(self.error_message)
+
+    @classmethod
+    def validate_batch(cls, sender, instances, **kwargs):
+        """Checks all of ``instances`` against the active attendance records
+        with a single query. Each attendance is also checked against the
+        active attendances which precede it in the batch."""
+        Attendance = get_model(defaults.CALENDAR_APP_LABEL, 'Attendance')
+        if not instances:
+            return {}
+        active_statuses = [Attendance.STATUS.booked, Attendance.STATUS.attended]
+        attending = {}
+        for pk, user, occurrence in Attendance._default_manager.filter(
+            user__in=set(a.user_id for a in instances),
+            occurrence__in=set(a.occurrence_id for a in instances),
+            status__in=active_statuses
+        ).values_list('pk', 'user', 'occurrence'):
+            attending.setdefault((user, occurrence), set()).add(pk)
+
+        errors = {}
+        for i, attendance in enumerate(instances):
+            key = (attendance.user_id, attendance.occurrence_id)
+            # Unsaved attendances are told apart by their position:
+            identity = attendance.pk or ('unsaved', i)
+            if attending.get(key, set()) - set([identity]):
+                errors[i] = ValidationError(cls.error_message)
+            elif attendance.status in active_statuses:
+                attending.setdefault(key, set()).add(identity)
+        return errors
 
 DEFAULT_VALIDATORS = [
     CannotBookFinishedEventsValidator,
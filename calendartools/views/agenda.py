@@ -8,6 +8,7 @@ from calendartools.views.calendars import (
 class YearAgenda(YearView):
     template_name = 'calendar/agenda/year.html'
     paginate_by = defaults.MAX_AGENDA_ITEMS_PER_PAGE
+    aggregate = False
 
 
 class MonthAgenda(MonthView):
@@ -18,16 +19,19 @@ class MonthAgenda(MonthView):
 class TriMonthAgenda(TriMonthView):
     template_name = 'calendar/agenda/tri_month.html'
     paginate_by = defaults.MAX_AGENDA_ITEMS_PER_PAGE
+    aggregate = False
 
 
 class WeekAgenda(WeekView):
     template_name = 'calendar/agenda/week.html'
     paginate_by = defaults.MAX_AGENDA_ITEMS_PER_PAGE
+    overlap = False
 
 
 class DayAgenda(DayView):
     template_name = 'calendar/agenda/day.html'
     paginate_by = defaults.MAX_AGENDA_ITEMS_PER_PAGE
+    overlap = False
 
 def today_agenda(request, slug, *args, **kwargs):
     today = date.today()
@@ -1,10 +1,19 @@
-import pytz
-from datetime import datetime
-from django.conf import settings
-from django.db.models import Max, Min
-from django.http import Http404
+from datetime import date, datetime, timedelta
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import translation
+from django.utils.hashcompat import md5_constructor
+from django.views.decorators.http import condition
 from calendartools import defaults, forms
+from calendartools.cache import (
+    calendar_page_key, get_calendar_bounds, get_calendar_version
+)
+from calendartools.paginator import InvalidPage, KeysetPaginator
+from calendartools.periods import OccurrenceCountIndex
+from calendartools.tz import (
+    get_default_timezone, get_timezone, localize_datetimes, utc_offsets
+)
 from calendartools.views.generic.base import TemplateResponseMixin
 from calendartools.views.generic.list import BaseListView
 from calendartools.views.generic.dates import (
@@ -12,10 +21,23 @@ from calendartools.views.generic.dates import (
 )
 
 from django.db.models.loading import get_model
-from timezones.utils import adjust_datetime_to_timezone
 
 Calendar = get_model(defaults.CALENDAR_APP_LABEL, 'Calendar')
 Occurrence = get_model(defaults.CALENDAR_APP_LABEL, 'Occurrence')
+Attendance = get_model(defaults.CALENDAR_APP_LABEL, 'Attendance')
+# Optional - see ``OccurrenceSeriesBase``:
+OccurrenceSeries = get_model(defaults.CALENDAR_APP_LABEL, 'OccurrenceSeries')
+
+
+def get_visibility(user):
+    """Returns which hidden calendars, events and occurrences ``user`` may
+    see - everything else being equal, users with the same visibility are
+    shown the same pages."""
+    return tuple(bool(check(user=user)) for check in (
+        defaults.view_hidden_calendars_check,
+        defaults.view_hidden_events_check,
+        defaults.view_hidden_occurrences_check,
+    ))
 
 
 class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
@@ -26,10 +48,30 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
     date_attrs   = ['year', 'year_format', 'month', 'month_format', 'day',
                    'day_format']
     context_object_name = 'occurrences'
+    # When True, the occurrences shown are those overlapping the period,
+    # rather than just those starting within it - for views laying them out
+    # in a grid (see ``layout.place``):
+    overlap = False
+    # When True, the period object is populated with the number of
+    # occurrences starting on each day, from a single grouped query, rather
+    # than the occurrences themselves (see ``get_occurrence_counts``):
+    aggregate = False
+    # Seconds for which rendered responses are cached (0 disables caching) -
+    # see ``get_cache_key``:
+    cache_timeout = defaults.CALENDAR_CACHE_TIMEOUT
+    # When True, paginated views seek each page from an opaque cursor in the
+    # query string, rather than counting and OFFSETting (see
+    # ``paginate_queryset``); ``count_pages`` determines whether the number of
+    # pages is counted for them:
+    keyset_pagination = defaults.AGENDA_KEYSET_PAGINATION
+    count_pages = defaults.AGENDA_PAGINATION_COUNT
+    # When True, the occurrences shown are annotated with their attendance
+    # (see ``AttendanceQuerySet.annotate_occurrences``):
+    show_attendance = defaults.CALENDAR_SHOW_ATTENDANCE
 
     def __init__(self, *args, **kwargs):
         super(CalendarViewBase, self).__init__(*args, **kwargs)
-        self.timezone = pytz.timezone(settings.TIME_ZONE)
+        self.timezone = get_default_timezone()
         self.extra_context = getattr(self, 'extra_context', {})
         self.extra_context.update(kwargs.pop('extra_context', {}))
 
@@ -58,10 +100,7 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
 
     @property
     def calendar_bounds(self):
-        return self.calendar.occurrences.visible().aggregate(
-            earliest_occurrence=Min('start'),
-            latest_occurrence=Max('finish'),
-        )
+        return get_calendar_bounds(self.calendar)
 
     def _get_kwargs_for_date_from_string(self):
         kwargs = {}
@@ -80,6 +119,38 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
         occurrences = occurrences or []
         return self.period(dt, occurrences=occurrences, timezone=timezone)
 
+    def get_count_precision(self, period):
+        """Returns how finely occurrence start times must be grouped - by
+        'day', 'hour' or 'minute' - so that each group falls within a single
+        day in ``self.timezone``."""
+        default_timezone = get_default_timezone()
+        if self.timezone is default_timezone:
+            return 'day'
+        padding = timedelta(days=1)
+        start, finish = period.start - padding, period.finish + padding
+        offsets = (utc_offsets(self.timezone, start, finish) |
+                   utc_offsets(default_timezone, start, finish))
+        if all(offset is not None and not offset.seconds % 3600
+               for offset in offsets):
+            return 'hour'
+        return 'minute'
+
+    def get_occurrence_counts(self, queryset, virtual_occurrences=()):
+        """Returns an ``OccurrenceCountIndex`` of the occurrences in
+        ``queryset`` and ``virtual_occurrences``, localized to
+        ``self.timezone``. The counts come from a single grouped query, so no
+        occurrences are loaded."""
+        precision = self.get_count_precision(self.period(self.date))
+        counts = queryset.start_counts(precision)
+        counts.extend((o.start, 1) for o in virtual_occurrences)
+        if precision != 'day':
+            starts = localize_datetimes(
+                [dt for dt, count in counts], self.timezone,
+                get_default_timezone()
+            )
+            counts = zip(starts, [count for dt, count in counts])
+        return OccurrenceCountIndex(counts, timezone=self.timezone)
+
     def parse_filter_params(self):
         filter_params = {}
         for key in self.filter_names:
@@ -96,11 +167,8 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
         return queryset
 
     def apply_timezone_filter(self, queryset, timezone):
-        try:
-            self.timezone = pytz.timezone(timezone)
-        except pytz.UnknownTimeZoneError:
-            # fall-back to settings.TIME_ZONE
-            self.timezone = pytz.timezone(settings.TIME_ZONE)
+        # fall-back to settings.TIME_ZONE:
+        self.timezone = get_timezone(timezone) or get_default_timezone()
         return queryset
 
     def apply_period_filter(self, queryset, period):
@@ -132,6 +200,31 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
             )
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates by ``(start, pk)`` keyset if ``keyset_pagination`` is set,
+        following the ``cursor`` of the page linked from. Numbered pages
+        (e.g. from ``digg_pagination``), and occurrences merged with those of
+        series, are paginated by offset as usual.
+        """
+        page = (getattr(self, 'kwargs', {}).get('page') or
+                self.request.GET.get('page'))
+        if (not self.keyset_pagination or page is not None or
+            not hasattr(queryset, 'filter')):
+            return super(CalendarViewBase, self).paginate_queryset(
+                queryset, page_size
+            )
+        paginator = KeysetPaginator(
+            queryset, page_size, field=self.get_date_field(),
+            count=self.count_pages,
+            allow_empty_first_page=self.get_allow_empty()
+        )
+        try:
+            page = paginator.page(self.request.GET.get('cursor') or None)
+        except InvalidPage:
+            raise Http404(u'Invalid page')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_dated_queryset(self, order='asc', **lookup):
         # Hmm... this next step is evidence of a current design flaw:
         # while most filters will want to run *after* filtering on
@@ -154,10 +247,21 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
         if timezone:
             self.apply_timezone_filter([], timezone)
 
-        d = self.date
         date_field = self.get_date_field()
         qs = self.get_queryset().filter(**lookup)
-        period = self.period(d)
+        start, finish = self.get_date_range()
+        if self.overlap:
+            filter_kwargs = {'%s__lte' % date_field: finish,
+                             'finish__gt': start}
+        else:
+            filter_kwargs = {'%s__range' % date_field: (start, finish)}
+        order = '' if order == 'asc' else '-'
+        return qs.filter(**filter_kwargs).order_by("%s%s" % (order, date_field))
+
+    def get_date_range(self):
+        """Returns the naive datetimes, in the default timezone, between which
+        the occurrences shown start (or, see ``overlap``, run)."""
+        period = self.period(self.date)
 
         # Implementation 1:
         # -----------------
@@ -175,13 +279,37 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
         # Implementation 3:
         # -----------------
         date_range = (period.start, period.finish)
-        date_range = [adjust_datetime_to_timezone(
-                     dt, self.timezone, settings.TIME_ZONE) for dt in date_range]
-        date_range = [dt.replace(tzinfo=None) for dt in date_range]
+        date_range = localize_datetimes(
+            date_range, get_default_timezone(), self.timezone
+        )
+        return [dt.replace(tzinfo=None) for dt in date_range]
 
-        filter_kwargs = {'%s__range' % date_field: date_range}
-        order = '' if order == 'asc' else '-'
-        return qs.filter(**filter_kwargs).order_by("%s%s" % (order, date_field))
+    def get_series_occurrences(self):
+        """
+        Returns the virtual occurrences of the calendar's series (see
+        ``OccurrenceSeriesBase``) which the page shows, in order of start.
+        The filters applied to ``get_dated_queryset`` are applied to the
+        range of time expanded.
+        """
+        if OccurrenceSeries is None:
+            return []
+        start, finish = self.get_date_range()
+        now = datetime.now()
+        if not self.get_allow_future():
+            finish = min(finish, now)
+        period = self.filter_params.get('period')
+        if period == 'past':
+            finish = min(finish, now - timedelta(microseconds=1))
+        elif period == 'future':
+            start = max(start, now)
+        elif period == 'today':
+            today = datetime(now.year, now.month, now.day)
+            start = max(start, today)
+            finish = min(finish, today + timedelta(days=1, microseconds=-1))
+        if start > finish:
+            return []
+        return OccurrenceSeries.objects.visible().filter(
+            calendar=self.calendar).expand(start, finish, overlap=self.overlap)
 
     def get_context_data(self, **kwargs):
         context = super(CalendarViewBase, self).get_context_data(**kwargs)
@@ -189,20 +317,113 @@ class CalendarViewBase(DateMixin, BaseListView, TemplateResponseMixin):
             context[key] = callable(value) and value() or value
         return context
 
+    def get_visibility(self):
+        return get_visibility(self.request.user)
+
+    def get_page_parts(self):
+        """
+        Returns what, besides the calendar's version, identifies the response
+        (see ``get_cache_key`` and ``get_etag``) - or ``None`` if the response
+        can be neither cached nor validated.
+
+        Responses which depend upon the current time, rather than just the
+        date, are neither.
+        """
+        if 'period' in self.filter_params or not self.get_allow_future():
+            return None
+        return (self.__class__.__name__, self.request.get_full_path(),
+                translation.get_language(), date.today(),
+                self.get_visibility(), self.request.user.id)
+
+    def get_cache_key(self):
+        """
+        Returns the key under which the response may be cached, or ``None``
+        if it should not be. Keys include the calendar's version (which
+        changes whenever the calendar, its events or its occurrences do), the
+        full path, the language, the current date, which hidden objects the
+        user may see, and the user - pages are rendered with a
+        ``RequestContext``, so may show anything about the user (anonymous
+        users share their pages).
+        """
+        parts = self.get_page_parts()
+        if not self.cache_timeout or parts is None:
+            return None
+        return calendar_page_key(self.calendar.pk, *parts)
+
+    def get_etag(self):
+        """
+        Returns the ETag of the response, for answering conditional requests,
+        or ``None`` if there is none. Like the cache key, it is derived from
+        the calendar's version, so takes no queries beyond the calendar's -
+        and it changes with every write to the calendar, its events, its
+        occurrences or its series, deletions included.
+
+        No ``Last-Modified`` is given: the latest modification time of the
+        occurrences a page shows can't reflect their deletion.
+        """
+        parts = self.get_page_parts()
+        if parts is None:
+            return None
+        version = get_calendar_version(self.calendar.pk)
+        if version is None:
+            # The cache backend doesn't keep values (e.g. the dummy backend),
+            # so writes can't be detected:
+            return None
+        return md5_constructor(repr((version,) + parts)).hexdigest()
+
     def get(self, request, *args, **kwargs):
         self.slug = kwargs.pop('slug', None)
         self.filter_params = self.parse_filter_params()
+        etag = self.get_etag()
+        respond = condition(
+            etag_func=lambda request, **kwargs: etag
+        )(self.get_period_response)
+        return respond(request, **kwargs)
+
+    def get_period_response(self, request, **kwargs):
+        key = self.get_cache_key()
+        if key is None:
+            return self.render_period(**kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content)
+            for header, value in headers:
+                response[header] = value
+            return response
+        response = self.render_period(**kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.content, response.items()),
+                      self.cache_timeout)
+        return response
+
+    def render_period(self, **kwargs):
         occurrences = self.get_dated_queryset()
         occurrences = self.apply_filters(occurrences)
         occurrences = self.allow_future_check(occurrences)
-        occurrences = self.allow_empty_check(occurrences)
+        series_occurrences = self.get_series_occurrences()
+        if not series_occurrences:
+            occurrences = self.allow_empty_check(occurrences)
+        elif not self.aggregate:
+            occurrences = sorted(list(occurrences) + series_occurrences,
+                                 key=lambda o: o.start)
 
         context = self.get_context_data(**{
             'calendar': self.calendar,
             'object_list': occurrences,
         })
+        if self.aggregate:
+            period_occurrences = self.get_occurrence_counts(
+                occurrences, series_occurrences
+            )
+        else:
+            period_occurrences = context['object_list']
+            if self.show_attendance:
+                period_occurrences = Attendance.objects.annotate_occurrences(
+                    period_occurrences, self.request.user
+                )
         self.period_object = self.create_period_object(
-            self.date, context['object_list'], timezone=self.timezone
+            self.date, period_occurrences, timezone=self.timezone
         )
         context.update(self.calendar_bounds)
         context[self.period_name] = self.period_object
@@ -1,4 +1,3 @@
-import calendar
 import time
 from datetime import date
 
@@ -7,16 +6,16 @@ from dateutil.relativedelta import relativedelta
 from django.http import Http404
 from django.shortcuts import render_to_response, get_object_or_404
 from django.template import RequestContext
-from django.utils import formats
 from django.views.generic import list_detail
 
 from calendartools import defaults
-from calendartools.periods import Year, TripleMonth, Month, Week, Day
+from calendartools.periods import (
+    Year, TripleMonth, Month, Week, Day, get_locale_table
+)
 from calendartools.views.base import CalendarViewBase
 from calendartools.views.generic.dates import (
     YearMixin, MonthMixin, WeekMixin, DayMixin
 )
-from calendartools.utils import standardise_first_dow
 from django.db.models.loading import get_model
 
 Calendar = get_model(defaults.CALENDAR_APP_LABEL, 'Calendar')
@@ -41,6 +40,7 @@ class YearView(CalendarViewBase, YearMixin):
     period = Year
     template_name = "calendar/calendar/year.html"
     extra_context = {'size': 'small'}
+    aggregate = True
 
     @property
     def date(self):
@@ -58,6 +58,7 @@ class TriMonthView(MonthView):
     period = TripleMonth
     template_name = "calendar/calendar/tri_month.html"
     extra_context = {'size': 'small'}
+    aggregate = True
 
     @property
     def date(self):
@@ -68,11 +69,11 @@ class WeekView(CalendarViewBase, YearMixin, WeekMixin):
     period_name = 'week'
     period = Week
     template_name = "calendar/calendar/week.html"
+    overlap = True
 
     @property
     def week_format(self):
-        first_dow = standardise_first_dow(formats.get_format('FIRST_DAY_OF_WEEK'))
-        return '%W' if first_dow == calendar.MONDAY else '%U'
+        return get_locale_table().week_format
 
     @property
     def date(self):
@@ -90,6 +91,7 @@ class DayView(CalendarViewBase, YearMixin, MonthMixin, DayMixin):
     period_name = 'day'
     period = Day
     template_name = "calendar/calendar/day.html"
+    overlap = True
 
 def today_view(request, slug, *args, **kwargs):
     today = date.today()
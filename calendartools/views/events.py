@@ -101,7 +101,7 @@ def occurrence_detail(request, slug, pk, show_attending=True, *args, **kwargs):
         attendance = None
     else:
         try:
-            attendance = Attendance.objects.get(
+            attendance = Attendance.objects.with_cancellation_state().get(
                 user=user,
                 occurrence=occurrence,
                 status__in=[Attendance.STATUS.booked, Attendance.STATUS.attended]
@@ -129,7 +129,8 @@ def occurrence_detail(request, slug, pk, show_attending=True, *args, **kwargs):
     if attendance and attendance.status != attendance.STATUS.attended:
         data['form'] = form
     if show_attending:
-        data['attending'] = Attendance.objects.filter(occurrence=occurrence)
+        data['attending'] = Attendance.objects.filter(
+            occurrence=occurrence).select_related('user')
 
     return render_to_response("calendar/occurrence_detail.html", data,
                             context_instance=RequestContext(request))
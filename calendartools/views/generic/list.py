@@ -1,9 +1,21 @@
-from django.core.paginator import Paginator, InvalidPage
+from django.core.paginator import Paginator, InvalidPage, Page
 from django.core.exceptions import ImproperlyConfigured
 from django.http import Http404
 from django.utils.encoding import smart_str
 from calendartools.views.generic.base import TemplateResponseMixin, View
 
+class FirstPage(Page):
+    """
+    The first page of objects, fetched along with one more object than fits
+    on it - which tells whether there's a next page without counting them.
+    """
+    def __init__(self, object_list, paginator, has_next):
+        super(FirstPage, self).__init__(object_list, 1, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
 class MultipleObjectMixin(object):
     allow_empty = True
     queryset = None
@@ -30,24 +42,37 @@ class MultipleObjectMixin(object):
     def paginate_queryset(self, queryset, page_size):
         """
         Paginate the queryset, if needed.
+
+        The first page is fetched along with one more object than fits on it
+        - so if it's the only page, that one query is all it takes, and the
+        list of its objects is returned in place of the queryset. Otherwise,
+        the objects are counted once, by the paginator (though not to tell
+        whether the first page has a next one).
         """
-        if queryset.count() > page_size:
-            paginator = Paginator(queryset, page_size, allow_empty_first_page=self.get_allow_empty())
-            page = self.kwargs.get('page', None) or self.request.GET.get('page', 1)
-            try:
-                page_number = int(page)
-            except ValueError:
-                if page == 'last':
-                    page_number = paginator.num_pages
-                else:
-                    raise Http404("Page is not 'last', nor can it be converted to an int.")
-            try:
-                page = paginator.page(page_number)
-                return (paginator, page, page.object_list, True)
-            except InvalidPage:
-                raise Http404(u'Invalid page (%s)' % page_number)
-        else:
+        paginator = Paginator(queryset, page_size, allow_empty_first_page=self.get_allow_empty())
+        page = self.kwargs.get('page', None) or self.request.GET.get('page', 1)
+        if page in (1, '1') and hasattr(queryset, '_clone'):
+            object_list = list(queryset[:page_size + 1])
+            has_next = len(object_list) > page_size
+            object_list = object_list[:page_size]
+            if not has_next:
+                return (None, None, object_list, False)
+            page = FirstPage(object_list, paginator, has_next)
+            return (paginator, page, page.object_list, True)
+        if paginator.count <= page_size:
             return (None, None, queryset, False)
+        try:
+            page_number = int(page)
+        except ValueError:
+            if page == 'last':
+                page_number = paginator.num_pages
+            else:
+                raise Http404("Page is not 'last', nor can it be converted to an int.")
+        try:
+            page = paginator.page(page_number)
+            return (paginator, page, page.object_list, True)
+        except InvalidPage:
+            raise Http404(u'Invalid page (%s)' % page_number)
 
     def get_paginate_by(self, queryset):
         """
@@ -77,7 +102,7 @@ class MultipleObjectMixin(object):
         """
         Get the context for this view.
         """
-        queryset = kwargs.pop('object_list')
+        queryset = object_list = kwargs.pop('object_list')
         page_size = self.get_paginate_by(queryset)
         if page_size:
             paginator, page, queryset, is_paginated = self.paginate_queryset(queryset, page_size)
@@ -95,7 +120,7 @@ class MultipleObjectMixin(object):
                 'object_list': queryset
             }
         context.update(kwargs)
-        context_object_name = self.get_context_object_name(queryset)
+        context_object_name = self.get_context_object_name(object_list)
         if context_object_name is not None:
             context[context_object_name] = queryset
         return context
@@ -1,3 +1,100 @@
-def vobject(request, *args, **kwargs):
-    pass
+from datetime import datetime, timedelta
 
+from django.contrib.sites.models import get_current_site
+from django.db.models import Q
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.hashcompat import md5_constructor
+from django.views.decorators.http import condition
+
+from calendartools import defaults
+from calendartools.cache import get_calendar_version
+from calendartools.ical import iter_calendar
+from calendartools.views.base import get_visibility
+from calendartools.views.generic.dates import _date_from_string, _month_bounds
+from django.db.models.loading import get_model
+
+Calendar = get_model(defaults.CALENDAR_APP_LABEL, 'Calendar')
+Event = get_model(defaults.CALENDAR_APP_LABEL, 'Event')
+Occurrence = get_model(defaults.CALENDAR_APP_LABEL, 'Occurrence')
+OccurrenceSeries = get_model(defaults.CALENDAR_APP_LABEL, 'OccurrenceSeries')
+
+
+def get_feed_etag(request, calendar_ids):
+    """
+    Returns the ETag of a feed of occurrences from the calendars
+    ``calendar_ids``, derived from their versions (see
+    ``calendartools.cache``) - which change with every write to the
+    calendars, their events and their occurrences, deletions included - so
+    subscribers polling an unchanged feed are answered with a 304 without
+    any occurrences being queried. Returns ``None`` if the cache backend
+    doesn't keep the versions.
+
+    No ``Last-Modified`` is given: the latest modification time of the
+    occurrences can't reflect their deletion.
+    """
+    calendar_ids = sorted(set(calendar_ids))
+    versions = [get_calendar_version(pk) for pk in calendar_ids]
+    if None in versions:
+        return None
+    return md5_constructor(repr((
+        request.path, get_visibility(request.user), zip(calendar_ids, versions)
+    ))).hexdigest()
+
+
+def ical_response(request, occurrences, calendar_ids, name=None,
+                  description=None, series=None, replacements=None):
+    """Returns a response streaming ``occurrences`` and ``series`` (of the
+    calendars ``calendar_ids``) as an iCalendar file (see
+    ``calendartools.ical.iter_calendar``), or a 304 if the client's copy is
+    still current."""
+    etag = get_feed_etag(request, calendar_ids)
+
+    def respond(request):
+        content = iter_calendar(
+            occurrences, get_current_site(request).domain,
+            name=name, description=description, series=series,
+            replacements=replacements
+        )
+        return HttpResponse(content, content_type='text/calendar; charset=utf-8')
+
+    return condition(etag_func=lambda request: etag)(respond)(request)
+
+
+def calendar_ical(request, slug, year=None, month=None):
+    calendar = get_object_or_404(
+        Calendar.objects.visible(request.user), slug=slug
+    )
+    occurrences = replacements = Occurrence.objects.visible(
+        request.user).filter(calendar=calendar)
+    series = OccurrenceSeries.objects.visible(request.user).filter(
+        calendar=calendar
+    )
+    if year is not None:
+        if month is not None:
+            first_day, last_day = _month_bounds(
+                _date_from_string(year, '%Y', month, '%b')
+            )
+        else:
+            first_day = datetime(int(year), 1, 1)
+            last_day = datetime(int(year) + 1, 1, 1)
+        start = datetime(first_day.year, first_day.month, first_day.day)
+        finish = datetime(last_day.year, last_day.month, last_day.day)
+        occurrences = occurrences.filter(start__gte=start, start__lt=finish)
+        # Series with instances in the range are written whole, along with
+        # all of their replacements:
+        series = series.between(start, finish - timedelta(microseconds=1))
+    return ical_response(request, occurrences, [calendar.pk],
+                         name=calendar.name, description=calendar.description,
+                         series=series, replacements=replacements)
+
+
+def event_ical(request, slug):
+    event = get_object_or_404(Event.objects.visible(request.user), slug=slug)
+    occurrences = Occurrence.objects.visible(request.user).filter(event=event)
+    series = OccurrenceSeries.objects.visible(request.user).filter(event=event)
+    calendar_ids = Calendar._default_manager.filter(
+        Q(occurrences__event=event) | Q(series__event=event)
+    ).order_by().values_list('pk', flat=True).distinct()
+    return ical_response(request, occurrences, calendar_ids, name=event.name,
+                         description=event.description, series=series)
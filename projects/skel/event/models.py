@@ -3,10 +3,12 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from calendartools import defaults
 from calendartools.modelbase import (
-    CalendarBase, EventBase, OccurrenceBase, AttendanceBase, CancellationBase
+    CalendarBase, EventBase, OccurrenceBase, OccurrenceSeriesBase,
+    AttendanceBase, CancellationBase
 )
 from calendartools.managers import (
-    CalendarManager, EventManager, OccurrenceManager, AttendanceManager
+    CalendarManager, EventManager, OccurrenceManager, OccurrenceSeriesManager,
+    AttendanceManager
 )
 from calendartools.validators.defaults import activate_default_validators
 
@@ -34,6 +36,9 @@ class Occurrence(OccurrenceBase):
     event = models.ForeignKey('Event', verbose_name=_('event'),
         related_name='occurrences'
     )
+    series = models.ForeignKey('OccurrenceSeries', verbose_name=_('series'),
+        related_name='exceptions', null=True, blank=True
+    )
     objects = OccurrenceManager()
 
 
@@ -41,6 +46,20 @@ class Occurrence(OccurrenceBase):
         app_label = defaults.CALENDAR_APP_LABEL
 
 
+class OccurrenceSeries(OccurrenceSeriesBase):
+    calendar = models.ForeignKey('Calendar', verbose_name=_('calendar'),
+        related_name='series'
+    )
+    event = models.ForeignKey('Event', verbose_name=_('event'),
+        related_name='series'
+    )
+    objects = OccurrenceSeriesManager()
+
+
+    class Meta(OccurrenceSeriesBase.Meta):
+        app_label = defaults.CALENDAR_APP_LABEL
+
+
 class Attendance(AttendanceBase):
     user = models.ForeignKey(User, verbose_name=_('user'),
         related_name='attendances'
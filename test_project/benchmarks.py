@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+"""
+Rough timings for the hot paths of calendartools. Run from this directory::
+
+    python benchmarks.py            # runs everything
+    python benchmarks.py periods    # runs the benchmarks named 'periods'
+
+Each benchmark times one operation over a few sizes or modes, reporting the
+best of several runs in milliseconds. They check nothing: the behaviour they
+depend upon (query counts, cached pages, 304 responses, ...) is covered by
+the tests in ``event/tests``.
+"""
+import os, sys, time
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+from datetime import datetime, timedelta
+
+BENCHMARKS = []
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+def best_of(func, repeat=3):
+    timings = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+    return min(timings) * 1000
+
+def report(label, milliseconds, count=None):
+    if count:
+        print '  %-45s %10.2fms %10.4fms/item' % (
+            label, milliseconds, milliseconds / count
+        )
+    else:
+        print '  %-45s %10.2fms' % (label, milliseconds)
+
+def make_occurrences(count, start, span):
+    """Unsaved occurrences spread evenly over ``span``."""
+    from event.models import Occurrence
+    step = span / count
+    return [Occurrence(start=start + step * i,
+                       finish=start + step * i + timedelta(hours=1))
+            for i in xrange(count)]
+
+class Forgetful(dict):
+    """A dictionary which remembers nothing."""
+    def __setitem__(self, key, value):
+        pass
+
+def setup_database():
+    """Creates an in-memory test database, the first time it is called."""
+    from django.db import connection
+    if not getattr(setup_database, 'done', False):
+        connection.creation.create_test_db(verbosity=0)
+        setup_database.done = True
+    return connection
+
+def create_calendar(slug, count=0, span=timedelta(days=365)):
+    """Creates a calendar and event, with ``count`` published occurrences
+    spread evenly over ``span`` from the start of next year - inserted
+    directly, bypassing validation."""
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from calendartools.cache import invalidate_calendars
+    from event.models import Calendar, Event, Occurrence
+    connection = setup_database()
+    user, created = User.objects.get_or_create(username='benchmarks')
+    calendar = Calendar.objects.create(name=slug, slug=slug)
+    event = Event.objects.create(name=slug, slug=slug, creator=user)
+    if count:
+        start = datetime(datetime.now().year + 1, 1, 1)
+        step = span / count
+        now = datetime.now()
+        published = Occurrence.STATUS.published
+        rows = [(now, now, start + step * i,
+                 start + step * i + timedelta(hours=1),
+                 published, published, '', calendar.pk, event.pk)
+                for i in xrange(count)]
+        connection.cursor().executemany(
+            'INSERT INTO %s (datetime_created, datetime_modified, start, '
+            'finish, status, effective_status, previous_status, calendar_id, '
+            'event_id) VALUES (%%s, %%s, %%s, %%s, %%s, %%s, %%s, %%s, %%s)'
+            % connection.ops.quote_name(Occurrence._meta.db_table), rows
+        )
+        transaction.commit_unless_managed()
+        invalidate_calendars(calendar.pk)
+    return calendar, event
+
+
+def walk_months(period):
+    """Touches the period tree the way ``month_calendar.html`` does."""
+    for month in period.months:
+        for week in month.weeks:
+            for day in week.days:
+                day.occurrences
+
+@benchmark
+def periods():
+    """Builds and walks the grids of a Year, TripleMonth and Week from 1000
+    and 10000 occurrences, in the default timezone and localized."""
+    from calendartools.periods import Year, TripleMonth, Week
+    start = datetime(2011, 1, 3)
+    grids = [
+        ('Year', Year, timedelta(days=365), walk_months),
+        ('TripleMonth', TripleMonth, timedelta(days=91), walk_months),
+        ('Week', Week, timedelta(days=7), lambda week: week.calendar_display),
+    ]
+    for label, period, span, walk in grids:
+        for count in (1000, 10000):
+            occurrences = make_occurrences(count, start, span)
+            for timezone in (None, 'Antarctica/McMurdo'):
+                build = lambda: walk(period(start, occurrences=occurrences,
+                                            timezone=timezone))
+                report('%s, %d occurrences%s' % (
+                    label, count, timezone and ', localized' or ''
+                ), best_of(build), count)
+
+
+def period_footprint(period):
+    """Bytes held by ``period`` itself: the instance plus any ``__dict__``."""
+    size = sys.getsizeof(period)
+    instance_dict = getattr(period, '__dict__', None)
+    if instance_dict is not None:
+        size += sys.getsizeof(instance_dict)
+    return size
+
+@benchmark
+def period_attributes():
+    """Reports the memory held by the periods of a walked Year grid of 2000
+    occurrences, and times reading five datetime attributes of each 20
+    times over."""
+    from calendartools.periods import Year
+    start = datetime(2011, 1, 1)
+    year = Year(start, occurrences=make_occurrences(2000, start,
+                                                    timedelta(days=365)))
+    periods = [year]
+    for month in year.months:
+        periods.append(month)
+        for week in month.weeks:
+            periods.append(week)
+            periods.extend(week.days)
+    print '  %-45s %10d' % ('Year grid, periods', len(periods))
+    print '  %-45s %10dB' % ('Year grid, bytes held by periods',
+                              sum(period_footprint(p) for p in periods))
+    def access():
+        for i in xrange(20):
+            for p in periods:
+                p.year, p.month, p.day, p.weekday(), p.number
+    report('Year grid, attribute reads', best_of(access), len(periods) * 100)
+
+@benchmark
+def locale_tables():
+    """Constructs 10000 Days (reading their day names) and 1000 Weeks, and
+    renders the day names of a month grid's header, under en-gb and en-us -
+    with the language's weekday table shared, and rebuilt for every period
+    (as each period built its own before the tables were shared)."""
+    from django.utils import translation
+    from calendartools.periods import Day, Month, Week, periods
+    start = datetime(2011, 1, 1)
+    days = [start + timedelta(days=i) for i in xrange(10000)]
+    weeks = days[::10]
+    original = periods._locale_tables
+    for language in ('en-gb', 'en-us'):
+        translation.activate(language)
+        try:
+            for label, tables in (('rebuilt', Forgetful()), ('shared', {})):
+                periods._locale_tables = tables
+                month = Month(start)
+                builds = [
+                    ('Day()', lambda: [Day(dt).day_names for dt in days],
+                     len(days)),
+                    ('Week()', lambda: [Week(dt) for dt in weeks], len(weeks)),
+                    ('month header', lambda: [
+                        (unicode(name), unicode(abbr)) for name, abbr in
+                        zip(month.day_names, month.day_names_abbr)
+                    ], None),
+                ]
+                for name, build, count in builds:
+                    report('%s, %s, %s' % (language, name, label),
+                           best_of(build), count)
+        finally:
+            periods._locale_tables = original
+            translation.deactivate()
+
+@benchmark
+def timezones():
+    """Resolves 10000 valid, unknown and default timezone names - through
+    pytz each time, and through the memoized registry - and constructs 10000
+    localized proxies."""
+    import pytz
+    from calendartools.modelproxy import LocalizedOccurrenceProxy
+    from calendartools.tz import get_timezone
+    count = 10000
+    def uncached(name):
+        try:
+            return pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            return None
+    for name in ('America/Chicago', 'Non-Existent/Timezone', 'UTC'):
+        for label, lookup in (('pytz', uncached), ('memoized', get_timezone)):
+            resolve = lambda: [lookup(name) for i in xrange(count)]
+            report('%s, %s' % (name, label), best_of(resolve), count)
+    occurrence = make_occurrences(1, datetime(2011, 1, 1), timedelta(1))[0]
+    proxies = lambda: [
+        LocalizedOccurrenceProxy(occurrence, timezone='America/Chicago')
+        for i in xrange(count)
+    ]
+    report('Localized proxies', best_of(proxies), count)
+
+@benchmark
+def views():
+    """Requests calendar and agenda pages of calendars of 1000 and 100000
+    occurrences: rendered, from the page cache, and answered as not modified
+    (given the ETag of the last response)."""
+    from django.core.urlresolvers import reverse
+    from django.test.client import Client
+    from calendartools.views.base import CalendarViewBase
+    client = Client()
+    year = datetime.now().year + 1
+    original = CalendarViewBase.cache_timeout
+    try:
+        for count in (1000, 100000):
+            calendar, event = create_calendar('views-%d' % count, count)
+            slug = calendar.slug
+            pages = [
+                ('Year', reverse('year-calendar', args=[slug, year])),
+                ('Month', reverse('month-calendar', args=[slug, year, 'may'])),
+                ('Week', reverse('week-calendar', args=[slug, year, 20])),
+                ('Month agenda', reverse('month-agenda',
+                                         args=[slug, year, 'may'])),
+            ]
+            for label, url in pages:
+                CalendarViewBase.cache_timeout = 0
+                etag = client.get(url)['ETag']
+                modes = [
+                    ('', 0, {}),
+                    (', cached', 60, {}),
+                    (', not modified', 0, {'HTTP_IF_NONE_MATCH': etag}),
+                ]
+                for suffix, timeout, headers in modes:
+                    CalendarViewBase.cache_timeout = timeout
+                    get = lambda: client.get(url, **headers)
+                    report('%s, %d occurrences%s' % (label, count, suffix),
+                           best_of(get))
+    finally:
+        CalendarViewBase.cache_timeout = original
+
+
+@benchmark
+def writes():
+    """Adds 100 occurrences one by one and in bulk, and hides then restores
+    calendars of 1000 and 100000 occurrences."""
+    from event.models import Calendar
+    calendar, event = create_calendar('writes')
+    start = datetime.now() + timedelta(days=1)
+    for bulk in (False, True):
+        add = lambda: event.add_occurrences(
+            calendar, start, start + timedelta(hours=1), count=100, bulk=bulk
+        )
+        report('100 occurrences, %s' % (bulk and 'bulk' or 'one by one'),
+               best_of(add))
+    for count in (1000, 100000):
+        calendar, event = create_calendar('writes-%d' % count, count)
+        for status in (Calendar.STATUS.hidden, Calendar.STATUS.published):
+            calendar.status = status
+            report('Calendar of %d occurrences, %s' % (count, status),
+                   best_of(calendar.save, repeat=1), count)
+
+
+@benchmark
+def validators():
+    """Resolves the validator chain of an occurrence 10000 times, and
+    validates and saves a 99-occurrence (the most allowed) recurrence form -
+    with each sender's receivers remembered, and sending the signal every
+    time."""
+    from dateutil import rrule
+    from calendartools.forms import MultipleOccurrenceForm
+    from calendartools.signals import collect_validators
+    from calendartools.validators.base import get_validators
+    from event.models import Occurrence
+    calendar, event = create_calendar('validators')
+    occurrence, count = Occurrence(), 10000
+    day = (datetime.now() + timedelta(days=1)).date()
+    data = {'calendar': calendar.pk, 'day': day, 'start_time_delta': '28800',
+            'end_time_delta': '29700', 'repeats': 'count', 'count': 99,
+            'interval': 1, 'freq': rrule.DAILY}
+    def resolve():
+        for i in xrange(count):
+            get_validators(Occurrence, occurrence)
+    def submit():
+        form = MultipleOccurrenceForm(event=event, data=data)
+        form.is_valid()
+        form.save()
+    original = collect_validators.chains
+    try:
+        for label, chains in (('signal sent', Forgetful()),
+                              ('remembered', {})):
+            collect_validators.chains = chains
+            report('%d chain resolutions, %s' % (count, label),
+                   best_of(resolve), count)
+            report('99-occurrence form, %s' % label, best_of(submit))
+    finally:
+        collect_validators.chains = original
+
+
+def explain(queryset):
+    """Returns the query plan for ``queryset`` on sqlite or PostgreSQL."""
+    from django.db import connection
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    prefix = {'sqlite': 'EXPLAIN QUERY PLAN '}.get(connection.vendor,
+                                                  'EXPLAIN ')
+    cursor = connection.cursor()
+    cursor.execute(prefix + sql, params)
+    return [' '.join(str(column) for column in row)
+            for row in cursor.fetchall()]
+
+@benchmark
+def range_queries():
+    """Shows the query plans of the month and week views' occurrence
+    queries, and times them - and the calendar bounds - against a calendar
+    of 100000 occurrences (among 200000), with and without the composite
+    indexes."""
+    from django.db import connection
+    from django.db.models import Max, Min
+    from calendartools.indexes import (
+        composite_index_name, sql_create_composite_indexes
+    )
+    from event.models import Occurrence
+    year = datetime.now().year + 1
+    create_calendar('range-queries-other', 100000)
+    calendar, event = create_calendar('range-queries', 100000)
+    visible = calendar.occurrences.visible()
+    week_start, week_finish = datetime(year, 5, 2), datetime(year, 5, 9)
+    queries = [
+        ('Month', visible.filter(start__range=(
+            datetime(year, 5, 1), datetime(year, 6, 1))).order_by('start')),
+        ('Week', visible.filter(start__lte=week_finish,
+                                finish__gt=week_start).order_by('start')),
+    ]
+    for label, queryset in queries:
+        print '  %s query plan:' % label
+        for line in explain(queryset):
+            print '    %s' % line
+
+    cursor = connection.cursor()
+    for suffix in ('', ', no composite indexes'):
+        if suffix:
+            for fields in Occurrence.composite_indexes:
+                cursor.execute('DROP INDEX %s' % connection.ops.quote_name(
+                    composite_index_name(Occurrence, fields, connection)
+                ))
+        for label, queryset in queries:
+            fetch = lambda: list(queryset.values_list('pk'))
+            report('%s%s' % (label, suffix), best_of(fetch))
+        bounds = lambda: visible.aggregate(Min('start'), Max('finish'))
+        report('Calendar bounds%s' % suffix, best_of(bounds))
+    for sql in sql_create_composite_indexes(Occurrence, connection):
+        cursor.execute(sql)
+
+@benchmark
+def series():
+    """Expands a month of a daily series begun 1, 5 and 20 years ago, from
+    the rrule and from the recurrence cache (warm, and extended by the
+    following month)."""
+    from dateutil import rrule
+    from calendartools.recurrence import (
+        RecurrenceCache, format_rrule, parse_rrule
+    )
+    rule = format_rrule(rrule.DAILY)
+    year = datetime.now().year
+    start, finish = datetime(year, 5, 1), datetime(year, 5, 31, 23, 59)
+    for age in (1, 5, 20):
+        dtstart = datetime(year - age, 5, 1, 9)
+        cache = RecurrenceCache()
+        direct = lambda: parse_rrule(rule, dtstart).between(start, finish,
+                                                             inc=True)
+        cached = lambda: cache.between(rule, dtstart, start, finish)
+        def extended():
+            cached()
+            cache.between(rule, dtstart, start + timedelta(days=31),
+                          finish + timedelta(days=30))
+        cached()
+        for label, func in (('rrule', direct), ('cached', cached),
+                            ('cached and extended', extended)):
+            report('%d years, %s' % (age, label), best_of(func))
+
+
+@benchmark
+def pagination():
+    """Fetches the first, 100th and 5000th pages of 20 occurrences out of
+    100000, by offset (counting them, as ``Paginator`` does) and by keyset -
+    counted and not."""
+    from django.core.paginator import Paginator
+    from calendartools.paginator import KeysetPaginator, encode_cursor
+    calendar, event = create_calendar('pagination', 100000)
+    occurrences = calendar.occurrences.all()
+    ordered = occurrences.order_by('start', 'pk')
+    for number in (1, 100, 5000):
+        cursor = None
+        if number > 1:
+            last = ordered[(number - 1) * 20 - 1]
+            cursor = encode_cursor('next', last.start, last.pk, number)
+        offset = lambda: list(Paginator(ordered, 20).page(number).object_list)
+        def keyset(count):
+            paginator = KeysetPaginator(occurrences, 20, count=count)
+            paginator.page(cursor)
+            return paginator.num_pages
+        for label, func in (('offset', offset),
+                            ('keyset', lambda: keyset(True)),
+                            ('keyset, uncounted', lambda: keyset(False))):
+            report('Page %d, %s' % (number, label), best_of(func))
+
+
+@benchmark
+def ical():
+    """Streams the iCalendar exports of 20000 and 200000 occurrences,
+    reporting the most memory (resident set size, on Linux) each grew by."""
+    from django.core.urlresolvers import reverse
+    from django.test.client import Client
+    page_size = os.sysconf('SC_PAGE_SIZE') // 1024
+    resident = lambda: int(open('/proc/self/statm').read().split()[1]) * page_size
+    client = Client()
+    for count in (20000, 200000):
+        calendar, event = create_calendar('ical-%d' % count, count)
+        url = reverse('calendar-ical', args=[calendar.slug])
+        before = peak = resident()
+        start = time.time()
+        for chunk in client.get(url)._container:
+            peak = max(peak, resident())
+        report('%d occurrences' % count, (time.time() - start) * 1000, count)
+        print '  %-45s %10dKB' % ('%d occurrences, memory growth' % count,
+                                  peak - before)
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:]
+    for func in BENCHMARKS:
+        if not names or func.__name__ in names:
+            print '%s:' % func.__name__
+            func()
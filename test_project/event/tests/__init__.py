@@ -1,10 +1,17 @@
+from test_cache import *
 from test_context_processors import *
 from test_defaults import *
 from test_fields import *
 from test_forms import *
+from test_ical import *
+from test_indexes import *
 from test_models import *
 from test_managers import *
 from test_modelproxy import *
+from test_paginator import *
 from test_periods import *
+from test_recurrence import *
+from test_signals import *
 from test_templatetags import *
+from test_tz import *
 from test_views import *
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from nose.tools import *
+
+from event.models import Calendar, Event, Occurrence
+from calendartools.cache import get_calendar_bounds, invalidate_calendar_bounds
+
+
+class TestCalendarBounds(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.other = Calendar.objects.create(name='Other', slug='other')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime.now().replace(microsecond=0) + timedelta(1)
+        self.occurrences = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            count=3
+        )
+
+    def assert_bounds(self, calendar, start, finish):
+        assert_equal(get_calendar_bounds(calendar), {
+            'earliest_occurrence': start,
+            'latest_occurrence': finish,
+        })
+
+    def test_bounds_cached(self):
+        finish = self.start + timedelta(days=2, hours=1)
+        self.assert_bounds(self.calendar, self.start, finish)
+        self.assertNumQueries(0, get_calendar_bounds, self.calendar)
+        invalidate_calendar_bounds(self.calendar.pk)
+        # One query for the occurrences, and one for the series:
+        self.assertNumQueries(2, get_calendar_bounds, self.calendar)
+
+    def test_invalidated_on_occurrence_save_and_delete(self):
+        self.assert_bounds(self.other, None, None)
+        first, second, last = self.occurrences
+        last.finish += timedelta(hours=1)
+        last.save()
+        self.assert_bounds(self.calendar, self.start, last.finish)
+
+        # Moved to another calendar:
+        last.calendar = self.other
+        last.save()
+        self.assert_bounds(self.calendar, self.start, second.finish)
+        self.assert_bounds(self.other, last.start, last.finish)
+
+        first.delete()
+        self.assert_bounds(self.calendar, second.start, second.finish)
+        Occurrence.objects.filter(pk=second.pk).delete()
+        self.assert_bounds(self.calendar, None, None)
+
+    def test_invalidated_on_bulk_changes(self):
+        self.assert_bounds(self.other, None, None)
+        start = self.start + timedelta(days=5)
+        self.event.add_occurrences(
+            self.other, start, start + timedelta(hours=1), bulk=True
+        )
+        self.assert_bounds(self.other, start, start + timedelta(hours=1))
+
+        self.event.status = Event.STATUS.hidden
+        self.event.save()
+        self.assert_bounds(self.calendar, None, None)
+        self.assert_bounds(self.other, None, None)
+
+        Event.objects.update(status=Event.STATUS.published)
+        Occurrence.objects.filter(calendar=self.other).cascade_status()
+        self.assert_bounds(self.other, start, start + timedelta(hours=1))
+
+    def test_series_included(self):
+        earlier = self.start - timedelta(days=30)
+        series = self.event.add_series(
+            self.calendar, earlier, earlier + timedelta(hours=2), count=50
+        )
+        self.assert_bounds(self.calendar, earlier,
+                           earlier + timedelta(days=49, hours=2))
+        self.assert_bounds(self.other, None, None)
+
+        series.rule = 'FREQ=DAILY;INTERVAL=1'
+        series.save()
+        self.assert_bounds(self.calendar, earlier, datetime.max)
+
+        series.status = series.STATUS.hidden
+        series.save()
+        self.assert_bounds(self.calendar, self.start,
+                           self.start + timedelta(days=2, hours=1))
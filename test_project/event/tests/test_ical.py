@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from dateutil import rrule
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from nose.tools import *
+
+from event.models import Calendar, Event, Occurrence
+from calendartools.ical import (
+    MAX_LINE_LENGTH, escape_text, fold, format_offset, format_rule,
+    iter_calendar, iter_chunks, vtimezone
+)
+from calendartools.tz import get_timezone
+
+
+def unfold(content):
+    return content.replace('\r\n ', '')
+
+
+class TestICalendarSerialization(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime(datetime.now().year + 1, 5, 7, 9)
+        self.occurrences = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            count=5
+        )
+
+    def test_escape_text(self):
+        assert_equal(escape_text(u'a\\b;c,d\r\ne\nf'),
+                     u'a\\\\b\\;c\\,d\\ne\\nf')
+
+    def test_fold(self):
+        assert_equal(fold(u'SUMMARY:short'), 'SUMMARY:short')
+        line = u'DESCRIPTION:' + u'\xe9' * 100
+        folded = fold(line)
+        for part in folded.split('\r\n'):
+            assert part.decode('utf-8') # multi-octet characters intact
+            assert len(part) <= MAX_LINE_LENGTH
+        assert_equal(unfold(folded).decode('utf-8'), line)
+
+    def test_iter_chunks(self):
+        occurrences = Occurrence.objects.all()
+        with self.assertNumQueries(3):
+            chunks = list(iter_chunks(occurrences, chunk_size=2))
+        assert_equal([len(chunk) for chunk in chunks], [2, 2, 1])
+        assert_equal([o.pk for chunk in chunks for o in chunk],
+                     [o.pk for o in self.occurrences])
+        # A final, empty chunk is needed to be sure there are no more:
+        with self.assertNumQueries(2):
+            chunks = list(iter_chunks(occurrences, chunk_size=5))
+        assert_equal(len(chunks), 1)
+        assert_equal(list(iter_chunks(occurrences.filter(pk=None))), [])
+
+    def test_iter_calendar(self):
+        occurrences = Occurrence.objects.visible()
+        # One query for each chunk of occurrences, and one for their events:
+        with self.assertNumQueries(6):
+            content = ''.join(iter_calendar(
+                occurrences, 'example.com', name=u'Basic', chunk_size=2
+            ))
+        assert content.startswith('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n')
+        assert content.endswith('END:VCALENDAR\r\n')
+        assert_equal(content.count('BEGIN:VEVENT'), 5)
+        assert 'X-WR-CALNAME:Basic\r\n' in content
+        assert 'UID:occurrence-%s@example.com\r\n' % self.occurrences[0].pk in content
+        # Times are given in UTC (America/Chicago being 5 hours behind):
+        assert 'DTSTART:%d0507T140000Z\r\n' % self.start.year in content
+        assert 'DTEND:%d0507T150000Z\r\n' % self.start.year in content
+        assert_equal(content.count('STATUS:CONFIRMED'), 5)
+
+    def test_format_offset(self):
+        assert_equal(format_offset(timedelta(hours=-5)), '-0500')
+        assert_equal(format_offset(timedelta(hours=5, minutes=30)), '+0530')
+        assert_equal(format_offset(timedelta(0)), '+0000')
+        assert_equal(format_offset(timedelta(minutes=-50, seconds=-36)),
+                     '-005036')
+
+    def test_format_rule(self):
+        timezone = get_timezone('America/Chicago')
+        assert_equal(format_rule('FREQ=DAILY;INTERVAL=1', timezone),
+                     'FREQ=DAILY;INTERVAL=1')
+        # An UNTIL is given in UTC, as required with a TZID:
+        assert_equal(
+            format_rule('FREQ=DAILY;UNTIL=20120601T090000;COUNT=3', timezone),
+            'FREQ=DAILY;UNTIL=20120601T140000Z;COUNT=3'
+        )
+
+    def test_vtimezone(self):
+        lines = vtimezone(get_timezone('America/Chicago'),
+                          datetime(2012, 1, 1))
+        assert_equal(lines[:2], ['BEGIN:VTIMEZONE', 'TZID:America/Chicago'])
+        assert_equal(lines[-1], 'END:VTIMEZONE')
+        # The observance in force, then every transition since:
+        assert_equal(lines[2:8], [
+            'BEGIN:STANDARD', 'DTSTART:20111106T020000',
+            'TZOFFSETFROM:-0500', 'TZOFFSETTO:-0600', 'TZNAME:CST',
+            'END:STANDARD'
+        ])
+        assert_equal(lines[8:14], [
+            'BEGIN:DAYLIGHT', 'DTSTART:20120311T020000',
+            'TZOFFSETFROM:-0600', 'TZOFFSETTO:-0500', 'TZNAME:CDT',
+            'END:DAYLIGHT'
+        ])
+        lines = vtimezone(get_timezone('UTC'), datetime(2012, 1, 1))
+        assert_equal(lines[2:8], [
+            'BEGIN:STANDARD', 'DTSTART:20120101T000000',
+            'TZOFFSETFROM:+0000', 'TZOFFSETTO:+0000', 'TZNAME:UTC',
+            'END:STANDARD'
+        ])
+
+
+class TestICalendarViews(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user,
+            description=u'Bring snacks; and drinks, too.'
+        )
+        self.start = datetime(datetime.now().year + 1, 5, 7, 9)
+        self.occurrences = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            count=3
+        )
+        self.url = reverse('calendar-ical', args=[self.calendar.slug])
+
+    def test_calendar_feed(self):
+        occurrence = self.occurrences[1]
+        occurrence.status = occurrence.STATUS.cancelled
+        occurrence.save()
+        occurrence = self.occurrences[2]
+        occurrence.status = occurrence.STATUS.hidden
+        occurrence.save()
+
+        response = self.client.get(self.url)
+        assert_equal(response.status_code, 200)
+        assert_equal(response['Content-Type'], 'text/calendar; charset=utf-8')
+        assert response['ETag']
+        assert not response.has_header('Last-Modified')
+        content = unfold(response.content)
+        assert_equal(content.count('BEGIN:VEVENT'), 2)
+        assert_equal(content.count('STATUS:CANCELLED'), 1)
+        assert 'DESCRIPTION:Bring snacks\\; and drinks\\, too.' in content
+
+    def test_range_feeds(self):
+        other = self.start.replace(month=6)
+        self.event.add_occurrences(
+            self.calendar, other, other + timedelta(hours=1)
+        )
+        args = [self.calendar.slug, self.start.year]
+        year = self.client.get(reverse('year-ical', args=args))
+        assert_equal(year.content.count('BEGIN:VEVENT'), 4)
+        month = self.client.get(reverse('month-ical', args=args + ['may']))
+        assert_equal(month.content.count('BEGIN:VEVENT'), 3)
+        month = self.client.get(reverse('month-ical', args=args + ['jun']))
+        assert_equal(month.content.count('BEGIN:VEVENT'), 1)
+        response = self.client.get(reverse('month-ical', args=args + ['foo']))
+        assert_equal(response.status_code, 404)
+
+    def test_event_feed(self):
+        other = Calendar.objects.create(name='Other', slug='other')
+        self.event.add_occurrences(
+            other, self.start, self.start + timedelta(hours=1)
+        )
+        response = self.client.get(
+            reverse('event-ical', args=[self.event.slug])
+        )
+        # The content is generated as it is read, so can only be read once:
+        content = response.content
+        assert_equal(content.count('BEGIN:VEVENT'), 4)
+        assert 'X-WR-CALNAME:Event' in content
+
+    def test_series(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            freq=rrule.WEEKLY
+        )
+        moved, removed = [self.start + timedelta(weeks=i) for i in (1, 2)]
+        replacement = series.materialize(moved,
+                                         start=moved + timedelta(hours=2),
+                                         finish=moved + timedelta(hours=3))
+        series.materialize(removed, status=Occurrence.STATUS.inactive)
+
+        content = unfold(self.client.get(self.url).content)
+        # The 3 occurrences, the series and its replacement:
+        assert_equal(content.count('BEGIN:VEVENT'), 5)
+        assert_equal(content.count('UID:series-%s@' % series.pk), 2)
+        assert 'UID:occurrence-%s@' % replacement.pk not in content
+        year = self.start.year
+        assert 'BEGIN:VTIMEZONE\r\nTZID:America/Chicago\r\n' in content
+        assert ('DTSTART;TZID=America/Chicago:%d0507T090000\r\n'
+                'DTEND;TZID=America/Chicago:%d0507T100000\r\n'
+                'RRULE:FREQ=WEEKLY;INTERVAL=1\r\n'
+                'EXDATE;TZID=America/Chicago:%d0521T090000\r\n'
+                % (year, year, year)) in content
+        assert ('DTSTART:%d0514T160000Z\r\nDTEND:%d0514T170000Z\r\n'
+                'RECURRENCE-ID;TZID=America/Chicago:%d0514T090000\r\n'
+                % (year, year, year)) in content
+
+        event = self.client.get(reverse('event-ical', args=[self.event.slug]))
+        assert_equal(unfold(event.content).count(
+            'UID:series-%s@' % series.pk), 2)
+
+        # Date-ranged feeds include the series with instances in the range,
+        # along with all of their replacements:
+        args = [self.calendar.slug, year]
+        june = self.client.get(reverse('month-ical', args=args + ['jun']))
+        assert_equal(june.content.count('BEGIN:VEVENT'), 2)
+        april = self.client.get(reverse('month-ical', args=args + ['apr']))
+        assert_equal(april.content.count('BEGIN:VEVENT'), 0)
+        assert 'BEGIN:VTIMEZONE' not in april.content
+
+    def test_hidden_series(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            freq=rrule.DAILY
+        )
+        series.status = series.STATUS.hidden
+        series.save()
+        content = self.client.get(self.url).content
+        assert 'series-%s' % series.pk not in content
+        assert_equal(content.count('BEGIN:VEVENT'), 3)
+
+    def test_invisible_calendar(self):
+        self.calendar.status = self.calendar.STATUS.hidden
+        self.calendar.save()
+        assert_equal(self.client.get(self.url).status_code, 404)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        # Only the calendar is fetched:
+        with self.assertNumQueries(1):
+            conditional = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        assert_equal(conditional.status_code, 304)
+
+        self.occurrences[0].delete()
+        conditional = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        assert_equal(conditional.status_code, 200)
+
+        self.event.status = self.event.STATUS.hidden
+        self.event.save()
+        modified = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=conditional['ETag']
+        )
+        assert_equal(modified.status_code, 200)
+        assert_equal(modified.content.count('BEGIN:VEVENT'), 0)
+
+    def test_event_feed_not_modified(self):
+        url = reverse('event-ical', args=[self.event.slug])
+        response = self.client.get(url)
+        self.assertNumQueries(2, lambda: self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        ))
+        # Occurrences in other calendars are part of the feed, too:
+        other = Calendar.objects.create(name='Other', slug='other')
+        self.event.add_occurrences(
+            other, self.start, self.start + timedelta(hours=1)
+        )
+        conditional = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert_equal(conditional.status_code, 200)
+        conditional = self.client.get(
+            url, HTTP_IF_NONE_MATCH=conditional['ETag']
+        )
+        assert_equal(conditional.status_code, 304)
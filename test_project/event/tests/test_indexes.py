@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from django.db import connection
+from django.test import TestCase
+from nose.tools import *
+
+from event.models import Calendar, Occurrence
+from calendartools.indexes import (
+    composite_index_name, index_exists, sql_create_composite_indexes
+)
+
+
+class TestCompositeIndexes(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.names = [
+            composite_index_name(Occurrence, fields, connection)
+            for fields in Occurrence.composite_indexes
+        ]
+
+    def test_sql_create_composite_indexes(self):
+        statements = sql_create_composite_indexes(Occurrence, connection)
+        assert_equal(len(statements), len(Occurrence.composite_indexes))
+        qn = connection.ops.quote_name
+        assert_equal(statements[0], 'CREATE INDEX %s ON %s (%s, %s);' % (
+            qn(self.names[0]), qn(Occurrence._meta.db_table),
+            qn('calendar_id'), qn('start')
+        ))
+
+    def test_indexes_created_by_syncdb(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            return
+        for name in self.names:
+            assert index_exists(connection, name), name
+        assert not index_exists(connection, 'no_such_index')
+
+    def test_date_ranged_queries_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            return
+        queryset = self.calendar.occurrences.visible().filter(
+            start__range=(datetime(2011, 5, 1), datetime(2011, 6, 1))
+        ).order_by('start')
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        assert composite_index_name(
+            Occurrence, ('calendar', 'start'), connection
+        ) in plan, plan
+        assert 'TEMP B-TREE' not in plan, plan # i.e., no sort is needed.
@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
-from django.test import TestCase
-from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import AnonymousUser, User
 from nose.tools import *
-from event.models import Calendar, Event, Occurrence, Attendance
+from event.models import (
+    Calendar, Event, Occurrence, OccurrenceSeries, Attendance
+)
 
 
 class TestCommonManager(TestCase):
@@ -89,6 +92,187 @@ class TestOccurrenceManager(TestCommonManager):
         self.model = Occurrence
         self.event = self.occurrences[0].event
 
+    def test_visible_without_joins(self):
+        # Visibility is decided by ``effective_status`` alone:
+        for user in (None, AnonymousUser()):
+            sql = str(Occurrence.objects.visible(user).query)
+            assert 'JOIN' not in sql, sql
+
+    def test_start_counts(self):
+        year = datetime.now().year + 1
+        start = datetime(year, 3, 1, 9, 15)
+        for dt in (start, start + timedelta(minutes=30),
+                   start + timedelta(days=1)):
+            Occurrence.objects.create(
+                event=self.event, calendar=self.calendar,
+                start=dt, finish=dt + timedelta(hours=1)
+            )
+        occurrences = Occurrence.objects.filter(
+            start__range=(datetime(year, 1, 1), datetime(year + 1, 1, 1))
+        )
+        assert_equal(sorted(occurrences.start_counts()), [
+            (datetime(year, 3, 1), 2),
+            (datetime(year, 3, 2), 1),
+        ])
+        assert_equal(sorted(occurrences.start_counts('hour')), [
+            (datetime(year, 3, 1, 9), 2),
+            (datetime(year, 3, 2, 9), 1),
+        ])
+        assert_equal(sorted(occurrences.start_counts('minute')), [
+            (datetime(year, 3, 1, 9, 15), 1),
+            (datetime(year, 3, 1, 9, 45), 1),
+            (datetime(year, 3, 2, 9, 15), 1),
+        ])
+        assert_equal(occurrences.filter(pk=None).start_counts(), [])
+
+    def test_bulk_create(self):
+        start = datetime.now() + timedelta(days=1)
+        occurrences = [
+            Occurrence(event=self.event, calendar=self.calendar,
+                       start=start + timedelta(hours=i),
+                       finish=start + timedelta(hours=i + 1))
+            for i in range(20)
+        ]
+        existing = Occurrence.objects.count()
+        for batch_size in (None, 1, 7):
+            assert_equal(
+                Occurrence.objects.bulk_create(occurrences, batch_size),
+                occurrences
+            )
+        assert_equal(Occurrence.objects.count(), existing + 60)
+        assert_equal(
+            Occurrence.objects.filter(start__gte=start).count(), 60
+        )
+        self.event.status = Event.STATUS.hidden
+        Occurrence.objects.bulk_create(occurrences[:1])
+        assert_equal(Occurrence.objects.filter(
+            start__gte=start, effective_status=Event.STATUS.hidden
+        ).count(), 1)
+        assert_equal(Occurrence.objects.bulk_create([]), [])
+        # Automatic values are filled in, as ``save`` would:
+        assert not Occurrence.objects.filter(
+            start__gte=start, datetime_modified=None).exists()
+
+    def test_status_cascade(self):
+        STATUS = Occurrence.STATUS
+        original = [o.status for o in self.occurrences]
+        statuses = lambda: list(Occurrence.objects.order_by('pk').values_list(
+            'status', 'previous_status', 'effective_status'
+        ))
+        assert_equal(statuses(), [(s, '', s) for s in original])
+
+        self.event.status = STATUS.hidden
+        self.event.save()
+        assert_equal(statuses(), [
+            (STATUS.hidden,   STATUS.published, STATUS.hidden),
+            (STATUS.hidden,   STATUS.cancelled, STATUS.hidden),
+            (STATUS.hidden,   '',               STATUS.hidden),
+            (STATUS.inactive, '',               STATUS.inactive),
+        ])
+        self.calendar.status = STATUS.cancelled
+        self.calendar.save()
+        self.event.status = STATUS.published
+        self.event.save()
+        assert_equal(statuses(), [
+            (STATUS.cancelled, STATUS.published, STATUS.cancelled),
+            (STATUS.cancelled, '',               STATUS.cancelled),
+            (STATUS.hidden,    '',               STATUS.hidden),
+            (STATUS.inactive,  '',               STATUS.inactive),
+        ])
+        self.calendar.status = STATUS.published
+        self.calendar.save()
+        assert_equal(statuses(), [(s, '', s) for s in original])
+
+    def test_status_edited_while_cascaded(self):
+        STATUS = Occurrence.STATUS
+        self.calendar.status = STATUS.hidden
+        self.calendar.save()
+        occurrence = Occurrence.objects.get(pk=self.occurrences[0].pk)
+        assert_equal(occurrence.previous_status, STATUS.published)
+        occurrence.status = STATUS.cancelled
+        occurrence.save()
+
+        # The edit is kept when the calendar is published again, rather than
+        # the status from before the calendar was hidden:
+        self.calendar.status = STATUS.published
+        self.calendar.save()
+        occurrence = Occurrence.objects.get(pk=occurrence.pk)
+        assert_equal(
+            (occurrence.status, occurrence.previous_status,
+             occurrence.effective_status),
+            (STATUS.cancelled, '', STATUS.cancelled)
+        )
+
+        # Saving without an edit leaves the cascaded status to be restored:
+        self.calendar.status = STATUS.hidden
+        self.calendar.save()
+        occurrence = Occurrence.objects.get(pk=self.occurrences[1].pk)
+        assert_equal(occurrence.previous_status, STATUS.cancelled)
+        occurrence.save()
+        self.calendar.status = STATUS.published
+        self.calendar.save()
+        assert_equal(Occurrence.objects.get(pk=occurrence.pk).status,
+                     STATUS.cancelled)
+
+    def test_cascade_status(self):
+        STATUS = Occurrence.STATUS
+        original = [o.status for o in self.occurrences]
+        # Queryset updates don't cascade:
+        Calendar.objects.update(status=STATUS.inactive)
+        assert_equal(Occurrence.objects.visible().count(), 2)
+
+        for chunk_size in (None, 1, 3):
+            Calendar.objects.update(status=STATUS.inactive)
+            assert_equal(Occurrence.objects.cascade_status(chunk_size), 3)
+            assert_equal(Occurrence.objects.cascade_status(chunk_size), 0)
+            assert_equal(Occurrence.objects.visible().count(), 0)
+            assert_equal(Occurrence.objects.inactive.count(), 4)
+
+            Calendar.objects.update(status=STATUS.published)
+            assert_equal(Occurrence.objects.cascade_status(chunk_size), 3)
+            assert_equal(
+                [o.status for o in Occurrence.objects.order_by('pk')],
+                original
+            )
+        assert_equal(Occurrence.objects.filter(pk=None).cascade_status(), 0)
+
+    def test_cascade_status_chunks(self):
+        # Chunks follow the occurrences, not the span of their primary keys:
+        Occurrence.objects.filter(pk=self.occurrences[-1].pk).update(
+            id=self.occurrences[-1].pk + 10000
+        )
+        occurrences = Occurrence.objects.filter(calendar=self.calendar)
+        # One query for the calendars, then two chunks (of 3 and 1), each a
+        # query for its bounds and one for its combinations of statuses,
+        # and an UPDATE per combination:
+        self.assertNumQueries(9, occurrences.cascade_status, 3)
+
+        # Cascaded changes are visible in the modification times:
+        modified = datetime.now() - timedelta(days=1)
+        Occurrence.objects.update(datetime_modified=modified)
+        Calendar.objects.update(status=Occurrence.STATUS.inactive)
+        occurrences.cascade_status()
+        assert_equal(
+            Occurrence.objects.filter(datetime_modified=modified).count(), 1
+        )
+        Occurrence.objects.update(datetime_modified=modified)
+        Occurrence.objects.update(effective_status=Occurrence.STATUS.published)
+        assert_equal(Occurrence.objects.update_effective_status(), 4)
+        assert not Occurrence.objects.filter(
+            datetime_modified=modified).exists()
+
+    def test_update_effective_status(self):
+        Occurrence.objects.update(effective_status=Occurrence.STATUS.inactive)
+        assert_equal(Occurrence.objects.update_effective_status(), 3)
+        assert_equal(Occurrence.objects.update_effective_status(), 0)
+        assert_equal(Occurrence.objects.visible().count(), 2)
+
+    def test_visible_filters_on_occurrence_table_only(self):
+        where = str(Occurrence.objects.visible().query).split('WHERE')[1]
+        assert 'effective_status' in where
+        for model in (Event, Calendar):
+            assert model._meta.db_table not in where
+
     def test_visible_with_hidden_event(self):
         self.event.status = Event.STATUS.hidden
         self.event.save()
@@ -190,6 +374,96 @@ class TestOccurrenceManager(TestCommonManager):
         )
 
 
+class TestBulkCreateTransactions(TransactionTestCase):
+    def setUp(self):
+        user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=user
+        )
+        start = datetime.now() + timedelta(days=1)
+        self.occurrences = [
+            Occurrence(event=self.event, calendar=self.calendar,
+                       start=start + timedelta(hours=i),
+                       finish=start + timedelta(hours=i + 1))
+            for i in range(3)
+        ]
+
+    def test_commits_without_a_transaction(self):
+        Occurrence.objects.bulk_create(self.occurrences)
+        transaction.rollback()
+        assert_equal(Occurrence.objects.count(), 3)
+
+    @transaction.commit_manually
+    def test_joins_the_callers_transaction(self):
+        try:
+            Occurrence.objects.bulk_create(self.occurrences)
+            assert_equal(Occurrence.objects.count(), 3)
+            # Rolling back the caller's transaction discards the rows:
+            transaction.rollback()
+            assert_equal(Occurrence.objects.count(), 0)
+        finally:
+            transaction.rollback()
+
+
+class TestOccurrenceSeriesManager(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime(datetime.now().year + 1, 1, 5, 9)
+        self.finish = self.start + timedelta(hours=1)
+        self.daily = self.event.add_series(
+            self.calendar, self.start, self.finish
+        )
+        self.ended = self.event.add_series(
+            self.calendar, self.start, self.finish, count=2
+        )
+
+    def test_between(self):
+        later = self.start + timedelta(days=30)
+        assert_equal(
+            set(OccurrenceSeries.objects.between(later, later)),
+            set([self.daily])
+        )
+        assert_equal(
+            set(OccurrenceSeries.objects.between(self.start, later)),
+            set([self.daily, self.ended])
+        )
+        earlier = self.start - timedelta(days=1)
+        assert_equal(list(OccurrenceSeries.objects.between(earlier, earlier)),
+                     [])
+
+    def test_expand(self):
+        self.ended.materialize(
+            self.start, status=Occurrence.STATUS.inactive
+        )
+        finish = self.start + timedelta(days=2, hours=12)
+        with self.assertNumQueries(2):
+            occurrences = OccurrenceSeries.objects.all().expand(
+                self.start, finish
+            )
+        assert_equal(
+            [(o.series, o.start) for o in occurrences],
+            [(self.daily, self.start),
+             (self.daily, self.start + timedelta(days=1)),
+             (self.ended, self.start + timedelta(days=1)),
+             (self.daily, self.start + timedelta(days=2))]
+        )
+        assert_equal(OccurrenceSeries.objects.filter(pk=None).expand(
+            self.start, finish), [])
+
+    def test_visible(self):
+        self.ended.status = OccurrenceSeries.STATUS.hidden
+        self.ended.save()
+        assert_equal(list(OccurrenceSeries.objects.visible()), [self.daily])
+        self.calendar.status = Calendar.STATUS.inactive
+        self.calendar.save()
+        assert_equal(list(OccurrenceSeries.objects.visible()), [])
+
+
 class TestAttendanceManager(TestCase):
     def setUp(self):
         self.user = User.objects.create(username='TestyMcTesterson')
@@ -239,3 +513,33 @@ class TestAttendanceManager(TestCase):
             set(Attendance.objects.active),
             set(Attendance.objects.filter(id=self.attendance.id))
         )
+
+    def test_annotate_occurrences(self):
+        other = User.objects.create(username='Other')
+        Attendance.objects.create(user=other, occurrence=self.occurrences[0],
+                                  status=Attendance.STATUS.booked)
+        Attendance.objects.create(user=other, occurrence=self.occurrences[1],
+                                  status=Attendance.STATUS.cancelled)
+        virtual = Occurrence(start=self.start, finish=self.finish)
+        occurrences = Occurrence.objects.filter(
+            pk__in=[o.pk for o in self.occurrences[:3]]).order_by('pk')
+
+        # One query for the occurrences, one for the counts, and one for the
+        # user's attendance:
+        with self.assertNumQueries(3):
+            annotated = Attendance.objects.annotate_occurrences(
+                list(occurrences) + [virtual], self.user
+            )
+        assert_equal([o.attendee_count for o in annotated], [2, 0, 0, 0])
+        assert_equal([o.attendance_status for o in annotated],
+                     [Attendance.STATUS.booked, None, None, None])
+
+        # Cancelled records don't count, and anonymous users have none - so
+        # just the occurrences, and the counts of each chunk:
+        with self.assertNumQueries(3):
+            annotated = Attendance.objects.annotate_occurrences(
+                occurrences.all(), AnonymousUser(), chunk_size=2
+            )
+        assert_equal([o.attendance_status for o in annotated],
+                     [None, None, None])
+        assert_equal(annotated[0].attendee_count, 2)
@@ -10,7 +10,9 @@ from nose.tools import *
 from timezones.utils import localtime_for_timezone, adjust_datetime_to_timezone
 
 from event.models import Calendar, Event, Occurrence
-from calendartools.modelproxy import LocalizedOccurrenceProxy
+from calendartools.modelproxy import (
+    LocalizedOccurrenceProxy, localize_occurrences
+)
 from calendartools.validators.defaults.occurrence import (
     activate_default_occurrence_validators,
     deactivate_default_occurrence_validators
@@ -107,3 +109,51 @@ class TestLocalizedOccurrenceProxy(TestCase):
                 self.localized.save()
                 occurrence = Occurrence.objects.get(pk=self.occurrence.pk)
                 assert_equal(getattr(occurrence, attr), expected)
+
+
+class TestLocalizeOccurrences(TestCase):
+    def setUp(self):
+        self.start = datetime(2011, 3, 26, 23, 30)
+        self.occurrences = [
+            Occurrence(start=self.start + timedelta(hours=i),
+                       finish=self.start + timedelta(hours=i + 2))
+            for i in range(6)
+        ]
+        self.timezone = 'Europe/London'
+
+    def test_matches_individually_localized_occurrences(self):
+        localized = localize_occurrences(self.occurrences, self.timezone)
+        assert_equal(len(localized), len(self.occurrences))
+        for proxy, occurrence in zip(localized, self.occurrences):
+            assert isinstance(proxy, LocalizedOccurrenceProxy)
+            assert proxy._obj is occurrence
+            expected = occurrence.localize(self.timezone)
+            for attr in ('start', 'finish'):
+                assert_equal(getattr(proxy, attr), getattr(expected, attr))
+                assert_equal(getattr(proxy, attr).tzname(),
+                             getattr(expected, attr).tzname())
+
+    def test_localized_datetimes_precomputed(self):
+        for proxy in localize_occurrences(self.occurrences, self.timezone):
+            assert_equal(sorted(proxy._localized.keys()), ['finish', 'start'])
+
+    def test_precomputed_datetimes_follow_changes(self):
+        proxy = localize_occurrences(self.occurrences, self.timezone)[0]
+        new_start = datetime(2011, 6, 1, 12)
+        proxy._obj.start = new_start
+        assert_equal(proxy.start,
+                     localtime_for_timezone(new_start, self.timezone))
+
+        original_timezone = settings.TIME_ZONE
+        try:
+            settings.TIME_ZONE = 'Asia/Shanghai'
+            assert_equal(proxy.start, adjust_datetime_to_timezone(
+                new_start, 'Asia/Shanghai', self.timezone
+            ))
+        finally:
+            settings.TIME_ZONE = original_timezone
+
+    def test_unlocalizable_objects_passed_through(self):
+        obj = object()
+        assert_equal(localize_occurrences([obj], self.timezone), [obj])
+        assert_equal(localize_occurrences([], self.timezone), [])
@@ -1,10 +1,13 @@
 import pytz
 from datetime import datetime, timedelta
 from django.contrib.auth.models import User
+from django.db import connection
+from django.dispatch import Signal
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from dateutil import rrule
 from event.models import (
-    Calendar, Event, Occurrence, Attendance, Cancellation
+    Calendar, Event, Occurrence, OccurrenceSeries, Attendance, Cancellation
 )
 from calendartools.exceptions import MaxOccurrenceCreationsExceeded
 from calendartools import defaults
@@ -12,11 +15,22 @@ from calendartools.modelproxy import LocalizedOccurrenceProxy
 from calendartools.signals import collect_validators
 from calendartools.validators import BaseValidator
 from calendartools.validators.defaults.attendance import (
-    CannotAttendFutureEventsValidator
+    CannotAttendFutureEventsValidator,
+    OnlyOneActiveAttendanceForOccurrenceValidator
 )
 from nose.tools import *
 
 
+def executed_queries(func):
+    """Calls ``func``, returning the SQL of the queries it executed."""
+    connection.use_debug_cursor, executed = True, len(connection.queries)
+    try:
+        func()
+    finally:
+        connection.use_debug_cursor = None
+    return [query['sql'] for query in connection.queries[executed:]]
+
+
 class TestStatusBase(TestCase):
     def setUp(self):
         self.creator = User.objects.create(username='TestyMcTesterson')
@@ -101,6 +115,56 @@ class TestEvent(TestCase):
             [None, None, None]
         )
 
+    def test_add_occurrences_bulk(self):
+        occurrences = []
+        def add():
+            occurrences.extend(self.event.add_occurrences(
+                self.calendar, self.start, self.finish, count=50, bulk=True
+            ))
+        inserts = [sql for sql in executed_queries(add)
+                   if sql.startswith('INSERT')]
+        # One statement for the whole batch, rather than one per occurrence:
+        assert_equal(len(inserts), 1)
+        assert_equal(len(occurrences), 50)
+        assert_equal(self.event.occurrences.count(), 50)
+        expected = set(
+            (self.start + timedelta(i)).replace(microsecond=0)
+            for i in range(50)
+        )
+        actual = set(self.event.occurrences.values_list('start', flat=True))
+        assert_equal(expected, actual)
+        assert_equal(
+            set(self.event.occurrences.values_list('calendar', flat=True)),
+            set([self.calendar.pk])
+        )
+        assert all(o.datetime_created for o in self.event.occurrences.all())
+
+    def test_add_occurrences_bulk_validates_whole_batch(self):
+        start = self.start - timedelta(days=1)
+        try:
+            self.event.add_occurrences(
+                self.calendar, start, start + timedelta(hours=2), count=3,
+                bulk=True
+            )
+        except ValidationError, e:
+            assert_equal(e.message_dict.keys(), [0])
+        else:
+            self.fail('ValidationError not raised.')
+        assert_equal(self.event.occurrences.count(), 0)
+
+    def test_full_clean_batch_validates_foreign_keys(self):
+        occurrences = self.event.add_occurrences(
+            self.calendar, self.start, self.finish, count=3, commit=False
+        )
+        Occurrence.full_clean_batch(occurrences)
+        occurrences[1].calendar_id = occurrences[2].calendar_id = 9999
+        try:
+            Occurrence.full_clean_batch(occurrences)
+        except ValidationError, e:
+            assert_equal(sorted(e.message_dict.keys()), [1, 2])
+        else:
+            self.fail('ValidationError not raised.')
+
     def test_add_occurrences_maximum_creation_count_exceeded(self):
         assert_raises(MaxOccurrenceCreationsExceeded,
             self.event.add_occurrences,
@@ -108,6 +172,42 @@ class TestEvent(TestCase):
             count=defaults.MAX_OCCURRENCE_CREATION_COUNT + 1
         )
 
+    def test_pluggable_validators_batch_resolved_once(self):
+        class CountingValidator(BaseValidator):
+            constructed = []
+
+            def __init__(self, *args, **kwargs):
+                self.constructed.append(self)
+                super(CountingValidator, self).__init__(*args, **kwargs)
+
+            @classmethod
+            def validate_batch(cls, sender, instances, **kwargs):
+                return {}
+
+        occurrences = [
+            Occurrence(calendar=self.calendar, event=self.event,
+                       start=self.start + timedelta(days=i),
+                       finish=self.start + timedelta(days=i, hours=1))
+            for i in range(5)
+        ]
+        sent = []
+        def send(**kwargs):
+            sent.append(kwargs['instance'])
+            return Signal.send(collect_validators, **kwargs)
+        try:
+            collect_validators.connect(CountingValidator, sender=Occurrence)
+            collect_validators.send = send
+            assert_equal(Occurrence.batch_validation_errors(occurrences), {})
+        finally:
+            del collect_validators.send
+            collect_validators.disconnect(CountingValidator,
+                                          sender=Occurrence)
+
+        # The signal is sent once to resolve the receivers, rather than once
+        # per instance:
+        assert_equal(sent, [occurrences[0]])
+        assert_equal(len(CountingValidator.constructed), 1)
+
     def test_is_cancelled_property(self):
         assert not self.event.is_cancelled
         occurrence = Occurrence.objects.create(
@@ -204,6 +304,39 @@ class TestOccurrence(TestCase):
         finally:
             collect_validators.disconnect(AngryValidator, sender=Occurrence)
 
+    def test_pluggable_validators_batch_hook(self):
+        class BatchValidator(BaseValidator):
+            priority = 9000
+            batches = []
+
+            def validate(self):
+                raise ValidationError('Validated individually.')
+
+            @classmethod
+            def validate_batch(cls, sender, instances, **kwargs):
+                cls.batches.append(list(instances))
+                return {1: ValidationError('Second is invalid.')}
+
+        occurrences = [
+            Occurrence(calendar=self.calendar, event=self.event,
+                       start=self.start + timedelta(days=i),
+                       finish=self.start + timedelta(days=i, hours=1))
+            for i in range(3)
+        ]
+        occurrences[2].finish = occurrences[2].start
+        try:
+            collect_validators.connect(BatchValidator, sender=Occurrence)
+            errors = Occurrence.batch_validation_errors(occurrences)
+        finally:
+            collect_validators.disconnect(BatchValidator, sender=Occurrence)
+
+        # Validated once, as a batch; validators further down the chain only
+        # see the instances which passed:
+        assert_equal(BatchValidator.batches, [occurrences])
+        assert_equal(sorted(errors.keys()), [1, 2])
+        assert_equal(errors[1], ['Second is invalid.'])
+        assert_raises(ValidationError, Occurrence.full_clean_batch, occurrences)
+
     def test_is_cancelled_property(self):
         assert not self.occurrence.is_cancelled
         self.occurrence.status = self.occurrence.STATUS.cancelled
@@ -224,6 +357,26 @@ class TestOccurrence(TestCase):
         self.occurrence = Occurrence.objects.get(pk=self.occurrence.pk)
         assert self.occurrence.is_cancelled
 
+    def test_effective_status_lookups(self):
+        # Saving neither refetches the status of the calendar, nor fetches the
+        # event and calendar of an occurrence whose status is unchanged:
+        calendar = Calendar.objects.get(pk=self.calendar.pk)
+        calendar.name = 'Renamed'
+        assert not [sql for sql in executed_queries(calendar.save)
+                    if sql.startswith('SELECT "event_calendar"."status"')]
+        occurrence = Occurrence.objects.get(pk=self.occurrence.pk)
+        occurrence.finish += timedelta(minutes=5)
+        assert not [sql for sql in executed_queries(occurrence.save)
+                    if sql.startswith('SELECT "event_')]
+        assert_equal(occurrence.effective_status, Occurrence.STATUS.published)
+
+        calendar.status = Calendar.STATUS.hidden
+        calendar.save()
+        occurrence = Occurrence.objects.get(pk=self.occurrence.pk)
+        occurrence.status = Occurrence.STATUS.published
+        occurrence.save()
+        assert_equal(occurrence.effective_status, Occurrence.STATUS.hidden)
+
     def test_localize_property(self):
         timezones = [
             'UTC',
@@ -242,6 +395,101 @@ class TestOccurrence(TestCase):
             assert_equal(localized.timezone, timezone)
 
 
+class TestOccurrenceSeries(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.creator
+        )
+        self.start = datetime(datetime.now().year + 1, 1, 5, 9)
+        self.finish = self.start + timedelta(hours=1)
+
+    def test_unbounded_series(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, freq=rrule.WEEKLY,
+            byweekday=[rrule.MO, rrule.TU, rrule.WE, rrule.TH, rrule.FR]
+        )
+        assert_equal(series.rule, 'FREQ=WEEKLY;INTERVAL=1;BYDAY=MO,TU,WE,TH,FR')
+        assert_equal(series.last_start, None)
+        assert_equal(Occurrence.objects.count(), 0)
+
+        window = datetime(2100, 3, 1), datetime(2100, 3, 7, 23, 59)
+        occurrences = series.expand(*window)
+        assert_equal([o.start.day for o in occurrences], [1, 2, 3, 4, 5])
+        for o in occurrences:
+            assert o.is_virtual
+            assert_equal(o.finish - o.start, timedelta(hours=1))
+            assert_equal((o.calendar, o.event, o.series),
+                         (self.calendar, self.event, series))
+            assert_equal(o.get_absolute_url(), self.event.get_absolute_url())
+
+    def test_bounded_series(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, count=3
+        )
+        assert_equal(series.last_start, self.start + timedelta(days=2))
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, until=self.start
+        )
+        assert_equal(series.last_start, self.start)
+
+    def test_materialize(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, count=3
+        )
+        window = self.start, self.start + timedelta(days=7)
+        instance = self.start + timedelta(days=1)
+        moved = series.materialize(
+            instance, start=instance + timedelta(hours=2),
+            finish=instance + timedelta(hours=3)
+        )
+        assert moved.pk
+        assert not moved.is_virtual
+        assert_equal((moved.series, moved.original_start), (series, instance))
+        assert_equal([o.start for o in series.expand(*window)],
+                     [self.start, self.start + timedelta(days=2)])
+
+    def test_effective_status(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, count=3
+        )
+        self.event.status = self.event.STATUS.cancelled
+        self.event.save()
+        series = OccurrenceSeries.objects.get(pk=series.pk)
+        occurrence = series.expand(self.start, self.finish)[0]
+        assert_equal(occurrence.status, series.STATUS.published)
+        assert_equal(occurrence.effective_status, series.STATUS.cancelled)
+
+    def test_validation(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, commit=False
+        )
+        series.full_clean()
+        series.rule = 'FREQ=FORTNIGHTLY'
+        assert_raises(ValidationError, series.full_clean)
+        series.rule = 'FREQ=DAILY;COUNT=3;UNTIL=20300101T000000'
+        assert_raises(ValidationError, series.full_clean)
+        series.rule = 'FREQ=DAILY'
+        series.finish = series.start
+        assert_raises(ValidationError, series.full_clean)
+        assert_raises(ValidationError, series.save)
+        assert_equal(OccurrenceSeries.objects.count(), 0)
+
+    def test_last_start_of_long_series(self):
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, freq=rrule.HOURLY,
+            count=100000
+        )
+        assert_equal(series.last_start,
+                     self.start + timedelta(hours=100000 - 1))
+        until = self.start + timedelta(days=10, hours=12)
+        series = self.event.add_series(
+            self.calendar, self.start, self.finish, until=until
+        )
+        assert_equal(series.last_start, self.start + timedelta(days=10))
+
+
 class TestOccurrenceDuration(TestCase):
     def setUp(self):
         self.creator = User.objects.create(username='TestyMcTesterson')
@@ -352,6 +600,29 @@ class TestAttendance(TestCase):
             )
 
 
+    def test_batch_validation(self):
+        other = User.objects.create(username='Other')
+        Attendance.objects.create(user=self.user, occurrence=self.occurrence)
+        attendances = [
+            Attendance(user=self.user, occurrence=self.occurrence),
+            Attendance(user=other, occurrence=self.occurrence),
+            Attendance(user=other, occurrence=self.occurrence),
+        ]
+        errors = Attendance.batch_validation_errors(attendances)
+        assert_equal(sorted(errors.keys()), [0, 2])
+        for i in (0, 2):
+            assert_equal(errors[i], [
+                OnlyOneActiveAttendanceForOccurrenceValidator.error_message
+            ])
+
+        # The number of queries grows with the number of distinct related
+        # objects, not with the size of the batch:
+        more = [Attendance(user=user, occurrence=self.occurrence)
+                for i in range(10) for user in (self.user, other)]
+        for batch in (attendances, more):
+            self.assertNumQueries(4, Attendance.batch_validation_errors, batch)
+
+
 class TestAttendanceCancellation(TestCase):
     def setUp(self):
         self.user = User.objects.create(username='TestyMcTesterson')
@@ -374,6 +645,35 @@ class TestAttendanceCancellation(TestCase):
         att.save()
         assert att.is_cancelled
 
+    def test_with_cancellation_state(self):
+        other = User.objects.create(username='Other')
+        booked = Attendance.objects.create(
+            user=self.user, occurrence=self.occurrence
+        )
+        cancelled = Attendance.objects.create(
+            user=other, occurrence=self.occurrence,
+            status=Attendance.STATUS.cancelled
+        )
+        with self.assertNumQueries(1):
+            states = dict((att.pk, att.is_cancelled) for att in
+                          Attendance.objects.with_cancellation_state())
+        assert_equal(states, {booked.pk: False, cancelled.pk: True})
+
+        # Otherwise, the state is looked up once per record:
+        att = Attendance.objects.get(pk=booked.pk)
+        self.assertNumQueries(1, lambda: att.is_cancelled)
+        self.assertNumQueries(0, lambda: att.is_cancelled)
+
+        # ... by ``clean``, when saved, unless it is already known:
+        att = Attendance.objects.get(pk=booked.pk)
+        self.assertNumQueries(8, att.save)
+        att = Attendance.objects.with_cancellation_state().get(pk=booked.pk)
+        self.assertNumQueries(7, att.save)
+        # Nor is it looked up when cancelling (or creating) a record:
+        att.status = att.STATUS.cancelled
+        self.assertNumQueries(7, att.save)
+        assert att.is_cancelled
+
     def test_cancellation_creates_attendance_cancelled_record(self):
         assert_equal(Cancellation.objects.count(), 0)
         att = Attendance.objects.create(
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from nose.tools import *
+
+from event.models import Calendar, Event, Occurrence
+from calendartools.paginator import InvalidPage, KeysetPaginator
+
+
+class TestKeysetPaginator(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Basic', slug='basic')
+        self.start = datetime(datetime.now().year + 1, 5, 7, 9)
+        # Two events occurring at the same times, so starts are tied:
+        for slug in ('event-1', 'event-2'):
+            event = Event.objects.create(
+                name=slug, slug=slug, creator=self.user
+            )
+            event.add_occurrences(
+                self.calendar, self.start, self.start + timedelta(hours=1),
+                count=4
+            )
+        self.occurrences = Occurrence.objects.all()
+        self.expected = list(self.occurrences.order_by('start', 'pk'))
+
+    def test_pages_forwards_and_backwards(self):
+        paginator = KeysetPaginator(self.occurrences, 3)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        assert_equal([page.number for page in pages], [1, 2, 3])
+        assert_equal([o for page in pages for o in page.object_list],
+                     self.expected)
+        assert not pages[0].has_previous()
+        assert_equal(pages[0].previous_cursor, None)
+        assert_equal(pages[-1].next_cursor, None)
+        assert_equal((pages[-1].start_index(), pages[-1].end_index()), (7, 8))
+
+        page = pages[-1]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            assert_equal(page.object_list, pages[page.number - 1].object_list)
+            assert page.has_next()
+        assert_equal(page.number, 1)
+
+    def test_one_query_per_page(self):
+        paginator = KeysetPaginator(self.occurrences, 3, count=False)
+        page = paginator.page()
+        with self.assertNumQueries(1):
+            page = paginator.page(page.next_cursor)
+        assert_equal(page.object_list, self.expected[3:6])
+
+    def test_count(self):
+        paginator = KeysetPaginator(self.occurrences, 3)
+        assert_equal((paginator.count, paginator.num_pages), (8, 3))
+        assert_equal(paginator.page_range, [1, 2, 3])
+
+        # Uncounted, the page range extends to the furthest page known of:
+        paginator = KeysetPaginator(self.occurrences, 3, count=False)
+        assert_equal((paginator.count, paginator.num_pages), (None, None))
+        page = paginator.page()
+        assert_equal(paginator.page_range, [1, 2])
+        paginator.page(page.next_cursor)
+        assert_equal(paginator.page_range, [1, 2, 3])
+
+    def test_empty(self):
+        empty = self.occurrences.none()
+        page = KeysetPaginator(empty, 3).page()
+        assert_equal((page.object_list, page.has_other_pages()), ([], False))
+        paginator = KeysetPaginator(empty, 3, allow_empty_first_page=False)
+        assert_raises(InvalidPage, paginator.page)
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(self.occurrences, 3)
+        for cursor in ('', 'garbage', 'bmV4dDpmb286MTox'):
+            assert_raises(InvalidPage, paginator.page, cursor)
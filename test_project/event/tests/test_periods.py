@@ -18,8 +18,12 @@ from timezones.utils import adjust_datetime_to_timezone
 from calendartools import defaults
 from event.models import Calendar, Event, Occurrence
 from calendartools.periods import (
-    SimpleProxy, Period, Year, Month, Week, Day, Hour, TripleMonth,
-    first_day_of_week
+    SimpleProxy, Period, Year, Month, Week, Day, DayInterval, Hour,
+    TripleMonth,
+    OccurrenceCountIndex,
+    OccurrenceIndex, first_day_of_week, get_locale_table,
+    clear_locale_tables, get_timeslot_offsets,
+    assign_lanes, overlapping, place
 )
 from calendartools.modelproxy import LocalizedOccurrenceProxy
 from calendartools.validators.defaults.occurrence import (
@@ -401,6 +405,125 @@ class TestDateTimeProxies(TestCase):
             expected_start += defaults.TIMESLOT_INTERVAL
             expected_interval_count += 1
         assert_equal(len(intervals), expected_interval_count)
+        assert all(type(i) is DayInterval for i in intervals)
+
+    def test_interval_occurrences(self):
+        start = datetime.combine(self.datetime.date(),
+                                 defaults.TIMESLOT_START_TIME)
+        occurrences = [
+            Occurrence(start=start + timedelta(minutes=minutes),
+                       finish=start + timedelta(minutes=minutes + 30))
+            for minutes in (-60, 0, 14, 15, 50, 60 * 24)
+        ]
+        day = Day(self.datetime, occurrences=occurrences)
+        for interval in day.intervals:
+            assert_equal(interval.occurrences,
+                         [o for o in occurrences if o.start in interval])
+            assert_equal(interval.get_day(), day)
+        assert_equal(len(day.intervals[0].occurrences), 2)
+        assert_equal(len(day.intervals[3].occurrences), 1)
+
+    def test_timeslot_settings(self):
+        assert get_timeslot_offsets() is get_timeslot_offsets()
+        missing = object()
+        original = getattr(settings, 'TIMESLOT_INTERVAL', missing)
+        settings.TIMESLOT_INTERVAL = timedelta(hours=1)
+        try:
+            intervals = Day(self.datetime).intervals
+            assert_equal(intervals[1].start - intervals[0].start,
+                         timedelta(hours=1))
+            assert_equal(intervals[0].finish - intervals[0].start,
+                         timedelta(hours=1) - timedelta.resolution)
+        finally:
+            if original is missing:
+                del settings.TIMESLOT_INTERVAL
+            else:
+                settings.TIMESLOT_INTERVAL = original
+        intervals = Day(self.datetime).intervals
+        assert_equal(intervals[1].start - intervals[0].start,
+                     defaults.TIMESLOT_INTERVAL)
+
+
+class TestChildPeriodMemoization(TestCase):
+    def setUp(self):
+        translation.activate('en-gb')
+        self.datetime = datetime(1982, 8, 17)
+
+    def tearDown(self):
+        translation.deactivate()
+
+    def test_child_periods_built_once(self):
+        year = Year(self.datetime)
+        assert year.months is year.months
+        month = year.months[7]
+        assert month.weeks is month.weeks
+        assert month.days is month.days
+        week = month.weeks[0]
+        assert week.days is week.days
+        day = week.days[0]
+        assert day.hours is day.hours
+        assert day.intervals is day.intervals
+        assert week.calendar_display is week.calendar_display
+        tri_month = TripleMonth(self.datetime)
+        assert tri_month.months is tri_month.months
+
+    def test_child_periods_reused(self):
+        week = Week(self.datetime)
+        assert week.first_day is week.days[0]
+        assert week.last_day is week.days[-1]
+        tri_month = TripleMonth(self.datetime)
+        assert tri_month.first_month is tri_month.months[0]
+        assert tri_month.second_month is tri_month.months[1]
+        assert tri_month.third_month is tri_month.months[2]
+        year = Year(self.datetime)
+        assert_equal(list(year.days)[0:31], year.months[0].days)
+        assert all(a is b for a, b in zip(year.days, year.months[0].days))
+        month = Month(self.datetime)
+        for row in month.calendar_display:
+            for day in row:
+                if day:
+                    assert day is month.days[day.day - 1]
+
+
+class TestCompactPeriods(TestCase):
+    def setUp(self):
+        translation.activate('en-gb')
+        self.datetime = datetime(1982, 8, 17, 6, 30, 5)
+
+    def tearDown(self):
+        translation.deactivate()
+
+    def test_no_instance_dict_until_needed(self):
+        day = Day(self.datetime)
+        assert_false(day.__dict__)
+        day.hours
+        assert_equal(day.__dict__.keys(), ['hours'])
+
+    def test_datetime_accessors(self):
+        for cls in (Hour, Day, Week, Month, Year):
+            obj = cls(self.datetime)
+            for attr in ('year', 'month', 'day', 'hour', 'minute', 'second',
+                         'microsecond', 'tzinfo'):
+                assert_equal(getattr(obj, attr), getattr(obj.start, attr))
+            for method in ('date', 'time', 'weekday', 'isoweekday',
+                           'isocalendar', 'isoformat', 'timetuple',
+                           'toordinal'):
+                assert_equal(getattr(obj, method)(),
+                             getattr(obj.start, method)())
+            assert_equal(obj.strftime('%Y-%m-%d'),
+                         obj.start.strftime('%Y-%m-%d'))
+
+    def test_falls_back_to_start(self):
+        day = Day(self.datetime)
+        assert_equal(day.ctime(), day.start.ctime())
+        assert_raises(AttributeError, getattr, day, 'non_existent')
+
+    def test_start_and_finish_are_read_only(self):
+        day = Day(self.datetime)
+        assert_equal(day.finish, datetime(1982, 8, 18) - timedelta.resolution)
+        assert day.finish is day.finish
+        assert_raises(AttributeError, setattr, day, 'start', self.datetime)
+        assert_raises(AttributeError, setattr, day, 'finish', self.datetime)
 
 
 class TestLocalization(TestCase):
@@ -496,7 +619,7 @@ class TestDateAwareProperties(TestCase):
 
     def test_day_names_property(self):
         for obj in self.objects:
-            assert_equal(obj.day_names, WEEKDAYS.values())
+            assert_equal(obj.day_names, tuple(WEEKDAYS.values()))
             assert_equal(obj.day_names[0], 'Monday')
             assert_equal(obj.day_names[6], 'Sunday')
 
@@ -509,7 +632,7 @@ class TestDateAwareProperties(TestCase):
 
     def test_day_names_abbr_property(self):
         for obj in self.objects:
-            assert_equal(obj.day_names_abbr, WEEKDAYS_ABBR.values())
+            assert_equal(obj.day_names_abbr, tuple(WEEKDAYS_ABBR.values()))
             assert_equal(obj.day_names_abbr[0], 'Mon')
             assert_equal(obj.day_names_abbr[6], 'Sun')
 
@@ -579,6 +702,98 @@ class TestFirstDayOfWeek(TestCase):
         assert_equal(self.week.finish, datetime(1982, 8, 22) - timedelta.resolution)
 
 
+class TestLocaleTable(TestCase):
+    def tearDown(self):
+        translation.deactivate()
+
+    def test_tables(self):
+        translation.activate('en-gb')
+        table = get_locale_table()
+        assert_equal(table.first_weekday, calendar.MONDAY)
+        assert_equal(table.week_format, '%W')
+        translation.activate('en-us')
+        table = get_locale_table()
+        assert_equal(table.first_weekday, calendar.SUNDAY)
+        assert_equal(table.week_format, '%U')
+        assert_equal(table.day_names_abbr[:2], ('Sun', 'Mon'))
+
+    def test_cleared(self):
+        translation.activate('en-gb')
+        table = get_locale_table()
+        clear_locale_tables()
+        assert get_locale_table() is not table
+        assert_equal(get_locale_table().day_names, table.day_names)
+
+    def test_shared_by_periods(self):
+        translation.activate('en-gb')
+        table = get_locale_table()
+        assert get_locale_table() is table
+        for obj in (Day(datetime.now()), Week(datetime.now())):
+            assert obj.day_names is table.day_names
+            assert obj.day_names_abbr is table.day_names_abbr
+
+
+class TestLayout(TestCase):
+    def setUp(self):
+        self.start = datetime(1982, 8, 17, 9)
+        def occurrence(hours, duration):
+            start = self.start + timedelta(hours=hours)
+            # Distinct primary keys, so that unsaved occurrences compare
+            # unequal:
+            return Occurrence(pk=hours, start=start,
+                              finish=start + timedelta(hours=duration))
+        # Overlapping 9-12, 10-11, 11-13; then 14-15 alone; then two days:
+        self.occurrences = [
+            occurrence(2, 2), occurrence(0, 3), occurrence(1, 1),
+            occurrence(5, 1), occurrence(6, 48),
+        ]
+        self.a, self.b, self.c, self.d, self.e = self.occurrences
+
+    def test_overlapping(self):
+        hours = [self.start + timedelta(hours=i) for i in range(8)]
+        assert_equal(overlapping(self.occurrences, hours), [
+            [self.b], [self.b, self.c], [self.b, self.a], [self.a], [],
+            [self.d], [self.e],
+        ])
+
+    def test_instants(self):
+        instant = Occurrence(pk=1, start=self.start, finish=self.start)
+        boundaries = [self.start - timedelta(hours=1), self.start,
+                      self.start + timedelta(hours=1)]
+        assert_equal(overlapping([instant], boundaries), [[], [instant]])
+
+    def test_assign_lanes(self):
+        lanes = dict((p.occurrence.pk, (p.lane, p.lanes))
+                     for p in assign_lanes(self.occurrences))
+        assert_equal(lanes[self.b.pk], (0, 2))
+        assert_equal(lanes[self.c.pk], (1, 2))
+        # The lane freed by c is reused:
+        assert_equal(lanes[self.a.pk], (1, 2))
+        assert_equal(lanes[self.d.pk], (0, 1))
+
+    def test_place(self):
+        hours = [self.start + timedelta(hours=i) for i in range(4)]
+        placed = place(self.occurrences, hours)
+        assert_equal([[(p.occurrence, p.lane) for p in hour] for hour in placed],
+                     [[(self.b, 0)], [(self.b, 0), (self.c, 1)],
+                      [(self.b, 0), (self.a, 1)]])
+        assert_equal([[p.continued for p in hour] for hour in placed],
+                     [[False], [True, False], [True, False]])
+
+    def test_week_grid(self):
+        week = Week(self.start, occurrences=self.occurrences)
+        first = (self.start - week.start).days
+        days = week.day_occurrences[first:]
+        assert_equal(days[0], [self.b, self.c, self.a, self.d, self.e])
+        # The two-day occurrence continues onto the following days:
+        assert_equal(days[1:4], [[self.e], [self.e], []])
+        assert_equal(week.days[first + 1].occurrences, [])
+        for row in week.calendar_display:
+            interval = row[first + 1]
+            assert_equal([p.occurrence for p in interval.placements], [self.e])
+            assert_equal(interval.occurrences, [])
+
+
 class TestTripleMonth(TestCase):
     def setUp(self):
         self.datetime = datetime(1982, 8, 17)
@@ -715,6 +930,108 @@ class TestDateTimeProxiesWithOccurrences(TestCase):
                     assert_equal(getattr(localized_o, attr), expected)
 
 
+class TestOccurrenceIndex(TestCase):
+    def setUp(self):
+        self.start = datetime(1982, 8, 17, 6, 30)
+        self.occurrences = [
+            Occurrence(start=self.start + timedelta(days=i, hours=i),
+                       finish=self.start + timedelta(days=i, hours=i + 1))
+            for i in reversed(range(10))
+        ]
+        self.index = OccurrenceIndex(self.occurrences)
+
+    def test_sorted_by_start(self):
+        assert_equal(len(self.index), 10)
+        assert_equal(list(self.index), sorted(self.occurrences,
+                                              key=lambda o: o.start))
+
+    def test_slice(self):
+        day = Day(self.start + timedelta(2))
+        sliced = self.index.slice(day.start, day.finish)
+        assert_equal(list(sliced), [self.occurrences[7]])
+        assert_false(self.index.slice(datetime(1982, 1, 1),
+                                      datetime(1982, 1, 2)))
+
+    def test_slice_restricted_to_parent(self):
+        week = Week(self.start)
+        sliced = self.index.slice(week.start, week.finish)
+        wider = sliced.slice(datetime(1982, 1, 1), datetime(1983, 1, 1))
+        assert_equal(list(sliced), list(wider))
+
+    def test_split(self):
+        boundaries = [self.start + timedelta(days=i) for i in range(0, 8, 2)]
+        views = self.index.split(boundaries)
+        assert_equal([len(view) for view in views], [2, 2, 2])
+        assert_equal(list(views[1]), [self.occurrences[7], self.occurrences[6]])
+        # Restricted to the range of the index split:
+        sliced = self.index.slice(self.start, self.start + timedelta(3))
+        views = sliced.split([datetime(1982, 1, 1), datetime(1983, 1, 1)])
+        assert_equal(list(views[0]), list(sliced))
+
+    def test_slices_share_storage(self):
+        sliced = self.index.slice(self.start, self.start + timedelta(3))
+        assert sliced._keys is self.index._keys
+        assert sliced._items is self.index._items
+
+    def test_child_periods_receive_index(self):
+        month = Month(self.start, occurrences=self.occurrences)
+        assert_equal(len(month.occurrences), 10)
+        for week in month.weeks:
+            assert week.occurrence_index._items is month.occurrence_index._items
+            assert_equal(
+                week.occurrences,
+                [o for o in month.occurrences if o.start in week]
+            )
+
+    def test_child_periods_keep_parent_bounds(self):
+        # The last week of August 1982 runs into September, but only the
+        # occurrences belonging to the month should be visible via it:
+        occurrence = Occurrence(start=datetime(1982, 9, 1, 9),
+                                finish=datetime(1982, 9, 1, 10))
+        month = Month(self.start, occurrences=[occurrence])
+        assert_false(month.occurrences)
+        assert_false(month.weeks[-1].occurrences)
+        week = Week(datetime(1982, 9, 1), occurrences=[occurrence])
+        assert_equal(week.occurrences, [occurrence])
+
+
+class TestOccurrenceCountIndex(TestCase):
+    def setUp(self):
+        translation.activate('en-gb')
+        self.start = datetime(1982, 8, 16)
+        self.counts = [
+            (self.start + timedelta(days=i), i + 1) for i in range(7)
+        ] + [(datetime(1982, 8, 31, 12), 10), (datetime(1982, 9, 1, 9), 100)]
+        self.index = OccurrenceCountIndex(reversed(self.counts))
+
+    def tearDown(self):
+        translation.deactivate()
+
+    def test_count(self):
+        assert_equal(self.index.count(), 138)
+        assert_equal(len(self.index), 138)
+        assert_equal(self.index.as_list(), [])
+        day = Day(self.start + timedelta(2))
+        assert_equal(self.index.slice(day.start, day.finish).count(), 3)
+        assert_false(self.index.slice(datetime(1982, 1, 1),
+                                      datetime(1982, 1, 2)))
+
+    def test_periods_populated_with_counts(self):
+        month = Month(self.start, occurrences=self.index)
+        assert_equal(month.occurrence_count, 38)
+        assert_equal(month.occurrences, [])
+        assert_equal([w.occurrence_count for w in month.weeks],
+                     [0, 0, 0, 28, 0, 10])
+        assert_equal(sum(d.occurrence_count for d in month.days), 38)
+        week = Week(self.start, occurrences=self.occurrences_for_week())
+        assert_equal(week.occurrence_count, len(week.occurrences))
+
+    def occurrences_for_week(self):
+        return [Occurrence(start=self.start + timedelta(hours=i),
+                           finish=self.start + timedelta(hours=i + 1))
+                for i in range(5)]
+
+
 class TestDateTimeProxiesWithLocalizedOccurrences(TestCase):
     def setUp(self):
         deactivate_default_occurrence_validators()
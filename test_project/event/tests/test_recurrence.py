@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from random import Random
+
+from dateutil import rrule
+from django.test import TestCase
+from nose.tools import *
+
+from calendartools.recurrence import (
+    RecurrenceCache, format_rrule, parse_rrule
+)
+
+
+class TestRecurrenceRules(TestCase):
+    def setUp(self):
+        self.start = datetime(2012, 1, 2, 9) # a Monday
+
+    def assert_round_trip(self, **params):
+        expected = list(rrule.rrule(dtstart=self.start, **params)[:20])
+        rule = format_rrule(**params)
+        assert_equal(list(parse_rrule(rule, self.start)[:20]), expected)
+        return rule
+
+    def test_format_rrule(self):
+        assert_equal(format_rrule(rrule.DAILY), 'FREQ=DAILY;INTERVAL=1')
+        assert_equal(
+            format_rrule(rrule.WEEKLY, interval=2, count=10,
+                         byweekday=[rrule.MO, rrule.FR]),
+            'FREQ=WEEKLY;INTERVAL=2;COUNT=10;BYDAY=MO,FR'
+        )
+        assert_equal(
+            format_rrule(rrule.MONTHLY, byweekday=rrule.TU(-1),
+                         until=datetime(2012, 12, 31, 23, 59)),
+            'FREQ=MONTHLY;INTERVAL=1;UNTIL=20121231T235900;BYDAY=-1TU'
+        )
+
+    def test_round_trips(self):
+        self.assert_round_trip(freq=rrule.DAILY, interval=3)
+        self.assert_round_trip(freq=rrule.WEEKLY, byweekday=[0, 2, 4])
+        self.assert_round_trip(freq=rrule.MONTHLY, byweekday=rrule.SA(2),
+                               count=5)
+        self.assert_round_trip(freq=rrule.MONTHLY, bymonthday=[1, 15])
+        self.assert_round_trip(freq=rrule.YEARLY, bymonth=[1, 7],
+                               byweekday=rrule.MO(1),
+                               until=datetime(2020, 1, 1))
+
+
+class TestRecurrenceCache(TestCase):
+    def setUp(self):
+        self.start = datetime(2012, 1, 2, 9)
+        self.rule = format_rrule(rrule.DAILY)
+        self.cache = RecurrenceCache(size=100)
+
+    def expected(self, start, finish, rule=None):
+        return parse_rrule(rule or self.rule, self.start).between(
+            start, finish, inc=True
+        )
+
+    def assert_between(self, start, finish, rule=None):
+        assert_equal(
+            self.cache.between(rule or self.rule, self.start, start, finish),
+            self.expected(start, finish, rule)
+        )
+
+    def test_between(self):
+        self.assert_between(datetime(2012, 1, 10), datetime(2012, 1, 20, 9))
+        self.assert_between(datetime(2011, 1, 1), datetime(2012, 1, 1))
+        self.assert_between(datetime(2012, 1, 20), datetime(2012, 1, 10))
+        bounded = format_rrule(rrule.WEEKLY, count=3)
+        self.assert_between(datetime(2012, 1, 1), datetime(2013, 1, 1),
+                            bounded)
+
+    def test_incremental_extension(self):
+        self.assert_between(datetime(2012, 1, 2), datetime(2012, 1, 31))
+        assert_equal(len(self.cache), 30)
+        # Windows within those already expanded compute nothing more:
+        self.assert_between(datetime(2012, 1, 5), datetime(2012, 1, 6))
+        assert_equal(len(self.cache), 30)
+        self.assert_between(datetime(2012, 2, 1), datetime(2012, 2, 29))
+        assert_equal(len(self.cache), 59)
+
+    def test_trimming(self):
+        # Later windows may leave earlier instances behind...
+        self.assert_between(datetime(2013, 1, 1), datetime(2013, 1, 31, 9))
+        assert_equal(len(self.cache), 100)
+        # ...which are recomputed if needed again:
+        self.assert_between(datetime(2012, 3, 1), datetime(2012, 3, 31, 9))
+        self.assert_between(datetime(2012, 1, 1), datetime(2013, 1, 31, 9))
+
+    def test_backward_extension_bounded(self):
+        self.assert_between(datetime(2013, 1, 1), datetime(2013, 1, 31, 9))
+        # Earlier windows don't keep every instance up to the later one...
+        self.assert_between(datetime(2012, 6, 1), datetime(2012, 6, 30, 9))
+        assert_equal(len(self.cache), 100)
+        self.assert_between(datetime(2012, 1, 1), datetime(2012, 1, 31, 9))
+        assert_equal(len(self.cache), 100)
+        # ...and later instances are computed afresh, where discarded:
+        self.assert_between(datetime(2012, 1, 1), datetime(2013, 1, 31, 9))
+        self.assert_between(datetime(2013, 1, 1), datetime(2013, 2, 28, 9))
+
+    def test_random_windows(self):
+        rule = format_rrule(rrule.WEEKLY, byweekday=[rrule.MO, rrule.TH])
+        random = Random(0)
+        for i in range(200):
+            start = self.start + timedelta(days=random.randint(-30, 3000))
+            finish = start + timedelta(days=random.randint(0, 90))
+            self.assert_between(start, finish, rule)
+            assert len(self.cache) <= 100, len(self.cache)
+
+    def test_eviction(self):
+        rules = [format_rrule(rrule.DAILY, interval=i) for i in (1, 2, 3)]
+        for rule in rules:
+            self.assert_between(datetime(2012, 1, 1), datetime(2012, 3, 15),
+                                rule)
+        # The least recently used expansion makes way for the rest:
+        assert len(self.cache) <= 100
+        assert_equal(self.cache._expansions.keys(),
+                     [(rule, self.start) for rule in rules[1:]])
+        self.cache.clear()
+        assert_equal(len(self.cache), 0)
@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.dispatch import Signal
+from nose.tools import *
+
+from calendartools.signals import collect_validators
+from calendartools.validators import BaseValidator
+from calendartools.validators.base import get_validators
+
+
+class Sender(object):
+    pass
+
+
+class LowPriorityValidator(BaseValidator):
+    priority = 1
+
+    def validate(self):
+        pass
+
+
+class HighPriorityValidator(LowPriorityValidator):
+    priority = 5
+
+
+def urgent_validator(sender, instance, **kwargs):
+    validator = LowPriorityValidator(sender, instance, **kwargs)
+    validator.priority = 100
+    return validator
+
+
+class TestGetValidators(TestCase):
+    def setUp(self):
+        self.receivers = [LowPriorityValidator, HighPriorityValidator,
+                          urgent_validator]
+        for receiver in self.receivers:
+            collect_validators.connect(receiver, sender=Sender)
+
+    def tearDown(self):
+        for receiver in self.receivers:
+            collect_validators.disconnect(receiver, sender=Sender)
+
+    def test_ordered_by_validator_priority(self):
+        instance = object()
+        validators = get_validators(Sender, instance)
+        # A function receiver is ordered by the validator it returns:
+        assert_equal([receiver for receiver, validator in validators],
+                     [urgent_validator, HighPriorityValidator,
+                      LowPriorityValidator])
+        assert all(validator.instance is instance
+                   for receiver, validator in validators)
+
+    def test_ordering_follows_priority_changes(self):
+        LowPriorityValidator.priority = 9000
+        try:
+            validators = get_validators(Sender, object())
+            assert_equal(validators[0][0], LowPriorityValidator)
+        finally:
+            LowPriorityValidator.priority = 1
+
+    def test_receivers_remembered_until_changed(self):
+        sent = []
+        def send(**kwargs):
+            sent.append(kwargs['sender'])
+            return Signal.send(collect_validators, **kwargs)
+        collect_validators.send = send
+        try:
+            get_validators(Sender, object())
+            validators = get_validators(Sender, object())
+            assert_equal(len(validators), 3)
+            assert_equal(sent, [Sender])
+
+            collect_validators.connect(HighPriorityValidator, sender=Sender,
+                                       dispatch_uid='another')
+            try:
+                assert_equal(len(get_validators(Sender, object())), 4)
+                assert_equal(len(sent), 2)
+            finally:
+                collect_validators.disconnect(sender=Sender,
+                                              dispatch_uid='another')
+            assert_equal(len(get_validators(Sender, object())), 3)
+            assert_equal(len(sent), 3)
+        finally:
+            del collect_validators.send
@@ -0,0 +1,103 @@
+import pytz
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.test import TestCase
+from nose.tools import *
+
+from timezones.utils import adjust_datetime_to_timezone
+
+from calendartools import tz
+from calendartools.tz import (
+    get_default_timezone, get_timezone, localize_datetimes
+)
+
+
+class TestTimezoneRegistry(TestCase):
+    def test_get_timezone(self):
+        assert get_timezone('Europe/London') is pytz.timezone('Europe/London')
+        assert get_timezone(u'Europe/London') is get_timezone('Europe/London')
+        london = pytz.timezone('Europe/London')
+        assert get_timezone(london) is london
+        for timezone in (None, '', 'Non-Existent Timezone', u'Caf\xe9'):
+            assert get_timezone(timezone) is None
+
+    def test_unknown_timezones_cached(self):
+        original_timezone = pytz.timezone
+        calls = []
+        def counting_timezone(zone):
+            calls.append(zone)
+            return original_timezone(zone)
+        pytz.timezone = counting_timezone
+        try:
+            for i in range(3):
+                assert get_timezone('Another/Non-Existent') is None
+                get_timezone('America/Godthab')
+            assert_equal(len(calls), 2)
+        finally:
+            pytz.timezone = original_timezone
+
+    def test_unknown_timezones_bounded(self):
+        original_limit = tz.MAX_UNKNOWN_TIMEZONES
+        tz.MAX_UNKNOWN_TIMEZONES = 5
+        try:
+            for i in range(20):
+                get_timezone('Non-Existent/%d' % i)
+                assert len(tz._unknown_timezones) <= 5
+        finally:
+            tz.MAX_UNKNOWN_TIMEZONES = original_limit
+
+    def test_get_default_timezone(self):
+        original_timezone = settings.TIME_ZONE
+        try:
+            settings.TIME_ZONE = 'Asia/Shanghai'
+            assert get_default_timezone() is pytz.timezone('Asia/Shanghai')
+            settings.TIME_ZONE = 'America/Chicago'
+            assert get_default_timezone() is pytz.timezone('America/Chicago')
+        finally:
+            settings.TIME_ZONE = original_timezone
+
+
+class TestLocalizeDatetimes(TestCase):
+    def setUp(self):
+        # Spans the clocks going forward and back in both zones:
+        self.datetimes = []
+        for start in (datetime(2011, 3, 13), datetime(2011, 3, 27),
+                      datetime(2011, 10, 30), datetime(2011, 11, 6)):
+            self.datetimes.extend(
+                start + timedelta(minutes=15 * i) for i in range(16)
+            )
+        self.timezones = ['Europe/London', 'America/New_York',
+                          'Antarctica/McMurdo', 'UTC', 'Asia/Kolkata']
+
+    def assert_matches_adjust_datetime_to_timezone(self, datetimes, from_tz,
+                                                   to_tz):
+        localized = localize_datetimes(datetimes, to_tz, from_tz)
+        assert_equal(len(localized), len(datetimes))
+        for dt, result in zip(datetimes, localized):
+            expected = adjust_datetime_to_timezone(dt, from_tz, to_tz)
+            assert_equal(result, expected)
+            assert_equal(result.replace(tzinfo=None),
+                         expected.replace(tzinfo=None))
+            assert_equal(result.tzname(), expected.tzname())
+
+    def test_naive_datetimes(self):
+        for from_tz in self.timezones:
+            for to_tz in self.timezones:
+                self.assert_matches_adjust_datetime_to_timezone(
+                    self.datetimes, from_tz, to_tz
+                )
+
+    def test_aware_datetimes(self):
+        datetimes = [pytz.utc.localize(dt) for dt in self.datetimes]
+        for to_tz in self.timezones:
+            self.assert_matches_adjust_datetime_to_timezone(
+                datetimes, 'Europe/London', to_tz
+            )
+
+    def test_accepts_timezone_objects(self):
+        london = pytz.timezone('Europe/London')
+        assert_equal(
+            localize_datetimes(self.datetimes, london, 'UTC'),
+            localize_datetimes(self.datetimes, 'Europe/London', pytz.utc),
+        )
@@ -1,15 +1,19 @@
 from datetime import datetime, timedelta, date
+from dateutil import rrule
 from dateutil.relativedelta import relativedelta
 
 from django.contrib.auth.models import User, Permission
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.utils import translation
 
 from event.models import (
     Calendar, Event, Occurrence, Attendance
 )
 from calendartools import defaults, signals, views
+from calendartools.periods import Year, first_day_of_week, get_locale_table
 from calendartools.forms import (
     EventForm,
     MultipleOccurrenceForm,
@@ -932,6 +936,28 @@ class TestCalendarViews(TestCase):
             response = self.client.get(url, follow=True)
             assert_equal(response.context[-1].get('object_list').count(), amount)
 
+    def test_aggregate_views_count_occurrences(self):
+        for url, amount in zip(self.urls[:2], self.expected_occurrences[:2]):
+            context = self.client.get(url, follow=True).context[-1]
+            period = context.get('year') or context.get('tri_month')
+            assert_equal(period.occurrence_count, amount)
+            assert_equal(period.occurrences, [])
+            assert_equal(
+                sum(d.occurrence_count for m in period.months for d in m.days),
+                amount
+            )
+
+    def test_aggregate_views_honour_timezone(self):
+        occurrences = Occurrence.objects.all()
+        for timezone in ('Asia/Kolkata', 'America/New_York',
+                         'Pacific/Chatham'):
+            url = '%s?timezone=%s' % (self.urls[0], timezone)
+            year = self.client.get(url, follow=True).context[-1].get('year')
+            expected = Year(year.start, occurrences=occurrences,
+                            timezone=timezone)
+            assert_equal([d.occurrence_count for d in year.days],
+                         [d.occurrence_count for d in expected.days])
+
     def test_size_context(self):
         small_urls = self.urls[:3]
         for url in self.urls:
@@ -940,5 +966,452 @@ class TestCalendarViews(TestCase):
             assert_equal(response.context[-1].get('size'), expected)
 
 
+class TestOverlappingOccurrencesInCalendarViews(TestCase):
+    def setUp(self):
+        translation.activate('en-gb')
+        self.max_duration = defaults.MAX_OCCURRENCE_DURATION
+        defaults.MAX_OCCURRENCE_DURATION = None
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Test1', slug='t1')
+        self.event = Event.objects.create(
+            name='Overnight', slug='overnight', creator=self.user
+        )
+        # Midnight at the start of a (Monday-first) week:
+        self.midnight = first_day_of_week(datetime(datetime.now().year + 1,
+                                                   3, 10))
+        self.grid_start = datetime.combine(self.midnight.date(),
+                                           defaults.TIMESLOT_START_TIME)
+        # From Sunday evening until the first slot of Monday's grid:
+        self.occurrence = self.event.add_occurrences(
+            self.calendar, self.midnight - timedelta(hours=2),
+            self.grid_start + timedelta(minutes=30)
+        )[0]
+
+    def tearDown(self):
+        defaults.MAX_OCCURRENCE_DURATION = self.max_duration
+        translation.deactivate()
+
+    def assert_continued(self, interval, occurrence):
+        placements = [p for p in interval.placements
+                      if p.occurrence.real_start == occurrence.real_start]
+        assert_equal(len(placements), 1)
+        assert placements[0].continued
+
+    def test_week_boundary(self):
+        url = reverse('week-calendar', args=[
+            self.calendar.slug, self.midnight.year,
+            int(self.midnight.strftime(get_locale_table().week_format))
+        ])
+        response = self.client.get(url)
+        week = response.context['week']
+        assert_equal(week.start, self.midnight)
+        assert_equal(week.occurrences, [])
+        assert_equal([o.pk for o in week.day_occurrences[0]],
+                     [self.occurrence.pk])
+        assert_equal(week.day_occurrences[1:], [[]] * 6)
+        first_slot = week.calendar_display[0][0]
+        self.assert_continued(first_slot, week.day_occurrences[0][0])
+        assert 'Overnight' in response.content
+
+    def test_midnight(self):
+        # A series of overnight instances - the first on Sunday evening:
+        self.event.add_series(
+            self.calendar, self.midnight - timedelta(hours=4),
+            self.grid_start + timedelta(minutes=15)
+        )
+        url = reverse('day-calendar', args=[
+            self.calendar.slug, self.midnight.year,
+            self.midnight.strftime('%b').lower(), self.midnight.day
+        ])
+        response = self.client.get(url)
+        day = response.context['day']
+        assert_equal([o.real_start for o in day.occurrences],
+                     [self.midnight + timedelta(hours=20)])
+        assert_equal(
+            [o.real_start for o in day.overlapping_occurrences],
+            [self.midnight - timedelta(hours=4),
+             self.midnight - timedelta(hours=2),
+             self.midnight + timedelta(hours=20)]
+        )
+        first_slot = day.intervals[0]
+        assert_equal([(p.lane, p.lanes) for p in first_slot.placements],
+                     [(0, 2), (1, 2)])
+        for o in day.overlapping_occurrences[:2]:
+            self.assert_continued(first_slot, o)
+        assert_equal(len(day.intervals[1].placements), 1)
+        assert 'Overnight' in response.content
+
+
+class TestCalendarPageCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.original_timeout = views.base.CalendarViewBase.cache_timeout
+        views.base.CalendarViewBase.cache_timeout = 60
+        self.user = User.objects.create_user(
+            'TestyMcTesterson', 'Testy@test.com', 'password'
+        )
+        self.calendar = Calendar.objects.create(name='Test1', slug='t1')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime(datetime.now().year + 1, 5, 7, 9)
+        self.url = reverse('month-calendar',
+                           args=[self.calendar.slug, self.start.year, 'may'])
+
+    def tearDown(self):
+        views.base.CalendarViewBase.cache_timeout = self.original_timeout
+        cache.clear()
+
+    def assert_cached(self, url, cached=True):
+        # Cached responses are never rendered, so have no context:
+        response = self.client.get(url)
+        assert_equal(response.status_code, 200)
+        assert_equal(response.context is None, cached)
+        return response
+
+    def test_responses_cached(self):
+        rendered = self.assert_cached(self.url, False)
+        cached = self.assert_cached(self.url)
+        assert_equal(cached.content, rendered.content)
+        assert_equal(cached['Content-Type'], rendered['Content-Type'])
+        self.assert_cached(self.url + '?timezone=Asia/Kolkata', False)
+        self.assert_cached(self.url + '?timezone=Asia/Kolkata')
+
+    def test_writes_invalidate_cached_responses(self):
+        self.assert_cached(self.url, False)
+        occurrence = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1)
+        )[0]
+        assert 'Event' in self.assert_cached(self.url, False).content
+        self.assert_cached(self.url)
+
+        self.event.name = 'Renamed'
+        self.event.save()
+        assert 'Renamed' in self.assert_cached(self.url, False).content
+        self.assert_cached(self.url)
+
+        occurrence.delete()
+        self.assert_cached(self.url, False)
+        self.calendar.save()
+        self.assert_cached(self.url, False)
+
+    def test_headers_cached(self):
+        def render_period(view, **kwargs):
+            response = original(view, **kwargs)
+            response['Content-Language'] = 'x-test'
+            return response
+        original = views.base.CalendarViewBase.render_period
+        views.base.CalendarViewBase.render_period = render_period
+        try:
+            self.assert_cached(self.url, False)
+            cached = self.assert_cached(self.url)
+        finally:
+            views.base.CalendarViewBase.render_period = original
+        assert_equal(cached['Content-Language'], 'x-test')
+
+    def test_users_cached_separately(self):
+        self.assert_cached(self.url, False)
+        other = User.objects.create_user('Other', 'other@test.com', 'password')
+        for user in (self.user, other):
+            assert self.client.login(username=user.username,
+                                     password='password')
+            self.assert_cached(self.url, False)
+            self.assert_cached(self.url)
+        self.client.logout()
+        self.assert_cached(self.url)
+
+    def test_users_who_may_see_hidden_objects_cached_separately(self):
+        self.assert_cached(self.url, False)
+        self.user.is_staff = True
+        self.user.save()
+        assert self.client.login(username=self.user.username,
+                                 password='password')
+        self.assert_cached(self.url, False)
+        self.assert_cached(self.url)
+
+    def test_time_dependent_responses_not_cached(self):
+        url = self.url + '?period=future'
+        self.assert_cached(url, False)
+        self.assert_cached(url, False)
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Test1', slug='t1')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime(datetime.now().year + 1, 5, 7, 9)
+        self.occurrence = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1)
+        )[0]
+        args = [self.calendar.slug, self.start.year, 'may']
+        self.urls = [reverse('month-calendar', args=args),
+                     reverse('month-agenda', args=args)]
+
+    def assert_not_modified(self, url, response, not_modified=True):
+        conditional = self.client.get(url,
+                                      HTTP_IF_NONE_MATCH=response['ETag'])
+        if not_modified:
+            assert_equal(conditional.status_code, 304)
+            assert_equal(conditional.content, '')
+        else:
+            assert_equal(conditional.status_code, 200)
+            assert_not_equal(conditional['ETag'], response['ETag'])
+        return conditional
+
+    def test_not_modified(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            assert_equal(response.status_code, 200)
+            # Deletions can't be reflected in a modification time:
+            assert not response.has_header('Last-Modified')
+            # Only the calendar is fetched:
+            with self.assertNumQueries(1):
+                self.assert_not_modified(url, response)
+            # Other pages of the same calendar have their own ETags:
+            other = self.client.get(url + '?timezone=Asia/Kolkata')
+            assert_not_equal(other['ETag'], response['ETag'])
+
+    def test_modified(self):
+        url = self.urls[0]
+        response = self.client.get(url)
+        start = self.start + timedelta(days=1)
+        occurrence = self.event.add_occurrences(
+            self.calendar, start, start + timedelta(hours=1)
+        )[0]
+        response = self.assert_not_modified(url, response, False)
+        occurrence.delete()
+        response = self.assert_not_modified(url, response, False)
+
+        self.event.name = 'Renamed'
+        self.event.save()
+        response = self.assert_not_modified(url, response, False)
+        self.event.status = Event.STATUS.hidden
+        self.event.save()
+        self.assert_not_modified(url, response, False)
+
+    def test_other_calendars_ignored(self):
+        url = self.urls[0]
+        response = self.client.get(url)
+        other = Calendar.objects.create(name='Test2', slug='t2')
+        self.event.add_occurrences(
+            other, self.start, self.start + timedelta(hours=1)
+        )
+        self.assert_not_modified(url, response)
+
+    def test_time_dependent_responses_not_validated(self):
+        response = self.client.get(self.urls[0] + '?period=future')
+        assert not response.has_header('ETag')
+
+
+class TestSeriesInCalendarViews(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Test1', slug='t1')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.year = datetime.now().year + 1
+        self.start = datetime(self.year, 5, 1, 9)
+        self.series = self.event.add_series(
+            self.calendar, self.start, self.start + timedelta(hours=1)
+        )
+        self.occurrence = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=2)
+        )[0]
+
+    def test_month_view(self):
+        self.series.materialize(self.start + timedelta(days=1),
+                                status=Occurrence.STATUS.inactive)
+        url = reverse('month-calendar', args=[self.calendar.slug, self.year,
+                                              'may'])
+        response = self.client.get(url)
+        occurrences = list(response.context['month'].occurrences)
+        assert_equal(len(occurrences), 31)
+        assert_equal(len([o for o in occurrences if o.is_virtual]), 30)
+        assert_equal([o.start for o in occurrences],
+                     sorted(o.start for o in occurrences))
+
+    def test_aggregated_year_view(self):
+        url = reverse('year-calendar', args=[self.calendar.slug, self.year])
+        response = self.client.get(url)
+        year = response.context['year']
+        # Every day from May 1st, with two occurrences on May 1st:
+        assert_equal(year.occurrence_count,
+                     31 + 30 + 31 + 31 + 30 + 31 + 30 + 31 + 1)
+
+    def test_conditional_get(self):
+        url = reverse('month-calendar', args=[self.calendar.slug, self.year,
+                                              'may'])
+        etag = self.client.get(url)['ETag']
+        self.event.add_series(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            freq=rrule.WEEKLY
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, 200)
+
+
 class TestAgendaViews(TestCase):
-    pass
+    def setUp(self):
+        self.user = User.objects.create(username='TestyMcTesterson')
+        self.calendar = Calendar.objects.create(name='Test1', slug='t1')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime(datetime.now().year + 1, 5, 1, 9)
+        self.occurrences = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            count=5
+        )
+        self.url = reverse('month-agenda',
+                           args=[self.calendar.slug, self.start.year, 'may'])
+        self.view = views.agenda.MonthAgenda
+        self.original = (self.view.paginate_by, self.view.keyset_pagination,
+                         self.view.count_pages)
+        self.view.paginate_by = 2
+        self.view.keyset_pagination = True
+
+    def tearDown(self):
+        (self.view.paginate_by, self.view.keyset_pagination,
+         self.view.count_pages) = self.original
+
+    def test_keyset_pagination(self):
+        response = self.client.get(self.url)
+        pages = [response.context['page_obj']]
+        while pages[-1].has_next():
+            assert '?cursor=%s' % pages[-1].next_cursor in response.content
+            response = self.client.get(
+                self.url, {'cursor': pages[-1].next_cursor}
+            )
+            pages.append(response.context['page_obj'])
+        assert_equal([page.number for page in pages], [1, 2, 3])
+        assert_equal([o for page in pages for o in page.object_list],
+                     self.occurrences)
+        assert 'Page 3 of 3.' in response.content
+
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        assert_equal(response.status_code, 404)
+
+    def test_uncounted_pages(self):
+        self.view.count_pages = False
+        response = self.client.get(self.url)
+        assert_equal(response.context['paginator'].page_range, [1, 2])
+        assert 'Page 1.' in response.content
+
+    def test_numbered_pages(self):
+        # e.g. as linked to by ``digg_pagination``:
+        response = self.client.get(self.url, {'page': 3})
+        page = response.context['page_obj']
+        assert_equal(list(page.object_list), self.occurrences[4:])
+
+    def test_single_fetch_per_page(self):
+        self.view.keyset_pagination = False
+        self.view.paginate_by = 10
+        self.client.get(self.url) # warms the calendar's bounds and the site.
+        # The calendar, its series, and the occurrences themselves - fetched
+        # once, and shared with the period object - and their attendee counts:
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        assert not response.context['is_paginated']
+        assert_equal(response.context['occurrences'], self.occurrences)
+        # ...and when there's more than one page, a count:
+        self.view.paginate_by = 2
+        for page in (1, 2):
+            with self.assertNumQueries(5):
+                response = self.client.get(self.url, {'page': page})
+            assert_equal(list(response.context['page_obj'].object_list),
+                         self.occurrences[(page - 1) * 2:page * 2])
+            assert 'Page %d of 3.' % page in response.content
+
+    def test_first_page_has_next(self):
+        self.view.keyset_pagination = False
+        self.view.paginate_by = 2
+        response = self.client.get(self.url)
+        page = response.context['page_obj']
+        assert_equal(page.object_list, self.occurrences[:2])
+        assert_equal(response.context['occurrences'], self.occurrences[:2])
+        self.assertNumQueries(0, page.has_next)
+        assert page.has_next()
+
+    def test_paginated_series(self):
+        start = self.start + timedelta(hours=3)
+        self.event.add_series(self.calendar, start,
+                              start + timedelta(hours=1), count=3)
+        response = self.client.get(self.url)
+        assert_equal(response.status_code, 200)
+        assert_equal(response.context['paginator'].count, 8)
+
+
+class TestAttendanceInCalendarViews(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'TestyMcTesterson', 'testy@example.com', 'password'
+        )
+        self.calendar = Calendar.objects.create(name='Test1', slug='t1')
+        self.event = Event.objects.create(
+            name='Event', slug='event', creator=self.user
+        )
+        self.start = datetime(datetime.now().year + 1, 5, 1, 9)
+        self.occurrences = self.event.add_occurrences(
+            self.calendar, self.start, self.start + timedelta(hours=1),
+            count=3
+        )
+        Attendance.objects.create(user=self.user,
+                                  occurrence=self.occurrences[1],
+                                  status=Attendance.STATUS.booked)
+        args = [self.calendar.slug, self.start.year, 'may']
+        self.urls = [reverse('month-calendar', args=args),
+                     reverse('month-agenda', args=args)]
+        self.original = views.base.CalendarViewBase.cache_timeout
+        views.base.CalendarViewBase.cache_timeout = 60
+        cache.clear()
+
+    def tearDown(self):
+        views.base.CalendarViewBase.cache_timeout = self.original
+        cache.clear()
+
+    def test_shown_by_default(self):
+        assert defaults.CALENDAR_SHOW_ATTENDANCE
+        assert views.base.CalendarViewBase.show_attendance
+
+    def test_attendance_shown(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            anonymous_etag = response['ETag']
+            occurrences = response.context['occurrences']
+            assert_equal([o.attendee_count for o in occurrences], [0, 1, 0])
+            assert_equal([o.attendance_status for o in occurrences],
+                         [None, None, None])
+            assert '1 attending' in response.content
+            assert 'Booked' not in response.content
+
+            self.client.login(username='TestyMcTesterson',
+                              password='password')
+            response = self.client.get(url)
+            occurrences = response.context['occurrences']
+            assert_equal([o.attendance_status for o in occurrences],
+                         [None, Attendance.STATUS.booked, None])
+            assert 'Booked' in response.content
+            assert_not_equal(response['ETag'], anonymous_etag)
+            self.client.logout()
+
+    def test_attendance_changes_etag(self):
+        url = self.urls[0]
+        response = self.client.get(url)
+        attendance = Attendance.objects.create(
+            user=User.objects.create(username='Other'),
+            occurrence=self.occurrences[0], status=Attendance.STATUS.booked
+        )
+        conditional = self.client.get(url,
+                                      HTTP_IF_NONE_MATCH=response['ETag'])
+        assert_equal(conditional.status_code, 200)
+        assert_equal(conditional.content.count('1 attending'), 2)
+
+        # Also when loaded afresh (without its occurrence), and deleted:
+        Attendance.objects.get(pk=attendance.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=conditional['ETag'])
+        assert_equal(response.status_code, 200)
+        assert_equal(response.content.count('1 attending'), 1)